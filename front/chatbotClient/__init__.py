@@ -0,0 +1,16 @@
+"""Cliente del API del chatbot (/chatbot y /upload) para la app de Streamlit y los scripts.
+
+ChatbotClient: síncrono, sobre una sesión de requests con keep-alive y pool de conexiones.
+AsyncChatbotClient: asyncio (requiere aiohttp) con un límite de peticiones concurrentes.
+"""
+from .common import DEFAULT_BASE_URL, ApiError
+from .syncClient import ChatbotClient
+
+def __getattr__(name):
+    # Import diferido: aiohttp solo hace falta para el cliente asíncrono
+    if name == "AsyncChatbotClient":
+        from .asyncClient import AsyncChatbotClient
+        return AsyncChatbotClient
+    raise AttributeError(name)
+
+__all__ = ["ApiError", "AsyncChatbotClient", "ChatbotClient", "DEFAULT_BASE_URL"]
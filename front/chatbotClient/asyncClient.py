@@ -0,0 +1,166 @@
+import asyncio
+
+import aiohttp
+
+from .common import (
+    CHATBOT_PATH, DEFAULT_BASE_URL, RETRY_STATUSES, STREAM_CONTENT_TYPE, UPLOAD_PATH, ApiError,
+    backend_streams, backoff_delay, batch_payload, chat_payload, complete_payload, init_payload, job_from_init,
+    job_from_status, parse_event, retry_statuses, status_payload, unique_files, upload_requests
+)
+
+class AsyncChatbotClient:
+    """Cliente asyncio sobre una aiohttp.ClientSession con keep-alive.
+
+    Como mucho max_concurrency peticiones a la vez (incluidas las subidas a S3); el resto espera turno.
+    Misma política de timeouts y reintentos que ChatbotClient. Hay que crearlo y usarlo dentro del
+    mismo bucle de eventos (p.ej. "async with AsyncChatbotClient(...) as client").
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=(5, 120), max_retries=3, backoff=0.5, max_concurrency=8):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=timeout[0], sock_read=timeout[1])
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Como en ChatbotClient: si el backend envía los tokens según se generan (None mientras no se sabe)
+        self.streaming = None
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(timeout=self.timeout, connector=connector)
+        return self._session
+
+    async def request(self, method, url, retry_on=RETRY_STATUSES, **kwargs):
+        """Envía la petición con reintentos y devuelve la respuesta sin leer (hay que liberarla)."""
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.session().request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                retryable = isinstance(e, aiohttp.ClientConnectorError) or method == "PUT"
+                if not retryable or attempt == self.max_retries:
+                    raise ApiError(None, str(e) or type(e).__name__) from e
+                await asyncio.sleep(backoff_delay(attempt, self.backoff))
+                continue
+
+            if response.status in retry_on and attempt < self.max_retries:
+                # Leer el cuerpo deja la conexión libre para reutilizarla
+                await response.read()
+                response.release()
+                await asyncio.sleep(backoff_delay(attempt, self.backoff, response.headers.get("Retry-After")))
+                continue
+            if response.status >= 400:
+                message = await response.text()
+                response.release()
+                raise ApiError(response.status, message)
+            return response
+
+    async def post_json(self, path, payload):
+        async with self.semaphore:
+            response = await self.request("POST", self.base_url + path, retry_on=retry_statuses(path), json=payload)
+            async with response:
+                return await response.json(content_type=None)
+
+    async def chat(self, query, session_id, model="bedrock"):
+        return (await self.post_json(CHATBOT_PATH, chat_payload(query, session_id, model))).get("response")
+
+    async def chat_many(self, requests):
+        """Lanza las consultas [{"query", "session_id", "model"}] a la vez (con el límite de concurrencia).
+
+        Devuelve, en el mismo orden, la respuesta de cada una o el ApiError con el que ha fallado.
+        """
+
+        return await asyncio.gather(
+            *(self.chat(item["query"], item["session_id"], item.get("model", "bedrock")) for item in requests),
+            return_exceptions=True
+        )
+
+    async def stream_chat(self, query, session_id, model="bedrock"):
+        """Itera (async for) los eventos de la respuesta en streaming, como ChatbotClient.stream_chat."""
+
+        async with self.semaphore:
+            response = await self.request(
+                "POST", self.base_url + CHATBOT_PATH, retry_on=retry_statuses(CHATBOT_PATH),
+                json=chat_payload(query, session_id, model, stream=True)
+            )
+            async with response:
+                self.streaming = backend_streams(response.headers)
+                if not response.headers.get("Content-Type", "").startswith(STREAM_CONTENT_TYPE):
+                    yield {"type": "token", "text": (await response.json(content_type=None)).get("response", "")}
+                    yield {"type": "done"}
+                    return
+                async for line in response.content:
+                    event = parse_event(line)
+                    if event is not None:
+                        yield event
+
+    async def batch(self, items, output=None):
+        return await self.post_json(CHATBOT_PATH, batch_payload(items, output=output))
+
+    async def call_upload_api(self, payload):
+        return await self.post_json(UPLOAD_PATH, payload)
+
+    async def put(self, url, data, headers=None):
+        async with self.semaphore:
+            response = await self.request("PUT", url, data=data, headers=headers or {})
+            async with response:
+                return response.headers.get("ETag")
+
+    async def upload_files(self, files, pending=None):
+        """Como ChatbotClient.upload_files: prepara todos los ficheros y sube todas sus partes a la vez."""
+
+        pending = {} if pending is None else pending
+        unique, results = unique_files(files)
+        prepared = await asyncio.gather(
+            *(self._prepare_upload(name, data, sha256, pending) for name, data, sha256 in unique),
+            return_exceptions=True
+        )
+        uploads = [
+            self._upload_file(name, data, sha256, job, pending)
+            for (name, data, sha256), job in zip(unique, prepared)
+            if not isinstance(job, Exception) and job.get("status") != "duplicate"
+        ]
+        for (name, _, _), job in zip(unique, prepared):
+            if isinstance(job, Exception):
+                results.append({"file_name": name, "status": "failed", "error": str(job)})
+            elif job.get("status") == "duplicate":
+                results.append({"file_name": name, "status": "duplicate", "key": job["key"]})
+        return results + list(await asyncio.gather(*uploads))
+
+    async def _prepare_upload(self, name, data, sha256, pending):
+        if sha256 in pending:
+            return job_from_status(pending[sha256], await self.call_upload_api(status_payload(pending[sha256])))
+        return job_from_init(await self.call_upload_api(init_payload(name, data, sha256)), sha256, pending)
+
+    async def _upload_file(self, name, data, sha256, job, pending):
+        requests = upload_requests(job, data)
+        etags = await asyncio.gather(
+            *(self.put(url, chunk, headers) for _, url, chunk, headers in requests),
+            return_exceptions=True
+        )
+        errors = [str(etag) for etag in etags if isinstance(etag, Exception)]
+        for (part_number, _, _, _), etag in zip(requests, etags):
+            if part_number is not None and not isinstance(etag, Exception):
+                job["uploaded"][part_number] = etag
+        if errors:
+            return {"file_name": name, "status": "failed", "error": errors[0]}
+        try:
+            await self.call_upload_api(complete_payload(job, sha256))
+        except ApiError as e:
+            return {"file_name": name, "status": "failed", "error": str(e)}
+        pending.pop(sha256, None)
+        return {"file_name": name, "status": "uploaded", "key": job["key"]}
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import random
+
+# URL base del API Gateway (etapa incluida); los clientes la reciben como parámetro
+DEFAULT_BASE_URL = os.environ.get("CHATBOT_API_URL", "https://dkjn2gd5f8.execute-api.eu-central-1.amazonaws.com/dev")
+CHATBOT_PATH = "/chatbot"
+UPLOAD_PATH = "/upload"
+STREAM_CONTENT_TYPE = "application/x-ndjson"
+# El backend indica si la respuesta en streaming llega según se genera: tras API Gateway REST llega agrupada
+STREAMING_HEADER = "X-Chatbot-Streaming"
+
+# Se reintentan los límites de tasa y los errores de la pasarela. Un 500 o un 504 (timeout de la pasarela)
+# pueden llegar después de que la Lambda haya generado la respuesta y guardado la interacción, así que en
+# las consultas al chatbot no se reintentan para no duplicarla en el historial ni pagar dos veces el modelo.
+RETRY_STATUSES = (429, 502, 503, 504)
+CHAT_RETRY_STATUSES = (429, 502, 503)
+BACKOFF_MAX_SECONDS = 20.0
+
+class ApiError(Exception):
+    """Error del API (status_code con la respuesta) o de red (status_code None)."""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"{status_code}: {message}" if status_code else message)
+        self.status_code = status_code
+        self.message = message
+
+def backoff_delay(attempt, base, retry_after=None):
+    """Espera antes del reintento attempt (desde 0): Retry-After si llega o exponencial con jitter completo."""
+
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(base * 2 ** attempt, BACKOFF_MAX_SECONDS))
+
+def retry_statuses(path):
+    return CHAT_RETRY_STATUSES if path == CHATBOT_PATH else RETRY_STATUSES
+
+def backend_streams(headers):
+    """True si el backend envía los tokens según se generan, False si los agrupa y None si no lo indica."""
+
+    if not headers.get("Content-Type", "").startswith(STREAM_CONTENT_TYPE) or headers.get(STREAMING_HEADER) == "false":
+        return False
+    return True if headers.get(STREAMING_HEADER) == "true" else None
+
+def parse_event(line):
+    """Evento de una línea NDJSON de la respuesta en streaming, o None si la línea está vacía."""
+
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.strip()
+    return json.loads(line) if line else None
+
+def chat_payload(query, session_id, model, stream=False):
+    return {"query": query, "session_id": session_id, "model": model, "stream": stream}
+
+def batch_payload(items, stream=False, output=None):
+    payload = {"items": list(items), "stream": stream}
+    if output:
+        payload["output"] = output
+    return payload
+
+def unique_files(files):
+    """Devuelve ([(nombre, datos, sha256)], [resultados de los ficheros repetidos en la selección])."""
+
+    unique, repeated, seen = [], [], set()
+    for name, data in files:
+        sha256 = hashlib.sha256(data).hexdigest()
+        if sha256 in seen:
+            repeated.append({"file_name": name, "status": "repeated"})
+            continue
+        seen.add(sha256)
+        unique.append((name, data, sha256))
+    return unique, repeated
+
+def init_payload(name, data, sha256):
+    return {"action": "init", "file_name": name, "size": len(data), "sha256": sha256}
+
+def status_payload(pending):
+    return {"action": "status", "key": pending["key"], "upload_id": pending["upload_id"], "part_count": pending["part_count"]}
+
+def job_from_status(pending, status):
+    """Trabajo para reanudar una subida multiparte pendiente con las partes que ya tiene S3."""
+
+    pending["uploaded"] = {part["part_number"]: part["etag"] for part in status["uploaded"]}
+    return {"mode": "multipart", **pending, "parts": status["parts"]}
+
+def job_from_init(init, sha256, pending):
+    """Trabajo de una subida nueva; las multiparte se registran en pending para poder reanudarlas."""
+
+    if init["status"] == "duplicate" or init["mode"] == "single":
+        return init
+    pending[sha256] = {
+        "key": init["key"],
+        "upload_id": init["upload_id"],
+        "part_size": init["part_size"],
+        "part_count": len(init["parts"]),
+        "uploaded": {}
+    }
+    return {"mode": "multipart", **pending[sha256], "parts": init["parts"]}
+
+def upload_requests(job, data):
+    """PUTs a S3 de un trabajo: [(número de parte o None, url, bloque, cabeceras)]."""
+
+    if job["mode"] == "single":
+        return [(None, job["url"], data, job["headers"])]
+    return [
+        (part["part_number"], part["url"], data[(part["part_number"] - 1) * job["part_size"]:part["part_number"] * job["part_size"]], {})
+        for part in job["parts"]
+    ]
+
+def uploaded_bytes(job, data):
+    """Bytes ya subidos de una subida reanudada."""
+
+    if job["mode"] != "multipart":
+        return 0
+    return min(len(job["uploaded"]) * job["part_size"], len(data))
+
+def complete_payload(job, sha256):
+    payload = {"action": "complete", "key": job["key"], "sha256": sha256}
+    if job["mode"] == "multipart":
+        payload["upload_id"] = job["upload_id"]
+        payload["parts"] = [{"part_number": n, "etag": etag} for n, etag in job["uploaded"].items()]
+    return payload
@@ -0,0 +1,177 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .common import (
+    CHATBOT_PATH, DEFAULT_BASE_URL, RETRY_STATUSES, STREAM_CONTENT_TYPE, UPLOAD_PATH, ApiError,
+    backend_streams, backoff_delay, batch_payload, chat_payload, complete_payload, init_payload, job_from_init,
+    job_from_status, parse_event, retry_statuses, status_payload, unique_files, upload_requests, uploaded_bytes
+)
+
+class ChatbotClient:
+    """Cliente síncrono sobre una requests.Session: las conexiones (y el handshake TLS) se reutilizan.
+
+    timeout es (conexión, lectura) en segundos; en streaming la lectura cuenta entre fragmentos.
+    Los 429/502/503/504 (en /chatbot, sin el 504) y los fallos de conexión se reintentan hasta max_retries
+    veces con espera exponencial desde backoff segundos; los timeouts de lectura solo en los PUT a S3.
+    streaming indica, tras la primera respuesta de stream_chat, si el backend puede enviar los tokens según
+    se generan (None mientras no se sabe).
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, timeout=(5, 120), max_retries=3, backoff=0.5, pool_size=10, upload_workers=4):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.upload_workers = upload_workers
+        self.streaming = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method, url, stream=False, retry_on=RETRY_STATUSES, **kwargs):
+        """Envía la petición con reintentos y devuelve la respuesta; lanza ApiError si falla."""
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, stream=stream, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                retryable = isinstance(e, requests.ConnectionError) or method == "PUT"
+                if not retryable or attempt == self.max_retries:
+                    raise ApiError(None, str(e)) from e
+                time.sleep(backoff_delay(attempt, self.backoff))
+                continue
+
+            if response.status_code in retry_on and attempt < self.max_retries:
+                response.close()
+                time.sleep(backoff_delay(attempt, self.backoff, response.headers.get("Retry-After")))
+                continue
+            if response.status_code >= 400:
+                message = response.text
+                response.close()
+                raise ApiError(response.status_code, message)
+            return response
+
+    def post(self, path, payload, stream=False):
+        return self.request("POST", self.base_url + path, stream=stream, retry_on=retry_statuses(path), json=payload)
+
+    def chat(self, query, session_id, model="bedrock"):
+        """Respuesta completa del chatbot."""
+
+        return self.post(CHATBOT_PATH, chat_payload(query, session_id, model)).json().get("response")
+
+    def stream_chat(self, query, session_id, model="bedrock"):
+        """Itera los eventos {"type": "token" | "done" | "error", ...} de la respuesta en streaming.
+
+        Si el despliegue devuelve la respuesta agrupada en JSON se emite como un único token.
+        """
+
+        with self.post(CHATBOT_PATH, chat_payload(query, session_id, model, stream=True), stream=True) as response:
+            self.streaming = backend_streams(response.headers)
+            if not response.headers.get("Content-Type", "").startswith(STREAM_CONTENT_TYPE):
+                yield {"type": "token", "text": response.json().get("response", "")}
+                yield {"type": "done"}
+                return
+            for line in response.iter_lines():
+                event = parse_event(line)
+                if event is not None:
+                    yield event
+
+    def batch(self, items, stream=False, output=None):
+        """Lote de consultas [{"query", "session_id", "model"}].
+
+        Devuelve la respuesta del lote ({"batch_id", "results"} o, con output="s3", {"output_uri", ...});
+        con stream=True, un iterador de los resultados en el orden de entrada.
+        """
+
+        if not stream:
+            return self.post(CHATBOT_PATH, batch_payload(items, output=output)).json()
+        return self._iter_batch(items)
+
+    def _iter_batch(self, items):
+        with self.post(CHATBOT_PATH, batch_payload(items, stream=True), stream=True) as response:
+            for line in response.iter_lines():
+                result = parse_event(line)
+                if result is not None:
+                    yield result
+
+    def call_upload_api(self, payload):
+        return self.post(UPLOAD_PATH, payload).json()
+
+    def put(self, url, data, headers=None):
+        """Sube un bloque a una URL prefirmada de S3 y devuelve su ETag."""
+
+        response = self.request("PUT", url, data=data, headers=headers or {})
+        return response.headers.get("ETag")
+
+    def upload_files(self, files, pending=None, progress=None):
+        """Sube los ficheros [(nombre, bytes)] directamente a S3, con todas las partes en paralelo.
+
+        pending (sha256 -> subida multiparte) guarda las subidas sin completar; si una falla, volver a
+        llamar con el mismo dict solo sube las partes que faltan. progress(bytes subidos, total) se llama
+        desde el hilo que invoca este método. Devuelve un resultado por fichero con "status" 'uploaded',
+        'duplicate' (ya estaba en S3), 'repeated' (repetido en la selección) o 'failed' (con "error").
+        """
+
+        pending = {} if pending is None else pending
+        unique, results = unique_files(files)
+        jobs = []
+        for name, data, sha256 in unique:
+            try:
+                if sha256 in pending:
+                    job = job_from_status(pending[sha256], self.call_upload_api(status_payload(pending[sha256])))
+                else:
+                    job = job_from_init(self.call_upload_api(init_payload(name, data, sha256)), sha256, pending)
+            except ApiError as e:
+                results.append({"file_name": name, "status": "failed", "error": str(e)})
+                continue
+            if job.get("status") == "duplicate":
+                results.append({"file_name": name, "status": "duplicate", "key": job["key"]})
+                continue
+            jobs.append((name, data, sha256, job))
+
+        total_bytes = sum(len(data) for _, data, _, _ in jobs) or 1
+        done_bytes = sum(uploaded_bytes(job, data) for _, data, _, job in jobs)
+        failed = {}
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as pool:
+            futures = {}
+            for index, (_, data, _, job) in enumerate(jobs):
+                for part_number, url, chunk, headers in upload_requests(job, data):
+                    futures[pool.submit(self.put, url, chunk, headers)] = (index, part_number, len(chunk))
+            for future in as_completed(futures):
+                index, part_number, size = futures[future]
+                try:
+                    etag = future.result()
+                except ApiError as e:
+                    failed[index] = str(e)
+                    continue
+                if part_number is not None:
+                    jobs[index][3]["uploaded"][part_number] = etag
+                done_bytes += size
+                if progress is not None:
+                    progress(min(done_bytes, total_bytes), total_bytes)
+
+        for index, (name, data, sha256, job) in enumerate(jobs):
+            if index in failed:
+                results.append({"file_name": name, "status": "failed", "error": failed[index]})
+                continue
+            try:
+                self.call_upload_api(complete_payload(job, sha256))
+            except ApiError as e:
+                results.append({"file_name": name, "status": "failed", "error": str(e)})
+                continue
+            pending.pop(sha256, None)
+            results.append({"file_name": name, "status": "uploaded", "key": job["key"]})
+        return results
@@ -1,12 +1,10 @@
 import streamlit as st
-import requests
 import uuid  
-import base64
+from chatbotClient import ApiError, ChatbotClient
 
 # 🔹 AWS API Gateway Configuration 
 BASE_URL = "https://dkjn2gd5f8.execute-api.eu-central-1.amazonaws.com/dev" #Actualmente se puede acceder a la interfaz pero las conexiones con los recursos se encuentran apagadas.
-CHATBOT_FUNCTION = f"{BASE_URL}/chatbot"
-UPLOAD_DOCUMENT_FUNCTION = f"{BASE_URL}/upload"
+UPLOAD_WORKERS = 4  # Partes/ficheros que se suben a S3 en paralelo
 
 # 🔹 Generate a unique session_id (persists during session)
 if "session_id" not in st.session_state:
@@ -16,25 +14,41 @@ if "session_id" not in st.session_state:
 st.set_page_config(page_title="AWS Chatbot AI", page_icon="🤖", layout="centered")
 st.title("🤖 Chatbot con AWS Lambda & Bedrock")
 
+# 🔹 Subidas multiparte pendientes de completar (para reanudarlas), por hash del contenido
+if "pending_uploads" not in st.session_state:
+    st.session_state.pending_uploads = {}
+
+@st.cache_resource
+def get_client():
+    """Un cliente por proceso: las conexiones con API Gateway y S3 se reutilizan entre mensajes."""
+    return ChatbotClient(BASE_URL, upload_workers=UPLOAD_WORKERS)
+
+def upload_documents(files):
+    """Sube los ficheros directamente a S3 con partes en paralelo y una barra de progreso."""
+    progress = st.progress(0.0, text="Subiendo documentos...")
+    results = get_client().upload_files(
+        [(file.name, file.getvalue()) for file in files],
+        pending=st.session_state.pending_uploads,
+        progress=lambda done, total: progress.progress(done / total, text="Subiendo documentos...")
+    )
+    for result in results:
+        name = result["file_name"]
+        if result["status"] == "repeated":
+            st.info(f"{name} tiene el mismo contenido que otro fichero de la selección, se omite.")
+        elif result["status"] == "duplicate":
+            st.info(f"{name} ya estaba subido ({result['key']}), se omite.")
+        elif result["status"] == "failed":
+            st.error(f"Error al subir {name}: {result['error']}. Pulsa de nuevo 'Subir documentos' para reanudar la subida.")
+        else:
+            st.success(f"Documento {name} subido exitosamente.")
+
 # ➤ File Upload Section
 with st.expander("📤 Subir documentos", expanded=False):
     st.markdown("Sube archivos PDF, TXT o JSON para agregarlos al Knowledge Base.")
     uploaded_files = st.file_uploader("Selecciona archivos", type=["pdf", "txt", "json"], accept_multiple_files=True)
 
     if uploaded_files and st.button("Subir documentos"):
-        with st.spinner("Subiendo documentos..."):
-            for file in uploaded_files:
-                file_content = base64.b64encode(file.getvalue()).decode("utf-8")  # ✅ Convertir a Base64
-                payload = {
-                    "file_name": file.name,
-                    "file_content": file_content
-                }
-                response_upload = requests.post(UPLOAD_DOCUMENT_FUNCTION, json=payload)
-
-                if response_upload.status_code == 200:
-                    st.success(f"Documento {file.name} subido exitosamente.")
-                else:
-                    st.error(f"Error al subir {file.name}: {response_upload.text}")
+        upload_documents(uploaded_files)
 
 # 🔹 Model Selection
 st.sidebar.header("⚙️ Configuración del Modelo")
@@ -47,6 +61,22 @@ selected_model = st.sidebar.selectbox(
     list(model_options.keys()),
     index=0  # Por defecto, Claude
 )
+# Tras API Gateway REST la respuesta en streaming llega agrupada: cuando el backend lo indica, la opción se desactiva
+backend_buffers = get_client().streaming is False
+stream_responses = st.sidebar.checkbox(
+    "Mostrar la respuesta mientras se genera",
+    value=not backend_buffers,
+    disabled=backend_buffers,
+    help="El backend no puede enviar la respuesta en streaming (API Gateway REST); usa el servidor ASGI para verla mientras se genera." if backend_buffers else None
+) and not backend_buffers
+
+def iter_stream_tokens(events, errors):
+    """Devuelve el texto de los eventos de una respuesta en streaming del chatbot."""
+    for event in events:
+        if event["type"] == "token":
+            yield event["text"]
+        elif event["type"] == "error":
+            errors.append(event["error"])
 
 # 🔹 Chat History Initialization
 if "messages" not in st.session_state:
@@ -67,23 +97,23 @@ if user_input:
     # Store message in session history
     st.session_state.messages.append({"role": "user", "content": user_input})
 
-    # Prepare request payload (including session_id)
-    payload = {
-        "query": user_input,
-        "session_id": st.session_state.session_id,
-        "model": model_options[selected_model]
-    }
-
-    # Call AWS Lambda via API Gateway
-    with st.spinner(f"Esperando respuesta del {selected_model}..."):
-        response = requests.post(CHATBOT_FUNCTION, json=payload)
-
-    if response.status_code == 200:
-        ai_reply = response.json().get("response", "No se recibió respuesta.")
+    # Call AWS Lambda via API Gateway (session_id identifica la conversación)
+    query_model = model_options[selected_model]
+    try:
         with st.chat_message("assistant"):
-            st.markdown(ai_reply)
+            if stream_responses:
+                # ✅ Pintar los tokens a medida que llegan
+                stream_errors = []
+                events = get_client().stream_chat(user_input, st.session_state.session_id, query_model)
+                ai_reply = st.write_stream(iter_stream_tokens(events, stream_errors))
+                for error in stream_errors:
+                    st.error(f"Error en la respuesta del chatbot: {error}")
+            else:
+                with st.spinner(f"Esperando respuesta del {selected_model}..."):
+                    ai_reply = get_client().chat(user_input, st.session_state.session_id, query_model) or "No se recibió respuesta."
+                st.markdown(ai_reply)
 
         # Save response in session history
         st.session_state.messages.append({"role": "assistant", "content": ai_reply})
-    else:
-        st.error(f"Error en la respuesta del chatbot: {response.text}")
\ No newline at end of file
+    except ApiError as e:
+        st.error(f"Error en la respuesta del chatbot: {e.message}")
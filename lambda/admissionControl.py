@@ -0,0 +1,191 @@
+import json
+import os
+import random
+import threading
+import time
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from cacheUtils import get_cache_table
+from requestMetrics import get_logger
+
+# Control de admisión con token buckets: uno por sesión y uno por servicio de destino, para no superar las
+# cuotas de Bedrock y OpenAI. Sin token, la petición espera en una cola corta o se rechaza con un 429.
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "false").lower() == "true"
+# Peticiones por segundo sostenidas y ráfaga de cada sesión
+ADMISSION_SESSION_RATE = float(os.environ.get("ADMISSION_SESSION_RATE", "0.5"))
+ADMISSION_SESSION_BURST = float(os.environ.get("ADMISSION_SESSION_BURST", "5"))
+# Límites por servicio, p.ej. {"bedrock": {"rate": 10, "burst": 20}}. Servicios: 'guardrail' (ApplyGuardrail),
+# 'agent' (InvokeAgent), 'retrieve' (Retrieve), 'bedrock' y 'openai' (generación). Sin límite no se controla.
+ADMISSION_SERVICE_LIMITS = json.loads(os.environ.get("ADMISSION_SERVICE_LIMITS", "{}"))
+# Espera máxima por un token y número de peticiones que pueden esperar a la vez en el contenedor
+ADMISSION_MAX_WAIT_MS = float(os.environ.get("ADMISSION_MAX_WAIT_MS", "1500"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "16"))
+# Estado compartido entre contenedores en CACHE_TABLE; sin tabla (o con false) los límites son por contenedor
+ADMISSION_SHARED = os.environ.get("ADMISSION_SHARED", "true").lower() == "true"
+# Los buckets de sesión se borran por TTL cuando la sesión lleva este tiempo inactiva
+ADMISSION_SESSION_TTL_SECONDS = int(os.environ.get("ADMISSION_SESSION_TTL_SECONDS", "3600"))
+# Conflictos seguidos de escritura condicional antes de dar el bucket por saturado
+ADMISSION_MAX_CONFLICTS = 5
+
+logger = get_logger("admissionControl")
+
+class AdmissionRejected(Exception):
+    """No hay token en el bucket y la espera superaría el plazo (o la cola está llena)."""
+
+    def __init__(self, bucket, retry_after):
+        super().__init__(f"Rate limit exceeded ({bucket}), retry after {retry_after:.1f} s")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+def now_ms():
+    return int(time.time() * 1000)
+
+def refill(tokens, updated_at, now, rate, burst):
+    return min(burst, tokens + max(now - updated_at, 0) / 1000 * rate)
+
+def seconds_to_token(tokens, rate):
+    return (1 - tokens) / rate if rate > 0 else float("inf")
+
+class MemoryBuckets:
+    """Buckets del contenedor: (tokens, updated_at en ms) por bucket."""
+
+    def __init__(self):
+        self.state = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, ttl=None):
+        """Consume un token y devuelve 0, o devuelve los segundos que faltan para el siguiente."""
+
+        now = now_ms()
+        with self.lock:
+            tokens, updated_at = self.state.get(key, (burst, now))
+            tokens = refill(tokens, updated_at, now, rate, burst)
+            if tokens >= 1:
+                self.state[key] = (tokens - 1, now)
+                return 0.0
+            self.state[key] = (tokens, now)
+        return seconds_to_token(tokens, rate)
+
+class DynamoBuckets:
+    """Buckets compartidos en CACHE_TABLE ('admission#<bucket>'), actualizados con escrituras condicionales.
+
+    Cada contenedor parte del último estado (tokens, updated_at, version) que ha visto del bucket:
+    normalmente basta una escritura por token. Si otro contenedor lo ha cambiado entretanto, la condición
+    sobre la versión falla, DynamoDB devuelve el estado actual y se vuelve a calcular.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.known = {}
+        self.lock = threading.Lock()
+        self.deserializer = TypeDeserializer()
+
+    def take(self, key, rate, burst, ttl=None):
+        with self.lock:
+            known = self.known.get(key)
+        for _ in range(ADMISSION_MAX_CONFLICTS):
+            now = now_ms()
+            if known is None:
+                tokens, version = float(burst), 0
+                condition, values = "attribute_not_exists(cache_key)", {}
+            else:
+                tokens, version = refill(known[0], known[1], now, rate, burst), known[2]
+                condition, values = "version = :previous", {":previous": version}
+            if tokens < 1:
+                # El estado conocido solo puede sobrestimar los tokens: le faltan los consumos de otros contenedores
+                return seconds_to_token(tokens, rate)
+
+            update = "SET tokens = :tokens, updated_at = :now, version = :version"
+            values.update({":tokens": Decimal(str(round(tokens - 1, 6))), ":now": now, ":version": version + 1})
+            if ttl:
+                update += ", expires_at = :expires_at"
+                values[":expires_at"] = now // 1000 + ttl
+            try:
+                self.table.update_item(
+                    Key={"cache_key": f"admission#{key}"},
+                    UpdateExpression=update,
+                    ConditionExpression=condition,
+                    ExpressionAttributeValues=values,
+                    ReturnValuesOnConditionCheckFailure="ALL_OLD"
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+                known = self.parse(e.response.get("Item")) or self.read(key)
+                with self.lock:
+                    self.known[key] = known
+                continue
+            with self.lock:
+                self.known[key] = (tokens - 1, now, version + 1)
+            return 0.0
+        # Demasiados contenedores compitiendo por el mismo bucket: se trata como vacío
+        return seconds_to_token(0, rate)
+
+    def parse(self, item):
+        if not item:
+            return None
+        return self.state(self.deserializer.deserialize({"M": item}))
+
+    def read(self, key):
+        item = self.table.get_item(Key={"cache_key": f"admission#{key}"}, ConsistentRead=True).get("Item")
+        return self.state(item) if item else None
+
+    @staticmethod
+    def state(item):
+        return float(item["tokens"]), int(item["updated_at"]), int(item["version"])
+
+_buckets = None
+_queue = threading.BoundedSemaphore(ADMISSION_MAX_QUEUE)
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        table = get_cache_table() if ADMISSION_SHARED else None
+        _buckets = DynamoBuckets(table) if table is not None else MemoryBuckets()
+    return _buckets
+
+def acquire(bucket, rate, burst, max_wait_ms=ADMISSION_MAX_WAIT_MS, ttl=None):
+    """Consume un token del bucket esperando como mucho max_wait_ms; si no llega, lanza AdmissionRejected.
+
+    Solo ADMISSION_MAX_QUEUE peticiones del contenedor pueden estar esperando a la vez: el resto se rechaza
+    sin esperar. Si el estado compartido no está disponible la petición se admite.
+    """
+
+    deadline = time.monotonic() + max_wait_ms / 1000
+    queued = False
+    try:
+        while True:
+            try:
+                wait = get_buckets().take(bucket, rate, burst, ttl)
+            except Exception as e:
+                logger.error("Error en el control de admisión de %s, se admite la petición: %s", bucket, e)
+                return
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise AdmissionRejected(bucket, wait)
+            if not queued:
+                if not _queue.acquire(blocking=False):
+                    raise AdmissionRejected(bucket, wait)
+                queued = True
+            # Con jitter, para que las peticiones en cola no compitan todas a la vez por el siguiente token
+            time.sleep(min(wait * random.uniform(1, 1.2), max(deadline - time.monotonic(), 0)))
+    finally:
+        if queued:
+            _queue.release()
+
+def admit_session(session_id):
+    """Aplica el límite de peticiones de la sesión."""
+
+    if ADMISSION_ENABLED:
+        acquire(f"session#{session_id}", ADMISSION_SESSION_RATE, ADMISSION_SESSION_BURST,
+                ttl=ADMISSION_SESSION_TTL_SECONDS)
+
+def admit_service(service, max_wait_ms=ADMISSION_MAX_WAIT_MS):
+    """Aplica el límite de llamadas al servicio de destino, si está configurado."""
+
+    limits = ADMISSION_SERVICE_LIMITS.get(service)
+    if ADMISSION_ENABLED and limits:
+        rate = float(limits["rate"])
+        acquire(f"service#{service}", rate, float(limits.get("burst", rate)), max_wait_ms)
@@ -0,0 +1,115 @@
+import os
+from cacheUtils import CACHE_TABLE, TTLCache, SharedCacheTier, get_cache_table, normalize_query, query_hash
+from embeddings import embed_text
+from kbVersion import get_kb_version
+from requestMetrics import get_logger
+
+# Caché de respuestas finales (incluidas las referencias) de consultas SIMPLE/COMPLEX sin historial
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.environ.get("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "500"))
+# Sin CACHE_TABLE la versión de la KB que registra syncKnowledgeBase.py no llega a este contenedor: una
+# nueva ingesta no invalida las respuestas, que solo duran este tiempo
+ANSWER_CACHE_UNSHARED_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_UNSHARED_TTL_SECONDS", "300"))
+
+logger = get_logger("answerCache")
+if ANSWER_CACHE_ENABLED and not CACHE_TABLE:
+    logger.warning(
+        "ANSWER_CACHE_ENABLED sin CACHE_TABLE: las nuevas ingestas no invalidan la caché de respuestas; TTL limitado a %s s",
+        ANSWER_CACHE_UNSHARED_TTL_SECONDS
+    )
+    ANSWER_CACHE_TTL_SECONDS = min(ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_UNSHARED_TTL_SECONDS)
+
+# Nivel en memoria: sobrevive entre invocaciones en caliente del mismo contenedor
+local_cache = TTLCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS)
+_state = {"kb_version": None}
+
+def lookup_exact(user_query, selected_model):
+    """Busca la consulta normalizada en memoria y en DynamoDB.
+
+    Solo acierta con consultas idénticas a otras que ya pasaron el guardrail, por lo que puede hacerse antes
+    de él. Devuelve (respuesta o None, tipo de acierto o None).
+    """
+
+    key = answer_key(current_kb_version(), selected_model, user_query)
+
+    entry = local_cache.get(key)
+    if entry is not None:
+        return entry["response"], "exact"
+
+    shared_tier = get_shared_tier()
+    if shared_tier is not None:
+        entry = shared_tier.get(key)
+        if entry is not None:
+            local_cache.set(key, entry)
+            return entry["response"], "shared"
+    return None, None
+
+def semantic_embedding(user_query, selected_model):
+    """Embedding de la consulta, solo si hay entradas en memoria con las que compararlo (si no, None)."""
+
+    if not semantic_candidates(current_kb_version(), selected_model):
+        return None
+    return safe_embed(user_query)
+
+def lookup_semantic(selected_model, embedding):
+    """Devuelve la respuesta cacheada más parecida (similitud coseno por encima del umbral) o None.
+
+    Solo debe usarse con consultas que han pasado el guardrail y sin historial en la sesión.
+    """
+
+    if embedding is None:
+        return None
+    best_entry, best_score = None, ANSWER_CACHE_SIMILARITY_THRESHOLD
+    for entry in semantic_candidates(current_kb_version(), selected_model):
+        score = sum(a * b for a, b in zip(embedding, entry["embedding"]))
+        if score >= best_score:
+            best_entry, best_score = entry, score
+    return best_entry["response"] if best_entry is not None else None
+
+def semantic_candidates(kb_version, selected_model):
+    return [
+        entry for entry in local_cache.values()
+        if entry["kb_version"] == kb_version and entry["model"] == selected_model and entry["embedding"]
+    ]
+
+def store_answer(user_query, selected_model, model_response, embedding=None):
+    """Guarda la respuesta final en los dos niveles de la caché."""
+
+    kb_version = current_kb_version()
+    entry = {
+        "response": model_response,
+        "embedding": embedding if embedding is not None else safe_embed(user_query),
+        "model": selected_model,
+        "kb_version": kb_version
+    }
+    key = answer_key(kb_version, selected_model, user_query)
+    local_cache.set(key, entry)
+
+    shared_tier = get_shared_tier()
+    if shared_tier is not None:
+        shared_tier.set(key, entry, ANSWER_CACHE_TTL_SECONDS)
+
+def answer_key(kb_version, selected_model, user_query):
+    return query_hash(kb_version, selected_model, normalize_query(user_query))
+
+def current_kb_version():
+    """Devuelve la versión de la KB y vacía el nivel en memoria cuando ha cambiado (nueva ingesta)."""
+
+    kb_version = get_kb_version()
+    if _state["kb_version"] != kb_version:
+        local_cache.clear()
+        _state["kb_version"] = kb_version
+    return kb_version
+
+def get_shared_tier():
+    table = get_cache_table()
+    return SharedCacheTier(table, "answer") if table is not None else None
+
+def safe_embed(text):
+    try:
+        return embed_text(text)
+    except Exception as e:
+        logger.warning("Error calculando el embedding de la consulta: %s", e)
+        return None
@@ -1,28 +1,76 @@
 import json
-import boto3
-from boto3.dynamodb.conditions import Key
+import math
+import random
 import time
 import os
-import openai
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Servicios AWS
-bedrock = boto3.client('bedrock-runtime', region_name='eu-central-1')
-bedrock_agent = boto3.client('bedrock-agent-runtime')
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('memory-chatbot-python-rag')
-kb_client = boto3.client("bedrock-agent-runtime")
-
-#Clave openai
-openai.api_key = os.environ.get("OPENAI_API_KEY")
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from botocore.exceptions import ClientError
+import admissionControl
+import answerCache
+import awsClients
+import cacheUtils
+import chunkSelection
+import guardrailCache
+import queryClassifier
+import retrievalCache
+import retrievers
+import promptBuilder
+import historyStore
+import modelRouter
+import requestMetrics
+import speculativeGeneration
+
+# El fichero .env solo existe en local; en Lambda la configuración llega por variables de entorno
+if not os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# Servicios AWS y SDK de OpenAI: se crean la primera vez que se usan y se reutilizan en el contenedor
+HISTORY_TABLE = os.environ.get("HISTORY_TABLE", "memory-chatbot-python-rag")
+_retriever = None
+_openai = None
+_router = None
+
+# Modo concurrente: guardrail, clasificación, historial y KB (especulativa) se lanzan a la vez
+CONCURRENT_MODE = os.environ.get("CONCURRENT_MODE", "false").lower() == "true"
+# El pool se crea una vez por contenedor y se reutiliza en las invocaciones en caliente
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get("CONCURRENT_WORKERS", "8")))
+
+# Registro de clasificaciones (classification_log) para reentrenar el clasificador local: fracción de
+# decisiones registradas (por defecto ninguna) y si incluyen el texto de la consulta (si no, solo su hash)
+CLASSIFICATION_LOG_SAMPLE_RATE = float(os.environ.get("CLASSIFICATION_LOG_SAMPLE_RATE", "0"))
+CLASSIFICATION_LOG_QUERIES = os.environ.get("CLASSIFICATION_LOG_QUERIES", "false").lower() == "true"
+
+# Modo lote: varias consultas en una petición, procesadas con un pool de hilos acotado
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "100"))
+batch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("BATCH_WORKERS", "4")))
+# Con "output": "s3" los resultados se guardan en s3://BATCH_OUTPUT_BUCKET/BATCH_OUTPUT_PREFIX<batch_id>.jsonl
+BATCH_OUTPUT_BUCKET = os.environ.get("BATCH_OUTPUT_BUCKET", "bedrock-rag-prueba")
+BATCH_OUTPUT_PREFIX = os.environ.get("BATCH_OUTPUT_PREFIX", "batchResults/")
+
+STREAM_CONTENT_TYPE = "application/x-ndjson"
+# Indica al cliente si la respuesta NDJSON llega según se genera ("true") o agrupada ("false", tras API Gateway)
+STREAMING_HEADER = "X-Chatbot-Streaming"
+SUPPORTED_MODELS = ("bedrock", "openai")
+# Valores posibles de la dimensión Classification de las métricas (el resto se agrupa en UNCLASSIFIED)
+METRIC_CLASSIFICATIONS = ("SIMPLE", "COMPLEX", "NULL", "GUARDRAIL_INTERVENED", "ERROR", "THROTTLED")
+# Retry-After de los 429 por throttling de un servicio de AWS (los del control de admisión llevan el suyo)
+THROTTLED_RETRY_AFTER_SECONDS = 1
+OUT_OF_SCOPE_RESPONSE = "Lo siento, pero únicamente puedo contestar preguntas sobre lenguajes de programación o conceptos tecnológicos relacionados.\nReformule su pregunta e inténtelo de nuevo."
+
+logger = requestMetrics.get_logger("app")
 
 def lambda_handler(event, context):
     """Función lambda encargada de responder las preguntas del usuario utilizando Bedrock Knowledge Base"""
 
+    metrics = requestMetrics.RequestMetrics()
+    selected_model = None
     try:
         body = json.loads(event["body"])
+        if "items" in body:
+            return handle_batch(body, context)
+
         user_query = body.get("query", "")
         session_id = body.get("session_id", "")
         selected_model = body.get("model", "bedrock")
@@ -38,86 +86,35 @@ def lambda_handler(event, context):
                 "body": json.dumps({"error": "Missing query or session_id"})
             }
 
-        #Aplicar filtro de guardaraíles
-        guardrail_response = bedrock.apply_guardrail(
-            guardrailIdentifier=os.environ.get('GUARDRAIL_ID'),
-            guardrailVersion='1',  
-            source='INPUT',
-            content=[{
-                'text': {
-                    'text': user_query
-                }
-            }]
-        )
-        print(guardrail_response)
-
-        if guardrail_response['action'] == 'GUARDRAIL_INTERVENED':
+        if selected_model not in SUPPORTED_MODELS:
             return {
-                "statusCode": 200,
+                "statusCode": 400,
                 "headers": {
                     "Access-Control-Allow-Origin": "*",
                     "Access-Control-Allow-Methods": "*",
                     "Access-Control-Allow-Headers": "*"
                 },
-                "body": json.dumps({"response": "Lo siento, pero únicamente puedo contestar preguntas sobre lenguajes de programación o conceptos tecnológicos relacionados.\nReformule su pregunta e inténtelo de nuevo."})
+                "body": json.dumps({"error": f"Unsupported model: {selected_model}"})
             }
 
-        #Clasificar pregunta del usuario
-        prompt_clasification = classificate_prompt_agent(user_query, session_id)
-
-        if prompt_clasification == 'COMPLEX':
-            # Obtener historial de conversación
-            conversation_history = get_conversation_history(session_id)
-
-            # Obtener chunks relevantes de 'Knowledge Base'
-            content_list, metadata_list = retrieve_from_kb(user_query)
-            localizaciones = []  
-            references = "\nReferencias:\n"
-            for meta in metadata_list:
-                uri = meta['source_uri']
-                if uri and uri not in localizaciones:
-                    localizaciones.append(uri)
-                    url = get_public_url(uri)
-                    page = meta['page_number']
-                    references += f"- {url} (Página {page})\n"
-
-            # Añadirlos al prompt
-            formatted_prompt = format_complex_prompt(user_query, content_list, conversation_history)
-
-            # Pasar el prompt al bedrock para que genere la respuesta
-            if selected_model == "bedrock":
-                response = query_bedrock(formatted_prompt)#Claude
-                model_response = response['content'][0]['text']#Claude
-
-            elif selected_model == "openai":
-                model_response = openai_response(formatted_prompt, user_query)#openAI
-
-            model_response += "\n"
-            model_response += references
-            print(f"Respuesta del modelo: {model_response}")
-
-        elif prompt_clasification == 'SIMPLE':
-            # Obtener historial de conversación
-            conversation_history = get_conversation_history(session_id)
-
-            # Añadirlos al prompt
-            formatted_prompt = format_simple_prompt(user_query, conversation_history)
-
-            # Pasar el prompt al bedrock para que genere la respuesta
-            if selected_model == "bedrock":
-                response = query_bedrock(formatted_prompt)#Claude
-                model_response = response['content'][0]['text']#Claude
-            elif selected_model == "openai":
-                model_response = openai_response(formatted_prompt, user_query) #openAI
-            print(f"Respuesta del modelo: {model_response}")
-
-        elif prompt_clasification == 'NULL':
-            model_response = "Lo siento, pero únicamente puedo contestar preguntas sobre lenguajes de programación o conceptos tecnológicos relacionados.\nReformule su pregunta e inténtelo de nuevo."
-        else:
-            model_response = "El agente no clasificó correctamente, vuelva a intentarlo."
+        admissionControl.admit_session(session_id)
+        chat = prepare_chat(user_query, session_id, selected_model, metrics)
+
+        if body.get("stream"):
+            # Respuesta en streaming (NDJSON): tokens a medida que llegan y las referencias al final
+            return {
+                "statusCode": 200,
+                "headers": {
+                    "Access-Control-Allow-Origin": "*",
+                    "Access-Control-Allow-Methods": "*",
+                    "Access-Control-Allow-Headers": "*",
+                    "Content-Type": STREAM_CONTENT_TYPE,
+                    STREAMING_HEADER: streaming_header(context)
+                },
+                "body": response_body(stream_chat(chat), context)
+            }
 
-        # Almacenar la interacción en DynamoDB
-        store_interaction(session_id, user_query, model_response)
+        model_response = complete_chat(chat)
 
         # Return con la respuesta del modelo
         return {
@@ -130,16 +127,682 @@ def lambda_handler(event, context):
             "body": json.dumps({"response": model_response})
         }
     except Exception as e:
+        status = error_status(e)
+        if status == 429:
+            logger.warning("Petición rechazada: %s", e)
+        else:
+            logger.exception("Error procesando la petición")
+        metrics.emit(metric_dimensions(selected_model, "THROTTLED" if status == 429 else "ERROR"), error=str(e))
+        headers = {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "*",
+            "Access-Control-Allow-Headers": "*"
+        }
+        retry_after = retry_after_seconds(e)
+        if retry_after is not None:
+            headers["Retry-After"] = str(max(math.ceil(retry_after), 1))
         return {
-            "statusCode": 500,
+            "statusCode": status,
+            "headers": headers,
+            "body": json.dumps({"error": str(e)})
+        }
+
+def error_status(error):
+    # Límite de admisión o throttling de un servicio: 429 con Retry-After
+    if retry_after_seconds(error) is not None:
+        return 429
+    # Ningún modelo disponible (circuitos abiertos, throttling persistente): el cliente puede reintentar
+    return 503 if isinstance(error, modelRouter.ModelUnavailableError) else 500
+
+def retry_after_seconds(error):
+    """Segundos que el cliente debe esperar antes de reintentar, o None si el error no es de límite de tasa."""
+
+    if isinstance(error, admissionControl.AdmissionRejected):
+        return error.retry_after
+    if isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in modelRouter.BEDROCK_THROTTLING_CODES:
+        return THROTTLED_RETRY_AFTER_SECONDS
+    return None
+
+def response_body(chunks, context):
+    """Cuerpo NDJSON: agrupado en Lambda; el servidor ASGI (context.streaming) envía cada línea según se genera."""
+
+    return chunks if getattr(context, "streaming", False) else "".join(chunks)
+
+def streaming_header(context):
+    return "true" if getattr(context, "streaming", False) else "false"
+
+def handle_batch(body, context=None):
+    """Responde un lote de consultas {"query", "session_id", "model"} en "items".
+
+    Por defecto devuelve {"batch_id", "results"}; con "stream": true, una línea NDJSON por elemento en el
+    orden de entrada; con "output": "s3", guarda las líneas como JSONL en S3 y devuelve su URI.
+    Los errores de cada elemento van en su resultado y no hacen fallar el lote.
+    """
+
+    items = body["items"]
+    if not isinstance(items, list) or not items:
+        return build_response(400, {"error": "items must be a non-empty list"})
+    if len(items) > BATCH_MAX_ITEMS:
+        return build_response(400, {"error": f"Too many items: {len(items)} (max {BATCH_MAX_ITEMS})"})
+
+    batch_id = str(uuid.uuid4())
+    results = run_batch(items, batch_id)
+
+    if body.get("output") == "s3":
+        results = list(results)
+        key = f"{BATCH_OUTPUT_PREFIX}{batch_id}.jsonl"
+        s3().put_object(
+            Bucket=BATCH_OUTPUT_BUCKET,
+            Key=key,
+            Body="".join(json.dumps(result) + "\n" for result in results).encode("utf-8"),
+            ContentType=STREAM_CONTENT_TYPE
+        )
+        return build_response(200, {
+            "batch_id": batch_id,
+            "output_uri": f"s3://{BATCH_OUTPUT_BUCKET}/{key}",
+            "items": len(results),
+            "errors": sum("error" in result for result in results)
+        })
+
+    if body.get("stream"):
+        return {
+            "statusCode": 200,
             "headers": {
                 "Access-Control-Allow-Origin": "*",
                 "Access-Control-Allow-Methods": "*",
-                "Access-Control-Allow-Headers": "*"
+                "Access-Control-Allow-Headers": "*",
+                "Content-Type": STREAM_CONTENT_TYPE,
+                STREAMING_HEADER: streaming_header(context)
             },
-            "body": json.dumps({"error": str(e)})
+            "body": response_body((json.dumps(result) + "\n" for result in results), context)
         }
 
+    return build_response(200, {"batch_id": batch_id, "results": list(results)})
+
+def run_batch(items, batch_id):
+    """Procesa un lote y devuelve un iterador con el resultado de cada elemento en el orden de entrada.
+
+    Las consultas de una misma sesión se procesan en orden en el mismo hilo, para que cada una vea el
+    historial de las anteriores. Los elementos repetidos (misma consulta normalizada, modelo y sesión) se
+    responden una sola vez, y el guardrail, la clasificación y la recuperación de la KB se comparten entre
+    consultas iguales de distintas sesiones.
+    """
+
+    batch_metrics = requestMetrics.RequestMetrics()
+    shared = cacheUtils.SharedResults()
+    futures = {}
+    duplicates = {}
+    first_index = {}
+    sessions = {}
+    for index, item in enumerate(items):
+        error = validate_batch_item(item)
+        if error is not None:
+            futures[index] = Future()
+            futures[index].set_result({"status": 400, "error": error})
+            continue
+        key = (cacheUtils.normalize_query(item["query"]), item.get("model", "bedrock"), item["session_id"])
+        if key in first_index:
+            duplicates[index] = first_index[key]
+            continue
+        first_index[key] = index
+        futures[index] = Future()
+        sessions.setdefault(item["session_id"], []).append(index)
+
+    for indexes in sessions.values():
+        batch_executor.submit(run_batch_session, items, indexes, futures, batch_id, shared)
+
+    errors = 0
+    for index in range(len(items)):
+        if index in duplicates:
+            result = {**futures[duplicates[index]].result(), "duplicate_of": duplicates[index]}
+        else:
+            result = futures[index].result()
+        errors += int("error" in result)
+        yield {"index": index, **result}
+
+    batch_metrics.count("batch_items", len(items))
+    batch_metrics.count("batch_duplicates", len(duplicates))
+    batch_metrics.count("batch_shared_stages", shared.hits)
+    batch_metrics.count("batch_errors", errors)
+    batch_metrics.properties["batch_id"] = batch_id
+    batch_metrics.emit({"Classification": "BATCH"})
+
+def validate_batch_item(item):
+    """Devuelve el error de un elemento mal formado o None si es válido."""
+
+    if not isinstance(item, dict) or not item.get("query") or not item.get("session_id"):
+        return "Missing query or session_id"
+    # Un tipo inesperado fallaría dentro del lote (normalización, clave de deduplicación, DynamoDB)
+    if not isinstance(item["query"], str) or not isinstance(item["session_id"], str):
+        return "query and session_id must be strings"
+    model = item.get("model", "bedrock")
+    if not isinstance(model, str) or model not in SUPPORTED_MODELS:
+        return f"Unsupported model: {model}"
+    return None
+
+def run_batch_session(items, indexes, futures, batch_id, shared):
+    for index in indexes:
+        futures[index].set_result(run_batch_item(items[index], batch_id, shared))
+
+def run_batch_item(item, batch_id, shared):
+    """Responde un elemento del lote con su propio registro de métricas."""
+
+    selected_model = item.get("model", "bedrock")
+    metrics = requestMetrics.RequestMetrics()
+    metrics.properties["batch_id"] = batch_id
+    try:
+        # Cada elemento consume del bucket de su sesión, como una petición suelta
+        admissionControl.admit_session(item["session_id"])
+        chat = prepare_chat(item["query"], item["session_id"], selected_model, metrics, shared)
+        return {"status": 200, "response": complete_chat(chat), "classification": chat["classification"]}
+    except Exception as e:
+        status = error_status(e)
+        if status == 429:
+            logger.warning("Elemento del lote rechazado: %s", e)
+        else:
+            logger.exception("Error procesando un elemento del lote")
+        metrics.emit(metric_dimensions(selected_model, "THROTTLED" if status == 429 else "ERROR"), error=str(e))
+        result = {"status": status, "error": str(e)}
+        if status == 429:
+            result["retry_after"] = retry_after_seconds(e)
+        return result
+
+def build_response(status_code, payload):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "*",
+            "Access-Control-Allow-Headers": "*"
+        },
+        "body": json.dumps(payload)
+    }
+
+def prepare_chat(user_query, session_id, selected_model, metrics, shared=None):
+    """Ejecuta todo lo previo a la generación y devuelve el prompt (o la respuesta fija) de la petición.
+
+    shared (cacheUtils.SharedResults) comparte guardrail, clasificación y KB entre las consultas de un lote.
+    """
+
+    chat = {
+        "query": user_query,
+        "session_id": session_id,
+        "model": selected_model,
+        "metrics": metrics,
+        # Tokens de entrada/salida que devuelve el modelo
+        "usage": {},
+        # Decisión del router de modelos: proveedor, cobertura, alternativa e intentos
+        "routing": {},
+        "classification": None,
+        "prompt": None,
+        "references": "",
+        "fixed_response": None,
+        "store": True,
+        "cacheable": False,
+        "query_embedding": None,
+        # Generación especulativa del prompt SIMPLE lanzada durante la clasificación
+        "speculation": None
+    }
+
+    # Respuesta cacheada de una consulta idéntica (la búsqueda por similitud espera al guardrail). Como las
+    # respuestas cacheadas no dependen del historial, solo se usan en sesiones sin turnos previos
+    embedding_future = None
+    preloaded_history = None
+    if answerCache.ANSWER_CACHE_ENABLED:
+        preloaded_history = metrics.timed("history", get_conversation_history, session_id)
+    if answerCache.ANSWER_CACHE_ENABLED and not preloaded_history:
+        cached_response, cache_match = metrics.timed("answer_cache", answerCache.lookup_exact, user_query, selected_model)
+        metrics.count("answer_cache_hit", int(cached_response is not None))
+        if cached_response is not None:
+            chat["classification"] = f"CACHE_HIT_{cache_match.upper()}"
+            chat["fixed_response"] = cached_response
+            return chat
+        if CONCURRENT_MODE:
+            # El embedding se calcula a la vez que el guardrail y la clasificación
+            embedding_future = executor.submit(
+                metrics.timed, "answer_cache_embed", answerCache.semantic_embedding, user_query, selected_model
+            )
+
+    # Con la mayoría de consultas SIMPLE, su respuesta se empieza a generar mientras se clasifica
+    def start_speculation(conversation_history):
+        prompt = metrics.timed("prompt", format_simple_prompt, user_query, conversation_history)
+        chat["speculation"] = speculativeGeneration.SpeculativeGeneration(stream_response, selected_model, prompt)
+
+    speculate = None
+    if speculativeGeneration.SPECULATIVE_SIMPLE and shared is None:
+        if speculativeGeneration.guard.allow():
+            speculate = start_speculation
+        else:
+            metrics.properties["speculation"] = {"outcome": "skipped", "simple_ratio": speculativeGeneration.guard.ratio()}
+
+    # Guardrail, clasificación, historial y chunks de la 'Knowledge Base'
+    try:
+        if CONCURRENT_MODE:
+            context_result = gather_context_concurrent(user_query, session_id, metrics, shared, speculate, preloaded_history)
+        else:
+            context_result = gather_context_sequential(user_query, session_id, metrics, shared, speculate, preloaded_history)
+    except Exception:
+        if chat["speculation"] is not None:
+            chat["speculation"].cancel()
+        raise
+    guardrail_intervened, prompt_clasification, conversation_history, kb_result = context_result
+
+    if speculativeGeneration.SPECULATIVE_SIMPLE and not guardrail_intervened:
+        speculativeGeneration.guard.record(prompt_clasification)
+
+    # Solo se cachean (y se buscan por similitud) las respuestas que no dependen del historial
+    cached_response = None
+    chat["cacheable"] = answerCache.ANSWER_CACHE_ENABLED and not guardrail_intervened and not conversation_history
+    if chat["cacheable"] and prompt_clasification in ('SIMPLE', 'COMPLEX'):
+        cached_response = lookup_semantic_answer(chat, embedding_future)
+    elif embedding_future is not None:
+        embedding_future.cancel()
+
+    speculation = chat["speculation"]
+    if speculation is not None:
+        if prompt_clasification == 'SIMPLE' and cached_response is None:
+            speculation.keep()
+        else:
+            speculation.cancel()
+
+    if guardrail_intervened:
+        chat["classification"] = "GUARDRAIL_INTERVENED"
+        chat["fixed_response"] = OUT_OF_SCOPE_RESPONSE
+        chat["store"] = False
+        return chat
+
+    if cached_response is not None:
+        chat["classification"] = "CACHE_HIT_SEMANTIC"
+        chat["fixed_response"] = cached_response
+        chat["cacheable"] = False
+        return chat
+
+    chat["classification"] = prompt_clasification
+    if prompt_clasification == 'COMPLEX':
+        content_list, metadata_list, degraded = kb_result
+        if degraded:
+            # Respuesta sin contexto por un fallo de la KB: no se cachea
+            chat["cacheable"] = False
+        localizaciones = []  
+        references = "\nReferencias:\n"
+        for meta in metadata_list:
+            uri = meta['source_uri']
+            if uri and uri not in localizaciones:
+                localizaciones.append(uri)
+                url = get_public_url(uri)
+                page = meta['page_number']
+                references += f"- {url} (Página {page})\n" if page is not None else f"- {url}\n"
+
+        # Añadirlos al prompt
+        chat["prompt"] = metrics.timed("prompt", format_complex_prompt, user_query, content_list, conversation_history)
+        chat["references"] = references
+
+    elif prompt_clasification == 'SIMPLE':
+        # Añadirlos al prompt (la generación especulativa ya lo ha construido con el mismo historial)
+        if speculation is not None:
+            chat["prompt"] = speculation.prompt
+        else:
+            chat["prompt"] = metrics.timed("prompt", format_simple_prompt, user_query, conversation_history)
+
+    elif prompt_clasification == 'NULL':
+        chat["cacheable"] = False
+        chat["fixed_response"] = OUT_OF_SCOPE_RESPONSE
+    else:
+        chat["cacheable"] = False
+        chat["fixed_response"] = "El agente no clasificó correctamente, vuelva a intentarlo."
+
+    return chat
+
+def lookup_semantic_answer(chat, embedding_future=None):
+    """Busca por similitud del embedding una respuesta cacheada para una consulta que ha pasado el guardrail."""
+
+    metrics = chat["metrics"]
+    if embedding_future is not None:
+        embedding = embedding_future.result()
+    else:
+        embedding = metrics.timed("answer_cache_embed", answerCache.semantic_embedding, chat["query"], chat["model"])
+    chat["query_embedding"] = embedding
+    cached_response = answerCache.lookup_semantic(chat["model"], embedding)
+    metrics.count("answer_cache_hit", int(cached_response is not None))
+    return cached_response
+
+def complete_chat(chat):
+    """Genera la respuesta completa de una petición preparada (modo sin streaming)."""
+
+    with chat["metrics"].span("generate"):
+        if chat["prompt"] is None:
+            model_response = chat["fixed_response"]
+        else:
+            # Pasar el prompt al modelo para que genere la respuesta (o recoger la generación especulativa)
+            if kept_speculation(chat):
+                model_response = "".join(chat["speculation"].consume(chat["usage"], chat["routing"]))
+            else:
+                model_response = generate_response(chat["model"], chat["prompt"], chat["usage"], chat["routing"])
+            if chat["references"]:
+                model_response += "\n"
+                model_response += chat["references"]
+            logger.debug("Respuesta del modelo: %s", model_response)
+
+    finish_chat(chat, model_response)
+    return model_response
+
+def stream_chat(chat):
+    """Genera la respuesta de una petición preparada como eventos NDJSON.
+
+    Emite un evento 'token' por cada fragmento del modelo, las referencias como último
+    'token' y un evento 'done' al terminar (o 'error' si la generación falla a mitad).
+    """
+
+    metrics = chat["metrics"]
+    generate_start = time.perf_counter()
+    parts = []
+    try:
+        if chat["prompt"] is None:
+            parts.append(chat["fixed_response"])
+            yield stream_event("token", text=chat["fixed_response"])
+        else:
+            if kept_speculation(chat):
+                chunks = chat["speculation"].consume(chat["usage"], chat["routing"])
+            else:
+                chunks = stream_response(chat["model"], chat["prompt"], chat["usage"], chat["routing"])
+            for text in chunks:
+                if not parts:
+                    metrics.mark("first_token")
+                parts.append(text)
+                yield stream_event("token", text=text)
+            if chat["references"]:
+                references = "\n" + chat["references"]
+                parts.append(references)
+                yield stream_event("token", text=references)
+    except Exception as e:
+        logger.exception("Error durante el streaming de la respuesta")
+        metrics.spans["generate"] = requestMetrics.elapsed_ms(generate_start)
+        emit_metrics(chat, error=str(e))
+        # La respuesta ya ha empezado con 200: el rechazo por límite de tasa va en el evento
+        fields = {"status": 429, "retry_after": retry_after_seconds(e)} if error_status(e) == 429 else {}
+        yield stream_event("error", error=str(e), **fields)
+        return
+    metrics.spans["generate"] = requestMetrics.elapsed_ms(generate_start)
+
+    finish_chat(chat, "".join(parts))
+    yield stream_event("done")
+
+def kept_speculation(chat):
+    return chat["speculation"] is not None and chat["speculation"].kept
+
+def stream_event(event_type, **fields):
+    return json.dumps({"type": event_type, **fields}) + "\n"
+
+def finish_chat(chat, model_response):
+    """Almacena la interacción en DynamoDB, cachea la respuesta y emite las métricas de la petición."""
+
+    metrics = chat["metrics"]
+    if chat["store"]:
+        metrics.timed("store", store_interaction, chat["session_id"], chat["query"], model_response)
+    if chat["cacheable"]:
+        metrics.timed(
+            "answer_cache_store", answerCache.store_answer,
+            chat["query"], chat["model"], model_response, chat["query_embedding"]
+        )
+    emit_metrics(chat)
+
+def emit_metrics(chat, error=None):
+    """Emite el registro EMF de la petición con tiempos por etapa, tokens y aciertos de caché."""
+
+    metrics = chat["metrics"]
+    metrics.add_usage(chat["usage"])
+    metrics.properties["concurrent"] = CONCURRENT_MODE
+    metrics.properties["classification_raw"] = chat["classification"]
+    if chat["prompt"] is not None:
+        metrics.properties["prompt_tokens"] = chat["prompt"]["tokens"]
+    if chat["usage"].get("estimated"):
+        metrics.properties["usage_estimated"] = True
+    if chat["routing"]:
+        metrics.properties["routing"] = chat["routing"]
+        metrics.count("model_hedged", int(chat["routing"]["hedged"]))
+        metrics.count("model_fallback", int(chat["routing"]["fallback"]))
+        metrics.count("model_retries", sum(attempt.get("retries", 0) for attempt in chat["routing"]["attempts"]))
+    if chat["speculation"] is not None:
+        report = chat["speculation"].report()
+        metrics.properties["speculation"] = report
+        metrics.count("speculation_kept", int(chat["speculation"].kept))
+        if chat["speculation"].kept:
+            metrics.spans["speculation_saved"] = report["saved_ms"]
+        else:
+            metrics.count("speculation_wasted_tokens", report["wasted_input_tokens"] + report["wasted_output_tokens"])
+    if retrievalCache.RETRIEVAL_CACHE_ENABLED:
+        metrics.properties["retrieval_cache"] = retrievalCache.stats()
+    metrics.emit(metric_dimensions(chat["model"], chat["classification"]), error=error)
+
+def metric_dimensions(selected_model, classification):
+    """Dimensiones de las métricas con cardinalidad acotada (el modelo y la clasificación llegan de fuera)."""
+
+    if classification not in METRIC_CLASSIFICATIONS and not str(classification).startswith("CACHE_HIT_"):
+        classification = "UNCLASSIFIED"
+    return {
+        "Model": selected_model if selected_model in SUPPORTED_MODELS else "unknown",
+        "Classification": classification
+    }
+
+def generate_response(selected_model, prompt, usage=None, routing=None):
+    """Genera la respuesta completa con el router de modelos y acumula los tokens en usage."""
+
+    return get_router().generate(selected_model, prompt, usage, routing)
+
+def stream_response(selected_model, prompt, usage=None, routing=None, cancellation=None):
+    """Devuelve un iterador con los fragmentos de texto del router de modelos."""
+
+    return get_router().stream(selected_model, prompt, usage, routing, cancellation)
+
+def gather_context_sequential(user_query, session_id, metrics, shared=None, speculate=None, history=None):
+    """Ejecuta guardrail, clasificación, historial y KB uno detrás de otro, solo cuando hacen falta.
+
+    Con speculate(historial), el historial se lee antes de clasificar para lanzar la generación especulativa.
+    history es el historial si ya se ha leído (caché de respuestas).
+    """
+
+    apply_guardrail, classify_query, retrieve_context = context_stages(metrics, shared)
+    if metrics.timed("guardrail", apply_guardrail, user_query, metrics):
+        return True, None, [], None
+
+    conversation_history = history
+    if speculate is not None:
+        if conversation_history is None:
+            conversation_history = metrics.timed("history", get_conversation_history, session_id)
+        speculate(conversation_history)
+
+    prompt_clasification = metrics.timed("classify", classify_query, user_query, session_id)
+    if prompt_clasification not in ('SIMPLE', 'COMPLEX'):
+        return False, prompt_clasification, [], None
+
+    if conversation_history is None:
+        conversation_history = metrics.timed("history", get_conversation_history, session_id)
+    if prompt_clasification == 'SIMPLE':
+        return False, prompt_clasification, conversation_history, None
+
+    kb_result = metrics.timed("retrieve", retrieve_context, user_query, metrics)
+    return False, prompt_clasification, conversation_history, kb_result
+
+def gather_context_concurrent(user_query, session_id, metrics, shared=None, speculate=None, history=None):
+    """Lanza a la vez guardrail, clasificación, historial y una recuperación especulativa de la KB.
+
+    El trabajo especulativo se cancela (o se descarta si ya está en curso) cuando el guardrail
+    interviene o la consulta se clasifica como NULL/SIMPLE. Con speculate(historial), la generación
+    especulativa empieza al pasar el guardrail, sin esperar a la clasificación. history es el historial
+    si ya se ha leído (caché de respuestas).
+    """
+
+    apply_guardrail, classify_query, retrieve_context = context_stages(metrics, shared)
+    guardrail_future = executor.submit(metrics.timed, "guardrail", apply_guardrail, user_query, metrics)
+    classify_future = executor.submit(metrics.timed, "classify", classify_query, user_query, session_id)
+    if history is None:
+        history_future = executor.submit(metrics.timed, "history", get_conversation_history, session_id)
+    else:
+        history_future = Future()
+        history_future.set_result(history)
+    kb_future = executor.submit(metrics.timed, "retrieve", retrieve_context, user_query, metrics, True)
+
+    if guardrail_future.result():
+        discard_speculative(metrics, classify=classify_future, history=history_future, retrieve=kb_future)
+        return True, None, [], None
+
+    if speculate is not None:
+        speculate(history_future.result())
+
+    prompt_clasification = classify_future.result()
+    if prompt_clasification not in ('SIMPLE', 'COMPLEX'):
+        discard_speculative(metrics, history=history_future, retrieve=kb_future)
+        return False, prompt_clasification, [], None
+
+    if prompt_clasification == 'SIMPLE':
+        discard_speculative(metrics, retrieve=kb_future)
+        return False, prompt_clasification, history_future.result(), None
+
+    return False, prompt_clasification, history_future.result(), kb_future.result()
+
+def context_stages(metrics, shared=None):
+    """Guardrail, clasificación y recuperación de la KB; en un lote, compartidos entre consultas iguales."""
+
+    if shared is None:
+        return apply_guardrail, classify_query, retrieve_context
+
+    def shared_stage(stage, func):
+        def run(user_query, *args):
+            result, computed = shared.get_or_compute((stage, cacheUtils.normalize_query(user_query)), func, user_query, *args)
+            if not computed:
+                metrics.properties.setdefault("shared", []).append(stage)
+            return result
+        return run
+
+    return (
+        shared_stage("guardrail", apply_guardrail),
+        shared_stage("classify", classify_query),
+        shared_stage("retrieve", retrieve_context)
+    )
+
+def discard_speculative(metrics, **futures):
+    """Cancela las tareas especulativas que no han empezado y descarta el resultado del resto."""
+
+    discarded = metrics.properties.setdefault("discarded", [])
+    for stage, future in futures.items():
+        future.cancel()
+        discarded.append(stage)
+
+def bedrock():
+    return awsClients.get_client('bedrock-runtime', region_name='eu-central-1')
+
+def agent_runtime():
+    """Cliente único de bedrock-agent-runtime para el agente clasificador y la Knowledge Base."""
+
+    return awsClients.get_client('bedrock-agent-runtime')
+
+def s3():
+    return awsClients.get_client('s3', region_name='eu-central-1')
+
+def history_table():
+    return awsClients.get_table(HISTORY_TABLE)
+
+def get_retriever():
+    global _retriever
+    if _retriever is None:
+        _retriever = retrievers.create_retriever(agent_runtime())
+    return _retriever
+
+def get_router():
+    """Router de Bedrock (Claude) y OpenAI con reintentos, circuito, alternativa y cobertura."""
+
+    global _router
+    if _router is None:
+        _router = modelRouter.ModelRouter(
+            [modelRouter.BedrockProvider(), modelRouter.OpenAIProvider(get_openai)], admit=admit_model
+        )
+    return _router
+
+def admit_model(provider_name, primary):
+    # El modelo elegido espera turno en la cola; la alternativa y la cobertura solo se lanzan si hay token
+    admissionControl.admit_service(provider_name, admissionControl.ADMISSION_MAX_WAIT_MS if primary else 0)
+
+def get_openai():
+    """Importa y configura el SDK de OpenAI solo cuando se usa ese modelo."""
+
+    global _openai
+    if _openai is None:
+        import openai
+        openai.api_key = os.environ.get("OPENAI_API_KEY")
+        _openai = openai
+    return _openai
+
+def apply_guardrail(user_query, metrics=None):
+    """Comprueba la consulta con el prefiltro local, la caché de veredictos o el guardrail de entrada.
+
+    Devuelve True si ha intervenido.
+    """
+
+    intervened, source = guardrailCache.check(user_query, call_guardrail)
+    if metrics is not None:
+        metrics.properties["guardrail_source"] = source
+        if guardrailCache.GUARDRAIL_CACHE_ENABLED:
+            metrics.count("guardrail_cache_hit", int(source in ("local", "shared")))
+    return intervened
+
+def call_guardrail(user_query):
+    """Aplica el guardrail de entrada de Bedrock y devuelve True si ha intervenido."""
+
+    admissionControl.admit_service("guardrail")
+    guardrail_response = bedrock().apply_guardrail(
+        guardrailIdentifier=guardrailCache.GUARDRAIL_ID,
+        guardrailVersion=guardrailCache.GUARDRAIL_VERSION,
+        source='INPUT',
+        content=[{
+            'text': {
+                'text': user_query
+            }
+        }]
+    )
+    logger.debug("Respuesta del guardrail: %s", guardrail_response)
+    return guardrail_response['action'] == 'GUARDRAIL_INTERVENED'
+
+def classify_query(user_query, session_id):
+    """Clasifica la consulta con el modelo local si está seguro y, si no, con el agente de Bedrock."""
+
+    local_label, local_confidence = queryClassifier.classify(user_query)
+    if local_label is not None and local_confidence >= queryClassifier.CLASSIFIER_CONFIDENCE_THRESHOLD:
+        log_classification(user_query, "local", local_label, local_label, local_confidence)
+        return local_label
+
+    agent_start = time.perf_counter()
+    agent_response = classificate_prompt_agent(user_query, session_id)
+    agent_ms = requestMetrics.elapsed_ms(agent_start)
+    agent_label = queryClassifier.parse_label(agent_response)
+    log_classification(user_query, "agent", agent_label, local_label, local_confidence, agent_ms)
+
+    if agent_label is not None:
+        return agent_label
+    # Si la salida del agente no se puede interpretar se usa la etiqueta local, aunque sea poco segura
+    return local_label or agent_response
+
+def log_classification(user_query, source, label, local_label, local_confidence, agent_ms=None):
+    """Registra una muestra de las decisiones de clasificación; las del agente sirven de etiquetas para reentrenar.
+
+    El texto de la consulta solo se incluye con CLASSIFICATION_LOG_QUERIES=true.
+    """
+
+    logger.debug("Clasificación %s (%s); local %s con confianza %.3f", label, source, local_label, local_confidence)
+    if random.random() >= CLASSIFICATION_LOG_SAMPLE_RATE:
+        return
+    record = {
+        "source": source,
+        "label": label,
+        "local_label": local_label,
+        "local_confidence": round(local_confidence, 4),
+        "agent_ms": agent_ms
+    }
+    if CLASSIFICATION_LOG_QUERIES:
+        record["query"] = user_query
+    else:
+        record["query_hash"] = cacheUtils.query_hash(cacheUtils.normalize_query(user_query))
+    logger.info(json.dumps({"classification_log": record}))
+
 def classificate_prompt_agent(user_prompt, session_id):
     kwargs = {
             "agentAliasId": os.environ.get('AGENT_ALIAS_ID'),
@@ -148,7 +811,8 @@ def classificate_prompt_agent(user_prompt, session_id):
             "inputText": "Classify into 'NULL', 'SIMPLE' or 'COMPLEX': '" + user_prompt + "' Just tell if it is 'NULL', 'SIMPLE' or 'COMPLEX'."
         }
 
-    response = bedrock_agent.invoke_agent(**kwargs)
+    admissionControl.admit_service("agent")
+    response = agent_runtime().invoke_agent(**kwargs)
 
     # Check if the response contains 'completion' which is an EventStream object
     if 'completion' in response:
@@ -156,11 +820,11 @@ def classificate_prompt_agent(user_prompt, session_id):
         agent_response = ""
         # Iterate over the stream and inspect each chunk
         for chunk in event_stream:
-            print("Chunk:", chunk)  # Debug: Log each chunk to see its structure
+            logger.debug("Chunk: %s", chunk)
             if 'chunk' in chunk and 'bytes' in chunk['chunk']:
                 agent_response += chunk['chunk']['bytes'].decode('utf-8')
             else:
-                print("Unexpected chunk structure:", chunk)
+                logger.warning("Unexpected chunk structure: %s", chunk)
         if not agent_response:
             agent_response = "No valid response content found in the stream"
     else:
@@ -169,202 +833,76 @@ def classificate_prompt_agent(user_prompt, session_id):
     return agent_response.strip()
 
 def get_conversation_history(session_id):
-    """Retrieve the last 5 interactions for the session from DynamoDB."""
+    """Retrieve the last interactions of the session (newest first) from its rolling DynamoDB record."""
 
     try:
-        response = table.query(
-            KeyConditionExpression=Key('session_id').eq(session_id),
-            Limit=5,  #Número de interacciones
-            ScanIndexForward=False  #Coge las 5 últimas y no las 5 primeras
-        )
-        return response.get('Items', [])
+        return historyStore.load_history(history_table(), session_id)
     except Exception as e:
-        print(f"Error retrieving conversation history: {e}")
+        logger.error("Error retrieving conversation history: %s", e)
         return []
 
-def retrieve_from_kb(query):
-    """Retrieve relevant chunks from the Knowledge Base."""
+def retrieve_context(query, metrics=None, speculative=False):
+    """Obtiene los chunks de la KB pasando por la caché de recuperación si está activada.
 
-    try:
-        response = kb_client.retrieve(
-            guardrailConfiguration={
-                'guardrailId': os.environ.get('GUARDRAIL_ID'),
-                'guardrailVersion': '1'
-            },
-            knowledgeBaseId=os.environ.get('KB_ID'),
-            retrievalQuery={"text": query}
-        )
-        chunks = response["retrievalResults"][:3]  # Número de chunks obtenidos = 3
+    Devuelve (chunks, metadatos, degradado); degradado indica que la KB ha fallado o ha rechazado la llamada.
+    """
 
-        content_list = []
-        metadata_list = []
+    if retrievalCache.RETRIEVAL_CACHE_ENABLED:
+        degraded = []
 
-        for idx, chunk in enumerate(chunks):
-            content_list.append(chunk["content"]["text"])
-            page_number = chunk.get("metadata").get("x-amz-bedrock-kb-document-page-number")
-            metadata_list.append({
-                "source_uri": chunk.get("metadata").get("x-amz-bedrock-kb-source-uri"),
-                "page_number": int(page_number)
-            })
+        def retrieve(q):
+            content_list, metadata_list, failed = retrieve_from_kb(q, metrics, speculative)
+            degraded.append(failed)
+            return content_list, metadata_list
 
-        return content_list, metadata_list
+        content_list, metadata_list, source = retrievalCache.lookup(query, retrieve)
+        if metrics is not None:
+            metrics.count("retrieval_cache_hit", int(source != "miss"))
+        return content_list, metadata_list, any(degraded)
+    return retrieve_from_kb(query, metrics, speculative)
 
+def retrieve_from_kb(query, metrics=None, speculative=False):
+    """Retrieve candidate chunks with the configured retriever (Bedrock Knowledge Base or local index)
+    and keep the ones selected for the prompt (score cutoff, near-duplicates, same-page merge, token budget).
+    The third value is True when retrieval failed or was rejected and the lists are empty for that reason."""
+
+    try:
+        if retrievers.RETRIEVER == "bedrock":
+            # La recuperación especulativa (modo concurrente) no espera turno: puede acabar descartada
+            admissionControl.admit_service("retrieve", 0 if speculative else admissionControl.ADMISSION_MAX_WAIT_MS)
+        content_list, metadata_list = get_retriever().retrieve(query)
+        content_list, metadata_list, selection = chunkSelection.select_chunks(content_list, metadata_list)
+        if metrics is not None:
+            metrics.properties["chunk_selection"] = selection
+        return content_list, metadata_list, False
+
+    except admissionControl.AdmissionRejected as e:
+        # Sin token para la KB se responde sin contexto, como con cualquier otro error del retriever
+        logger.warning("Retrieval from Knowledge Base rejected: %s", e)
+        if metrics is not None:
+            metrics.count("retrieve_rejected")
+        return [], [], True
     except Exception as e:
-        print(f"Error retrieving from Knowledge Base: {e}")
-        return []
+        logger.error("Error retrieving from Knowledge Base: %s", e)
+        return [], [], True
 
 def format_complex_prompt(query, content_list, conversation_history):
-    """Format the prompt with RAG context and conversation history."""
+    """Format the prompt with RAG context and conversation history within the token budget."""
 
-    # Formato historial
-    history = "\n\n".join([
-        f"User: {item['user_query']}\nBot: {item['model_response']}"
-        for item in conversation_history
-    ])
-
-    # Formato chunks
-    context = "\n".join([f"Chunk {i+1}: {text}" for i, text in enumerate(content_list)]) if content_list else "No hay información adicional."
-    
-    # Formato del prompt
-    prompt = (
-        "### 🖥️ [INSTRUCCIONES PARA EL CHATBOT DE PROGRAMACIÓN] 🖥️\n\n"
-        
-        "### 🎯 ÁMBITO TEMÁTICO:\n"
-        "Habla **solo** de temas relacionados con **lenguajes de programación** (Python, JavaScript, C, C++, etc.) y conceptos afines (algoritmos, estructuras de datos, etc.). 💻\n\n"
-        
-        "### 🗣️ TONO Y ESTILO:\n"
-        "- Usa el **tuteo** y un lenguaje **neutro, cercano y claro**.\n"
-        "- Añade **emojis tecnológicos** (ej. 💻, 🖥️, 👩‍💻, 🚀, 🔍,🐍,✔️,❌,⚠️,⛔) para hacerlo más dinámico.\n"
-        "- Estructura las respuestas con **viñetas**, **numeración** o **saltos de línea** para que sean fáciles de leer.\n"
-        "- Sé **amable, motivador y profesional**, como un **mentor en programación**.\n\n"
-        
-        "### 📌 ENFOQUE Y CONTENIDO:\n"
-        "- Responde de forma **clara, práctica y estructurada**.\n"
-        "- Usa el **historial** y el **contexto relevante** para dar respuestas precisas.\n"
-        "- Si el contexto no es suficiente, di: 'No tengo datos suficientes para responderte bien.'\n"
-        "- Ofrece **ejemplos concretos**, trucos útiles o consejos prácticos.\n"
-        
-        "### Historial de Conversación:\n"
-        f"{history}\n\n"
-        
-        "### Contexto Relevante de la Base de Conocimiento:\n"
-        f"{context}\n\n"
-        
-        "### Instrucciones:\n"
-        "- Responde **solo** a la pregunta del usuario sin agregar información innecesaria.\n"
-        "- Usa el historial solo como referencia, únicamente cuando sea necesario y **no inventes nuevas conversaciones**.\n"
-        "- **Si el historial no es relevante**, ignóralo y responde directamente a la pregunta.\n"
-        "- **Mantén tu respuesta breve y relevante.**\n"
-        "Ten muy en cuenta las instrucciones proporcionadas\n\n"
-        f"Pregunta del Usuario: {query}\n\n"
-        "Tu Respuesta:"
-    )
-
-    print(prompt)  #Debugging
-    return prompt
+    return promptBuilder.build_prompt(query, conversation_history, content_list)
 
 def format_simple_prompt(query, conversation_history):
-    """Format the prompt with RAG context and conversation history."""
-
-    # Formato historial
-    history = "\n\n".join([
-        f"User: {item['user_query']}\nBot: {item['model_response']}"
-        for item in conversation_history
-    ])
-
-    # Formato del prompt
-    prompt = (
-        "### 🖥️ [INSTRUCCIONES PARA EL CHATBOT DE PROGRAMACIÓN] 🖥️\n\n"
-        
-        "### 🎯 ÁMBITO TEMÁTICO:\n"
-        "Habla **solo** de temas relacionados con **lenguajes de programación** (Python, JavaScript, C, C++, etc.) y conceptos afines (algoritmos, estructuras de datos, etc.). 💻\n\n"
-        
-        "### 🗣️ TONO Y ESTILO:\n"
-        "- Usa el **tuteo** y un lenguaje **neutro, cercano y claro**.\n"
-        "- Añade **emojis tecnológicos** (ej. 💻, 🖥️, 👩‍💻, 🚀, 🔍,🐍,✔️,❌,⚠️,⛔) para hacerlo más dinámico.\n"
-        "- Estructura las respuestas con **viñetas**, **numeración** o **saltos de línea** para que sean fáciles de leer.\n"
-        "- Sé **amable, motivador y profesional**, como un **mentor en programación**.\n\n"
-
-        "### Historial de Conversación:\n"
-        f"{history}\n\n"
-        
-        "### Instrucciones:\n"
-        "- Responde **solo** a la pregunta del usuario sin agregar información innecesaria.\n"
-        "- Usa el historial solo como referencia, únicamente cuando sea necesario y **no inventes nuevas conversaciones**.\n"
-        "- **Si el historial no es relevante**, ignóralo y responde directamente a la pregunta.\n"
-        "- **Mantén tu respuesta breve y relevante.**\n"
-        "Ten muy en cuenta las instrucciones proporcionadas\n\n"
-        f"Pregunta del Usuario: {query}\n\n"
-        "Tu Respuesta:"
-    )
+    """Format the prompt with conversation history within the token budget."""
 
-    print(prompt)  #Debugging
-    return prompt
-
-def query_bedrock(prompt):
-    """Send the prompt to the Bedrock model."""
-
-    try:
-        kwargs = {
-            "modelId": os.environ.get('MODEL_ID'),  
-            "contentType": "application/json",
-            "accept": "application/json",
-            "body": json.dumps({
-                "anthropic_version": "bedrock-2023-05-31", 
-                "max_tokens": 1000,  
-                "temperature": 0.4,  
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            })
-        }
-
-        '''kwargs = {
-            "modelId": os.environ.get('MODEL_ID'),
-            "contentType": "application/json",
-            "accept": "*/*",
-            "body": json.dumps(
-                {
-                    "inputText": prompt,
-                    "textGenerationConfig": {
-                        "temperature": 0.4,
-                        "maxTokenCount": 1000
-                    }
-                }
-            )
-        } Para amazon lite'''
-
-        response = bedrock.invoke_model(**kwargs)
-        bedrock_output = json.loads(response['body'].read().decode('utf-8'))
-        print(bedrock_output)
-        return bedrock_output
-
-    except Exception as e:
-        print(f"Error querying Bedrock: {e}")
-        raise e
+    return promptBuilder.build_prompt(query, conversation_history)
 
 def store_interaction(session_id, user_query, model_response):
-    """Store the interaction in DynamoDB."""
+    """Store the interaction in the rolling DynamoDB record of the session."""
 
     try:
-        table.put_item(
-            Item={
-                'session_id': session_id,
-                'timestamp': int(time.time()),
-                'user_query': user_query,
-                'model_response': model_response
-            }
-        )
+        historyStore.append_turn(history_table(), session_id, user_query, model_response)
     except Exception as e:
-        print(f"Error storing interaction in DynamoDB: {e}")
+        logger.error("Error storing interaction in DynamoDB: %s", e)
 
 def get_public_url(s3_uri):
     """Convierte una URI de S3 en una URL pública."""
@@ -379,25 +917,9 @@ def get_public_url(s3_uri):
         public_url = f"https://{bucket}.s3.{region}.amazonaws.com/{path}"
         return public_url
     except Exception as e:
-        print(f"Error generando URL pública: {str(e)}")
+        logger.error("Error generando URL pública: %s", e)
         return "URL no disponible"
     
-def openai_response(prompt, user_query):
-    response = openai.ChatCompletion.create(
-        model = "gpt-4.1-mini",
-        messages = [
-            {"role":"system", "content" : prompt},
-            {"role": "user", "content": user_query}
-        ],
-        max_tokens=1000,
-        temperature=0.4, 
-        top_p=1.0
-    )
-
-    model_response = response.choices[0].message.content.strip()
-    print(f"Respuesta de OpenAI: {model_response}")
-    return model_response
-    
 #Funcion main para hacer pruebas en local sin el CLI. No añadir a la lambda desplegada en AWS
 if __name__ == "__main__":
     event = {"body": json.dumps({"query": "Que es un match en python?", "session_id": "test-session", "model": "bedrock"})}
@@ -0,0 +1,232 @@
+"""Servidor ASGI con las tres Lambdas, para desplegar el backend en contenedores propios tras un balanceador.
+
+Rutas (mismos cuerpos y respuestas que tras API Gateway):
+  POST /chatbot -> app.lambda_handler
+  POST /upload  -> uploadFile.lambda_handler
+  POST /sync    -> syncKnowledgeBase.lambda_handler (el cuerpo es el evento de S3; {} sustituye a EventBridge)
+  GET  /health  -> comprobación del balanceador
+
+Uso:
+  python lambda/asgiServer.py --port 8080 --workers 4
+  uvicorn asgiServer:app --app-dir lambda --workers 4
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Cada proceso atiende hasta SERVER_THREADS peticiones a la vez; el pool de conexiones de los clientes
+# de AWS (compartidos por todos los hilos) debe ser igual de grande
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "32"))
+os.environ.setdefault("AWS_MAX_POOL_CONNECTIONS", str(SERVER_THREADS))
+
+import app as chatbot
+import requestMetrics
+import syncKnowledgeBase
+import uploadFile
+
+# Límite del cuerpo de la petición (el de API Gateway es 10 MB)
+SERVER_MAX_BODY_BYTES = int(os.environ.get("SERVER_MAX_BODY_BYTES", str(10 * 1024 * 1024)))
+# Tiempo que ven los handlers en context.get_remaining_time_in_millis
+SERVER_TIMEOUT_SECONDS = float(os.environ.get("SERVER_TIMEOUT_SECONDS", "120"))
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "*",
+    "Access-Control-Allow-Headers": "*"
+}
+
+executor = ThreadPoolExecutor(max_workers=SERVER_THREADS, thread_name_prefix="handler")
+logger = requestMetrics.get_logger("asgiServer")
+_end = object()
+
+class ServerContext:
+    """Equivalente al contexto de Lambda que usan los handlers."""
+
+    streaming = True
+
+    def __init__(self, request_id, timeout_seconds=SERVER_TIMEOUT_SECONDS):
+        self.aws_request_id = request_id
+        self.function_name = "asgiServer"
+        self.deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self.deadline - time.monotonic()) * 1000), 0)
+
+def proxy_event(scope, body):
+    """Evento de proxy de API Gateway (REST) de la petición."""
+
+    headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+    query = scope.get("query_string", b"").decode("latin-1")
+    return {
+        "resource": scope["path"],
+        "path": scope["path"],
+        "httpMethod": scope["method"],
+        "headers": headers,
+        "queryStringParameters": dict(part.split("=", 1) if "=" in part else (part, "") for part in query.split("&") if part) or None,
+        "body": body.decode("utf-8"),
+        "isBase64Encoded": False,
+        "requestContext": {"requestId": headers.get("x-request-id") or str(uuid.uuid4()), "stage": "server"}
+    }
+
+def sync_event(scope, body):
+    # La Lambda de sincronización recibe el evento de S3 o de EventBridge tal cual, no un evento de proxy
+    event = json.loads(body) if body.strip() else {}
+    if not isinstance(event, dict):
+        raise ValueError("the event must be a JSON object")
+    return event
+
+ROUTES = {
+    "/chatbot": (chatbot.lambda_handler, proxy_event),
+    "/upload": (uploadFile.lambda_handler, proxy_event),
+    "/sync": (syncKnowledgeBase.lambda_handler, sync_event)
+}
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"].rstrip("/") or "/"
+    if path == "/health":
+        await send_json(send, 200, {"status": "ok"})
+        return
+    if path not in ROUTES:
+        await send_json(send, 404, {"error": f"Not found: {scope['path']}"})
+        return
+    if scope["method"] == "OPTIONS":
+        await send_response(send, 204, CORS_HEADERS, b"")
+        return
+    if scope["method"] != "POST":
+        await send_json(send, 405, {"error": f"Method not allowed: {scope['method']}"})
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        await send_json(send, 413, {"error": f"Request body larger than {SERVER_MAX_BODY_BYTES} bytes"})
+        return
+
+    handler, build_event = ROUTES[path]
+    try:
+        event = build_event(scope, body)
+    except ValueError as e:
+        await send_json(send, 400, {"error": f"Invalid JSON body: {e}"})
+        return
+
+    loop = asyncio.get_running_loop()
+    context = ServerContext(event.get("requestContext", {}).get("requestId") or str(uuid.uuid4()))
+    try:
+        # Los handlers (y boto3) son bloqueantes: se ejecutan en el pool sin parar el bucle de eventos
+        response = await loop.run_in_executor(executor, handler, event, context)
+    except Exception as e:
+        logger.exception("Error no controlado en %s", path)
+        await send_json(send, 500, {"error": str(e)})
+        return
+    await send_handler_response(send, response)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Espera a las peticiones en curso sin bloquear el bucle de eventos
+            await asyncio.to_thread(executor.shutdown)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def read_body(receive):
+    """Cuerpo completo de la petición, o None si supera SERVER_MAX_BODY_BYTES."""
+
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        size += len(message.get("body", b""))
+        if size > SERVER_MAX_BODY_BYTES:
+            return None
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+async def send_handler_response(send, response):
+    """Envía la respuesta de un handler ({"statusCode", "headers", "body"}).
+
+    Si el cuerpo es un iterador (respuestas NDJSON con context.streaming) cada fragmento se envía según se
+    genera; si el cliente se desconecta, se cierra el generador para cortar la generación del modelo.
+    """
+
+    # Sin Content-Type, API Gateway responde application/json
+    headers = {"Content-Type": "application/json", **(response.get("headers") or {})}
+    body = response.get("body", "")
+    if isinstance(body, str):
+        body = base64.b64decode(body) if response.get("isBase64Encoded") else body.encode("utf-8")
+        await send_response(send, response["statusCode"], headers, body)
+        return
+
+    chunks = iter(body)
+    pending = None
+    await send_start(send, response["statusCode"], headers)
+    try:
+        while True:
+            pending = executor.submit(next, chunks, _end)
+            chunk = await asyncio.wrap_future(pending)
+            if chunk is _end:
+                break
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+    except (OSError, asyncio.CancelledError):
+        logger.warning("Cliente desconectado durante el streaming")
+        executor.submit(close_iterator, chunks, pending)
+        raise
+    await send({"type": "http.response.body", "body": b""})
+
+def close_iterator(chunks, pending):
+    # Un generador no se puede cerrar mientras otro hilo lo avanza: se espera al fragmento en curso
+    if pending is not None:
+        wait([pending])
+    close = getattr(chunks, "close", None)
+    if close is not None:
+        close()
+
+async def send_start(send, status, headers):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.lower().encode("latin-1"), str(value).encode("latin-1")) for name, value in headers.items()]
+    })
+
+async def send_response(send, status, headers, body):
+    await send_start(send, status, {**headers, "Content-Length": len(body)})
+    await send({"type": "http.response.body", "body": body})
+
+async def send_json(send, status, payload):
+    await send_response(send, status, {**CORS_HEADERS, "Content-Type": "application/json"}, json.dumps(payload).encode("utf-8"))
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor ASGI del chatbot (/chatbot, /upload y /sync).")
+    parser.add_argument("--host", default=os.environ.get("SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SERVER_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVER_WORKERS", "1")),
+                        help="procesos; cada uno con su pool de SERVER_THREADS hilos y sus clientes")
+    args = parser.parse_args()
+    uvicorn.run(
+        "asgiServer:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        timeout_keep_alive=75
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+# Conexiones persistentes: el pool de cada cliente se reutiliza entre invocaciones del mismo contenedor
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "16"))
+AWS_CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", "3"))
+AWS_READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", "60"))
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "3"))
+
+CLIENT_CONFIG = Config(
+    tcp_keepalive=True,
+    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+    connect_timeout=AWS_CONNECT_TIMEOUT,
+    read_timeout=AWS_READ_TIMEOUT,
+    retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": "standard"}
+)
+
+_clients = {}
+_resources = {}
+_lock = threading.Lock()
+
+def get_client(service_name, region_name=None, config=None):
+    """Devuelve el cliente compartido del servicio, creándolo la primera vez que se usa.
+
+    config se combina con CLIENT_CONFIG (p.ej. la versión de firma de S3).
+    """
+
+    key = (service_name, region_name, config)
+    client = _clients.get(key)
+    if client is None:
+        # Los hilos del modo concurrente pueden pedir el mismo cliente a la vez
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client_config = CLIENT_CONFIG.merge(config) if config is not None else CLIENT_CONFIG
+                client = boto3.client(service_name, region_name=region_name, config=client_config)
+                _clients[key] = client
+    return client
+
+def get_resource(service_name, region_name=None, endpoint_url=None):
+    """Devuelve el resource compartido del servicio (solo DynamoDB en este proyecto)."""
+
+    key = (service_name, region_name, endpoint_url)
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = boto3.resource(
+                    service_name, region_name=region_name, endpoint_url=endpoint_url, config=CLIENT_CONFIG
+                )
+                _resources[key] = resource
+    return resource
+
+def get_table(table_name, endpoint_url=None):
+    return get_resource("dynamodb", endpoint_url=endpoint_url).Table(table_name)
@@ -0,0 +1,158 @@
+import json
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from requestMetrics import get_logger
+
+# Tabla DynamoDB compartida por todas las cachés (clave de partición 'cache_key', TTL en 'expires_at')
+CACHE_TABLE = os.environ.get("CACHE_TABLE")
+
+logger = get_logger("cacheUtils")
+# Permite apuntar a DynamoDB Local para pruebas (p.ej. http://localhost:8000)
+DYNAMODB_ENDPOINT_URL = os.environ.get("DYNAMODB_ENDPOINT_URL")
+
+def normalize_query(query):
+    """Normaliza una consulta: minúsculas, sin tildes, sin signos de puntuación y espacios simples."""
+
+    text = unicodedata.normalize("NFKD", query.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+def query_hash(*parts):
+    """Hash estable de las partes de una clave de caché."""
+
+    return hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+class TTLCache:
+    """Caché en memoria con expiración por TTL y expulsión LRU.
+
+    Vive a nivel de módulo, así que se conserva entre invocaciones en caliente del mismo contenedor.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl_seconds=None):
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def values(self):
+        """Devuelve los valores no expirados (sin alterar el orden LRU)."""
+
+        now = time.time()
+        with self._lock:
+            return [value for expires_at, value in self._entries.values() if expires_at >= now]
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._entries)
+
+class SharedCacheTier:
+    """Nivel de caché compartido entre contenedores sobre una tabla DynamoDB.
+
+    Los valores se guardan serializados en JSON en el atributo 'value' para no depender de Decimal.
+    """
+
+    def __init__(self, table, prefix):
+        self.table = table
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            item = self.table.get_item(Key={"cache_key": f"{self.prefix}#{key}"}).get("Item")
+        except Exception as e:
+            logger.warning("Error leyendo la caché compartida (%s): %s", self.prefix, e)
+            return None
+        if not item or int(item.get("expires_at", 0)) < time.time():
+            return None
+        return json.loads(item["value"])
+
+    def set(self, key, value, ttl_seconds):
+        try:
+            self.table.put_item(Item={
+                "cache_key": f"{self.prefix}#{key}",
+                "value": json.dumps(value),
+                "expires_at": int(time.time() + ttl_seconds)
+            })
+        except Exception as e:
+            logger.warning("Error escribiendo en la caché compartida (%s): %s", self.prefix, e)
+
+class SharedResults:
+    """Resultados compartidos por clave durante la vida del objeto (p.ej. un lote de consultas).
+
+    La primera llamada con una clave calcula el resultado; las siguientes, también las concurrentes,
+    esperan y reciben el mismo resultado (o la misma excepción).
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+        # Llamadas que han reutilizado un resultado en lugar de calcularlo
+        self.hits = 0
+
+    def get_or_compute(self, key, func, *args):
+        """Devuelve (resultado, calculado) donde calculado indica si esta llamada ejecutó func."""
+
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result(), owner
+
+_cache_table = None
+
+def get_cache_table():
+    """Devuelve la tabla DynamoDB de cachés o None si no está configurada."""
+
+    global _cache_table
+    if CACHE_TABLE and _cache_table is None:
+        # Import diferido: awsClients importa boto3, que no hace falta para las cachés locales
+        from awsClients import get_table
+        _cache_table = get_table(CACHE_TABLE, endpoint_url=DYNAMODB_ENDPOINT_URL)
+    return _cache_table
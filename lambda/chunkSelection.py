@@ -0,0 +1,117 @@
+import os
+import re
+from promptBuilder import estimate_tokens
+
+# Selección de los chunks que entran en el prompt a partir de los candidatos de la KB (ordenados por score)
+# Score mínimo absoluto (0 lo desactiva); la escala depende del backend y del tipo de búsqueda
+RETRIEVAL_MIN_SCORE = float(os.environ.get("RETRIEVAL_MIN_SCORE", "0.0"))
+# k adaptativo: solo entran los chunks a menos de este margen del mejor score
+RETRIEVAL_SCORE_MARGIN = float(os.environ.get("RETRIEVAL_SCORE_MARGIN", "0.15"))
+RETRIEVAL_MAX_CHUNKS = int(os.environ.get("RETRIEVAL_TOP_K", "3"))
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", "1200"))
+# Dos chunks son casi duplicados si la similitud de Jaccard de sus shingles de palabras la supera
+RETRIEVAL_DEDUP_THRESHOLD = float(os.environ.get("RETRIEVAL_DEDUP_THRESHOLD", "0.5"))
+RETRIEVAL_SHINGLE_SIZE = int(os.environ.get("RETRIEVAL_SHINGLE_SIZE", "4"))
+# Solape mínimo (en caracteres) para unir dos chunks consecutivos sin página
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 1000
+
+def select_chunks(content_list, metadata_list):
+    """Filtra los candidatos de la KB y devuelve (content_list, metadata_list, stats).
+
+    1. Descarta los que no llegan a RETRIEVAL_MIN_SCORE o quedan a más de RETRIEVAL_SCORE_MARGIN del mejor.
+    2. Descarta los casi duplicados de un chunk con mejor score (solape de shingles).
+    3. Une los chunks de la misma página (o que se solapan) en uno solo, con el mejor score.
+    4. Toma los mejores hasta RETRIEVAL_TOP_K chunks originales y RETRIEVAL_TOKEN_BUDGET tokens (al menos uno).
+    Sin scores (backends antiguos) se conserva el orden y solo se aplican los pasos 2 a 4.
+    """
+
+    candidates = sorted(
+        zip(content_list, metadata_list),
+        key=lambda candidate: -(candidate[1].get("score") or 0.0)
+    )
+    stats = {"candidates": len(candidates), "below_cutoff": 0, "duplicates": 0, "merged": 0, "over_budget": 0}
+    if not candidates:
+        return [], [], {**stats, "selected": 0}
+
+    top_score = candidates[0][1].get("score")
+    kept = []
+    for text, meta in candidates:
+        score = meta.get("score")
+        if score is not None and top_score is not None and (score < RETRIEVAL_MIN_SCORE or score < top_score - RETRIEVAL_SCORE_MARGIN):
+            stats["below_cutoff"] += 1
+            continue
+        kept.append((text, meta, shingles(text)))
+
+    unique = []
+    for text, meta, text_shingles in kept:
+        if any(jaccard(text_shingles, other) >= RETRIEVAL_DEDUP_THRESHOLD for _, _, other in unique):
+            stats["duplicates"] += 1
+            continue
+        unique.append((text, meta, text_shingles))
+
+    groups = []
+    for text, meta, _ in unique:
+        for group in groups:
+            merged_text = merge_text(group["text"], text, same_page(group["meta"], meta)) if same_document(group["meta"], meta) else None
+            if merged_text is not None:
+                group["text"] = merged_text
+                group["pieces"] += 1
+                stats["merged"] += 1
+                break
+        else:
+            groups.append({"text": text, "meta": meta, "pieces": 1})
+
+    # Un chunk unido cuenta como los chunks originales que contiene
+    selected = []
+    pieces = 0
+    used = 0
+    for group in groups:
+        cost = estimate_tokens(group["text"])
+        if selected and (pieces + group["pieces"] > RETRIEVAL_MAX_CHUNKS or used + cost > RETRIEVAL_TOKEN_BUDGET):
+            stats["over_budget"] += 1
+            continue
+        selected.append(group)
+        pieces += group["pieces"]
+        used += cost
+
+    stats["selected"] = len(selected)
+    stats["tokens"] = used
+    return [group["text"] for group in selected], [group["meta"] for group in selected], stats
+
+def shingles(text):
+    words = re.findall(r"\w+", text.lower())
+    size = min(RETRIEVAL_SHINGLE_SIZE, len(words)) or 1
+    return {tuple(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def same_document(a, b):
+    return a.get("source_uri") is not None and a.get("source_uri") == b.get("source_uri")
+
+def same_page(a, b):
+    return a.get("page_number") is not None and a.get("page_number") == b.get("page_number")
+
+def merge_text(first, second, on_same_page):
+    """Une dos chunks del mismo documento.
+
+    Si uno empieza donde acaba el otro (solape del troceado) se unen sin repetir el solape; si no se
+    solapan, solo se unen cuando son de la misma página. Devuelve None si no se pueden unir.
+    """
+
+    overlap = overlap_chars(first, second)
+    if overlap:
+        return first + second[overlap:]
+    overlap = overlap_chars(second, first)
+    if overlap:
+        return second + first[overlap:]
+    return first + "\n" + second if on_same_page else None
+
+def overlap_chars(first, second):
+    """Longitud del sufijo más largo de first que es prefijo de second (0 si es menor que MIN_OVERLAP_CHARS)."""
+
+    for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
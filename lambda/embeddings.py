@@ -0,0 +1,53 @@
+import json
+import math
+import os
+import zlib
+import awsClients
+from cacheUtils import normalize_query
+
+# Modelo de embeddings (el mismo que usa la Knowledge Base)
+EMBEDDING_MODEL_ID = os.environ.get("EMBEDDING_MODEL_ID", "amazon.titan-embed-text-v2:0")
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "256"))
+
+def embed_text(text):
+    """Devuelve el embedding normalizado (norma 1) de un texto con Titan Text Embeddings V2."""
+
+    bedrock = awsClients.get_client('bedrock-runtime', region_name='eu-central-1')
+    response = bedrock.invoke_model(
+        modelId=EMBEDDING_MODEL_ID,
+        contentType="application/json",
+        accept="application/json",
+        body=json.dumps({
+            "inputText": text,
+            "dimensions": EMBEDDING_DIMENSIONS,
+            "normalize": True
+        })
+    )
+    return json.loads(response['body'].read().decode('utf-8'))["embedding"]
+
+def hash_embed(text, dimensions=EMBEDDING_DIMENSIONS):
+    """Embedding determinista por hashing de palabras y trigramas de caracteres.
+
+    No llama a AWS: sirve para construir índices y ejecutar el pipeline en local o en benchmarks.
+    """
+
+    vector = [0.0] * dimensions
+    tokens = normalize_query(text).split()
+    grams = [f"w:{token}" for token in tokens]
+    for token in tokens:
+        padded = f"<{token}>"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    for gram in grams:
+        h = zlib.crc32(gram.encode("utf-8"))
+        vector[h % dimensions] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+EMBEDDERS = {"titan": embed_text, "hash": hash_embed}
+
+def get_embedder(name):
+    """Devuelve la función de embedding registrada con ese nombre ('titan' o 'hash')."""
+
+    if name not in EMBEDDERS:
+        raise ValueError(f"Función de embedding no soportada: {name}")
+    return EMBEDDERS[name]
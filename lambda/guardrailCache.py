@@ -0,0 +1,58 @@
+import json
+import os
+import re
+from cacheUtils import TTLCache, SharedCacheTier, get_cache_table, normalize_query, query_hash
+
+GUARDRAIL_ID = os.environ.get("GUARDRAIL_ID")
+GUARDRAIL_VERSION = os.environ.get("GUARDRAIL_VERSION", "1")
+# Caché de veredictos del guardrail de entrada por consulta normalizada y versión del guardrail
+GUARDRAIL_CACHE_ENABLED = os.environ.get("GUARDRAIL_CACHE_ENABLED", "false").lower() == "true"
+GUARDRAIL_CACHE_TTL_SECONDS = int(os.environ.get("GUARDRAIL_CACHE_TTL_SECONDS", "86400"))
+GUARDRAIL_CACHE_MAX_ENTRIES = int(os.environ.get("GUARDRAIL_CACHE_MAX_ENTRIES", "1024"))
+GUARDRAIL_CACHE_SHARED = os.environ.get("GUARDRAIL_CACHE_SHARED", "true").lower() == "true"
+# Prefiltro local: listas JSON de expresiones regulares sobre la consulta normalizada (sin tildes ni signos).
+# Las de bloqueo se comprueban antes que las de permiso; si ninguna encaja se consulta el guardrail.
+GUARDRAIL_DENY_PATTERNS = [re.compile(p) for p in json.loads(os.environ.get("GUARDRAIL_DENY_PATTERNS", "[]"))]
+GUARDRAIL_ALLOW_PATTERNS = [re.compile(p) for p in json.loads(os.environ.get("GUARDRAIL_ALLOW_PATTERNS", "[]"))]
+
+local_cache = TTLCache(GUARDRAIL_CACHE_MAX_ENTRIES, GUARDRAIL_CACHE_TTL_SECONDS)
+
+def check(user_query, apply_guardrail):
+    """Devuelve (intervino, origen del veredicto) de la consulta.
+
+    El origen es 'deny' o 'allow' (prefiltro local), 'local' o 'shared' (caché) o 'guardrail' si se ha
+    llamado a apply_guardrail(user_query). La clave incluye el ID y la versión del guardrail, así que
+    publicar una versión nueva deja obsoletos los veredictos anteriores. La versión DRAFT puede cambiar
+    sin cambiar de nombre y no se cachea.
+    """
+
+    normalized = normalize_query(user_query)
+    if any(pattern.search(normalized) for pattern in GUARDRAIL_DENY_PATTERNS):
+        return True, "deny"
+    if any(pattern.search(normalized) for pattern in GUARDRAIL_ALLOW_PATTERNS):
+        return False, "allow"
+
+    if not GUARDRAIL_CACHE_ENABLED or GUARDRAIL_VERSION == "DRAFT":
+        return apply_guardrail(user_query), "guardrail"
+
+    key = query_hash(GUARDRAIL_ID, GUARDRAIL_VERSION, normalized)
+    entry = local_cache.get(key)
+    if entry is not None:
+        return entry["intervened"], "local"
+
+    shared_tier = get_shared_tier()
+    if shared_tier is not None:
+        entry = shared_tier.get(key)
+        if entry is not None:
+            local_cache.set(key, entry)
+            return entry["intervened"], "shared"
+
+    entry = {"intervened": apply_guardrail(user_query)}
+    local_cache.set(key, entry)
+    if shared_tier is not None:
+        shared_tier.set(key, entry, GUARDRAIL_CACHE_TTL_SECONDS)
+    return entry["intervened"], "guardrail"
+
+def get_shared_tier():
+    table = get_cache_table() if GUARDRAIL_CACHE_SHARED else None
+    return SharedCacheTier(table, "guardrail") if table is not None else None
@@ -0,0 +1,124 @@
+import json
+import os
+import time
+import zlib
+from boto3.dynamodb.conditions import Key
+from cacheUtils import TTLCache
+
+# Historial de cada sesión en un único registro con los últimos N turnos.
+# Se guarda en la misma tabla que los turnos antiguos con la clave de ordenación ROLLING_TIMESTAMP.
+ROLLING_TIMESTAMP = 0
+HISTORY_MAX_TURNS = int(os.environ.get("HISTORY_MAX_TURNS", "5"))
+HISTORY_COMPRESS = os.environ.get("HISTORY_COMPRESS", "true").lower() == "true"
+HISTORY_WRITE_RETRIES = int(os.environ.get("HISTORY_WRITE_RETRIES", "3"))
+# Caché de sesiones recientes del contenedor: si la sesión se acaba de servir aquí no se lee DynamoDB
+HISTORY_CACHE_SESSIONS = int(os.environ.get("HISTORY_CACHE_SESSIONS", "256"))
+HISTORY_CACHE_TTL_SECONDS = int(os.environ.get("HISTORY_CACHE_TTL_SECONDS", "120"))
+
+session_cache = TTLCache(HISTORY_CACHE_SESSIONS, HISTORY_CACHE_TTL_SECONDS)
+
+def load_history(table, session_id):
+    """Devuelve los últimos turnos de la sesión, del más reciente al más antiguo."""
+
+    record = session_cache.get(session_id)
+    if record is None:
+        record = read_record(table, session_id)
+        session_cache.set(session_id, record)
+    return list(reversed(record["turns"]))
+
+def append_turn(table, session_id, user_query, model_response):
+    """Añade un turno al registro de la sesión con una escritura condicional sobre su secuencia.
+
+    Si otro contenedor ha escrito entre medias la condición falla, se relee el registro y se reintenta.
+    """
+
+    record = session_cache.get(session_id) or read_record(table, session_id)
+    for attempt in range(HISTORY_WRITE_RETRIES):
+        seq = record["seq"] + 1
+        turn = {
+            "user_query": user_query,
+            "model_response": model_response,
+            "timestamp_ms": int(time.time() * 1000),
+            "seq": seq
+        }
+        new_record = {"turns": (record["turns"] + [turn])[-HISTORY_MAX_TURNS:], "seq": seq}
+        try:
+            write_record(table, session_id, new_record, record["seq"])
+            session_cache.set(session_id, new_record)
+            return new_record
+        except table.meta.client.exceptions.ConditionalCheckFailedException:
+            record = read_record(table, session_id)
+    session_cache.delete(session_id)
+    raise RuntimeError(f"No se pudo guardar el historial de la sesión {session_id} tras {HISTORY_WRITE_RETRIES} intentos")
+
+def read_record(table, session_id):
+    """Lee el registro de la sesión con un GetItem; si no existe lo migra desde los turnos antiguos."""
+
+    item = table.get_item(Key={"session_id": session_id, "timestamp": ROLLING_TIMESTAMP}).get("Item")
+    if item is not None:
+        return decode_record(item)
+    return migrate_legacy_turns(table, session_id)
+
+def migrate_legacy_turns(table, session_id):
+    """Construye el registro a partir de los turnos antiguos (un ítem por turno), si los hay."""
+
+    response = table.query(
+        KeyConditionExpression=Key('session_id').eq(session_id) & Key('timestamp').gt(ROLLING_TIMESTAMP),
+        Limit=HISTORY_MAX_TURNS,
+        ScanIndexForward=False
+    )
+    items = response.get('Items', [])
+    if not items:
+        return {"turns": [], "seq": 0}
+
+    turns = [
+        {
+            "user_query": item["user_query"],
+            "model_response": item["model_response"],
+            # Los turnos antiguos guardaban segundos
+            "timestamp_ms": legacy_timestamp_ms(item["timestamp"]),
+            "seq": seq
+        }
+        for seq, item in enumerate(reversed(items), start=1)
+    ]
+    record = {"turns": turns, "seq": len(turns)}
+    try:
+        write_record(table, session_id, record, 0)
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        # Otro contenedor ya la ha migrado
+        item = table.get_item(Key={"session_id": session_id, "timestamp": ROLLING_TIMESTAMP}).get("Item")
+        return decode_record(item)
+    return record
+
+def write_record(table, session_id, record, expected_seq):
+    item = {
+        "session_id": session_id,
+        "timestamp": ROLLING_TIMESTAMP,
+        "seq": record["seq"],
+        "updated_at_ms": int(time.time() * 1000)
+    }
+    if HISTORY_COMPRESS:
+        item["turns_z"] = zlib.compress(json.dumps(record["turns"]).encode("utf-8"))
+    else:
+        item["turns"] = json.dumps(record["turns"])
+
+    if expected_seq == 0:
+        condition = {"ConditionExpression": "attribute_not_exists(session_id)"}
+    else:
+        condition = {
+            "ConditionExpression": "seq = :expected",
+            "ExpressionAttributeValues": {":expected": expected_seq}
+        }
+    table.put_item(Item=item, **condition)
+
+def decode_record(item):
+    if "turns_z" in item:
+        data = item["turns_z"]
+        turns = json.loads(zlib.decompress(getattr(data, "value", data)).decode("utf-8"))
+    else:
+        turns = json.loads(item.get("turns", "[]"))
+    return {"turns": turns, "seq": int(item["seq"])}
+
+def legacy_timestamp_ms(timestamp):
+    timestamp = int(timestamp)
+    return timestamp * 1000 if timestamp < 10 ** 11 else timestamp
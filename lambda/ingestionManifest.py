@@ -0,0 +1,104 @@
+import copy
+import os
+import time
+import awsClients
+from ingestionScheduler import INGESTION_TABLE
+
+# Manifiesto de ingesta: una entrada por objeto de la data source en INGESTION_TABLE (record_id 'doc#<uri>')
+# con el hash del contenido, el tamaño, el estado y el último job que lo ingirió.
+# Estados: 'pending' (en cola), 'ingested', 'deleting' (en cola para borrar de la KB), 'deleted' y 'failed'
+# (ha fallado en demasiados jobs seguidos y ya no se reintenta hasta que se vuelva a subir o borrar).
+SKIP_STATUSES = ("pending", "ingested")
+
+class DynamoManifest:
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, uri):
+        return self.table.get_item(Key={"record_id": f"doc#{uri}"}, ConsistentRead=True).get("Item")
+
+    def put(self, entry):
+        self.table.put_item(Item={**entry, "record_id": f"doc#{entry['uri']}"})
+
+class MemoryManifest:
+    """Manifiesto en memoria del contenedor, para cuando no hay INGESTION_TABLE configurada."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, uri):
+        return copy.deepcopy(self.entries.get(uri))
+
+    def put(self, entry):
+        self.entries[entry["uri"]] = copy.deepcopy(entry)
+
+def get_manifest():
+    if INGESTION_TABLE:
+        return DynamoManifest(awsClients.get_table(INGESTION_TABLE, endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL")))
+    return _memory_manifest
+
+_memory_manifest = MemoryManifest()
+
+def is_unchanged(entry, sha256):
+    """True si el objeto ya está ingerido (o en cola) con el mismo contenido."""
+
+    return entry is not None and entry.get("sha256") == sha256 and entry.get("status") in SKIP_STATUSES
+
+def record_upload(manifest, uri, sha256, size):
+    previous = manifest.get(uri) or {}
+    manifest.put({
+        **previous,
+        "uri": uri,
+        "sha256": sha256,
+        "size": int(size),
+        "status": "pending",
+        "failures": 0,
+        "updated_at": int(time.time() * 1000)
+    })
+
+def record_removal(manifest, uri):
+    previous = manifest.get(uri) or {"uri": uri}
+    manifest.put({**previous, "status": "deleting", "failures": 0, "updated_at": int(time.time() * 1000)})
+
+def record_ingested(manifest, uris, job_id, started_at):
+    """Marca los objetos como ingeridos (o borrados de la KB) por el job que empezó en started_at."""
+
+    now = int(time.time() * 1000)
+    for uri in uris:
+        entry = manifest.get(uri) or {"uri": uri, "status": "pending", "updated_at": 0}
+        if int(entry.get("updated_at", 0)) > started_at:
+            # Ha llegado otra versión durante el job: sigue en cola
+            continue
+        entry["status"] = "deleted" if entry["status"] == "deleting" else "ingested"
+        entry["last_job_id"] = job_id
+        entry["ingested_at"] = now
+        entry["failures"] = 0
+        manifest.put(entry)
+
+def record_failed(manifest, uris, job_id, started_at, max_attempts):
+    """Cuenta un fallo más de cada objeto y devuelve los que llegan a max_attempts, que pasan a 'failed'.
+
+    Los objetos modificados durante el job no cuentan: su nueva versión se reintenta desde cero.
+    """
+
+    now = int(time.time() * 1000)
+    exhausted = []
+    for uri in uris:
+        entry = manifest.get(uri) or {"uri": uri, "status": "pending", "updated_at": 0}
+        if int(entry.get("updated_at", 0)) > started_at:
+            continue
+        entry["failures"] = int(entry.get("failures", 0)) + 1
+        entry["last_job_id"] = job_id
+        if entry["failures"] >= max_attempts:
+            entry["failed_action"] = "delete" if entry["status"] == "deleting" else "ingest"
+            entry["status"] = "failed"
+            entry["updated_at"] = now
+            exhausted.append(uri)
+        manifest.put(entry)
+    return exhausted
+
+def pending_removals(manifest, uris):
+    """Separa los objetos que hay que borrar de la KB de los que hay que ingerir."""
+
+    removals = {uri for uri in uris if (manifest.get(uri) or {}).get("status") == "deleting"}
+    return sorted(set(uris) - removals), sorted(removals)
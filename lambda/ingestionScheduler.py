@@ -0,0 +1,168 @@
+import copy
+import os
+import time
+import awsClients
+
+# Tabla con el estado del planificador y el registro de cada ingestion job (clave de partición 'record_id')
+INGESTION_TABLE = os.environ.get("INGESTION_TABLE")
+# Estados en los que un ingestion job sigue activo
+RUNNING_STATUSES = ("STARTING", "IN_PROGRESS", "STOPPING")
+# Si un job reclamado no llega a arrancar en este tiempo se considera perdido y sus ficheros vuelven a pendientes
+STALE_CLAIM_MS = 5 * 60 * 1000
+# Una reinvocación programada que no ha llegado pasado este margen se da por perdida y se vuelve a programar
+SCHEDULE_GRACE_MS = 2 * 60 * 1000
+STATE_WRITE_RETRIES = 5
+
+class StateConflict(Exception):
+    """Otro contenedor ha modificado el estado entre la lectura y la escritura."""
+
+class DynamoStateStore:
+    """Estado del planificador en DynamoDB con control de concurrencia optimista (atributo 'version')."""
+
+    def __init__(self, table, datasource_id):
+        self.table = table
+        self.state_key = f"datasource#{datasource_id}"
+
+    def load(self):
+        item = self.table.get_item(Key={"record_id": self.state_key}, ConsistentRead=True).get("Item")
+        return decode_state(item)
+
+    def save(self, state):
+        item = {**state, "record_id": self.state_key, "version": state["version"] + 1}
+        if state["version"] == 0:
+            condition = {"ConditionExpression": "attribute_not_exists(record_id)"}
+        else:
+            condition = {
+                "ConditionExpression": "version = :expected",
+                "ExpressionAttributeValues": {":expected": state["version"]}
+            }
+        try:
+            self.table.put_item(Item=item, **condition)
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise StateConflict()
+        return decode_state(item)
+
+    def record_job(self, job):
+        self.table.put_item(Item={**job, "record_id": f"job#{job['job_id']}"})
+
+class MemoryStateStore:
+    """Estado en memoria del contenedor, para cuando no hay INGESTION_TABLE configurada."""
+
+    def __init__(self):
+        self.state = decode_state(None)
+        self.jobs = {}
+
+    def load(self):
+        return copy.deepcopy(self.state)
+
+    def save(self, state):
+        if state["version"] != self.state["version"]:
+            raise StateConflict()
+        self.state = {**copy.deepcopy(state), "version": state["version"] + 1}
+        return copy.deepcopy(self.state)
+
+    def record_job(self, job):
+        self.jobs[job["job_id"]] = job
+
+def decode_state(item):
+    item = item or {}
+    active = item.get("active_job")
+    return {
+        "version": int(item.get("version", 0)),
+        # Ficheros pendientes de ingerir: clave S3 -> instante del evento (ms)
+        "pending": {key: int(at) for key, at in item.get("pending", {}).items()},
+        "first_pending_at": int(item["first_pending_at"]) if item.get("first_pending_at") else None,
+        "last_event_at": int(item["last_event_at"]) if item.get("last_event_at") else None,
+        # Fin de la ventana de agrupación: los pendientes no se ingieren antes
+        "flush_at": int(item["flush_at"]) if item.get("flush_at") else None,
+        # Instante de la reinvocación diferida ya programada, si la hay
+        "scheduled_at": int(item["scheduled_at"]) if item.get("scheduled_at") else None,
+        "active_job": {
+            "job_id": active.get("job_id"),
+            # 'documents' (APIs por documento) o 'full' (ingestion job de la data source)
+            "mode": active.get("mode", "full"),
+            "files": {key: int(at) for key, at in active.get("files", {}).items()},
+            "started_at": int(active["started_at"])
+        } if active else None
+    }
+
+def update_state(store, change):
+    """Aplica change(state) y guarda el resultado, reintentando si hay conflicto. Devuelve el estado guardado."""
+
+    for _ in range(STATE_WRITE_RETRIES):
+        state = store.load()
+        if change(state) is False:
+            return state
+        try:
+            return store.save(state)
+        except StateConflict:
+            continue
+    raise RuntimeError("No se pudo actualizar el estado del planificador de ingesta")
+
+def add_pending(store, files, now_ms, debounce_ms=0, max_delay_ms=0):
+    """Añade los ficheros a pendientes, registra el instante del último evento y alarga la ventana de agrupación.
+
+    La ventana termina debounce_ms después del último evento y, como mucho, max_delay_ms después de la
+    primera subida pendiente.
+    """
+
+    def change(state):
+        for key in files:
+            state["pending"].setdefault(key, now_ms)
+        state["first_pending_at"] = state["first_pending_at"] or now_ms
+        state["last_event_at"] = now_ms
+        state["flush_at"] = min(now_ms + debounce_ms, state["first_pending_at"] + max_delay_ms)
+    return update_state(store, change)
+
+def claim_schedule(store, at, now_ms):
+    """Reserva la reinvocación diferida en at. Devuelve False si ya hay una programada antes que sigue en curso."""
+
+    claimed = []
+
+    def change(state):
+        scheduled = state["scheduled_at"]
+        if scheduled is not None and scheduled <= at and now_ms <= scheduled + SCHEDULE_GRACE_MS:
+            return False
+        state["scheduled_at"] = at
+        claimed.append(at)
+    update_state(store, change)
+    return bool(claimed)
+
+def release_schedule(store, at):
+    """Libera la reserva de la reinvocación en at (ya ha llegado o no se ha podido programar)."""
+
+    def change(state):
+        if state["scheduled_at"] != at:
+            return False
+        state["scheduled_at"] = None
+    update_state(store, change)
+
+def get_store(datasource_id):
+    if INGESTION_TABLE:
+        table = awsClients.get_table(INGESTION_TABLE, endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL"))
+        return DynamoStateStore(table, datasource_id)
+    return _memory_store
+
+_memory_store = MemoryStateStore()
+
+def job_summary(active_job, status, completed_at, statistics=None):
+    """Registro de un ingestion job: ficheros cubiertos, estado y tiempo hasta que son buscables."""
+
+    job = {
+        "job_id": active_job["job_id"],
+        "mode": active_job["mode"],
+        "status": status,
+        "files": sorted(active_job["files"]),
+        "started_at": active_job["started_at"]
+    }
+    if completed_at is not None:
+        waits = [completed_at - at for at in active_job["files"].values()]
+        job["completed_at"] = completed_at
+        job["max_time_to_searchable_ms"] = max(waits) if waits else 0
+        job["avg_time_to_searchable_ms"] = int(sum(waits) / len(waits)) if waits else 0
+    if statistics:
+        job["statistics"] = {key: int(value) for key, value in statistics.items() if isinstance(value, int)}
+    return job
+
+def now_ms():
+    return int(time.time() * 1000)
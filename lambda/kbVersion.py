@@ -0,0 +1,46 @@
+import os
+import time
+from cacheUtils import get_cache_table
+from requestMetrics import get_logger
+
+# La versión de la KB es el ID del último ingestion job lanzado por syncKnowledgeBase.py
+KB_VERSION_KEY = "kb_version"
+KB_VERSION_REFRESH_SECONDS = float(os.environ.get("KB_VERSION_REFRESH_SECONDS", "30"))
+# Versión usada cuando no hay tabla compartida donde registrarla
+DEFAULT_KB_VERSION = "local"
+
+_kb_version = {"version": DEFAULT_KB_VERSION, "checked_at": 0.0}
+logger = get_logger("kbVersion")
+
+def get_kb_version():
+    """Devuelve la versión actual de la Knowledge Base, refrescándola como mucho cada pocos segundos."""
+
+    now = time.time()
+    if now - _kb_version["checked_at"] < KB_VERSION_REFRESH_SECONDS:
+        return _kb_version["version"]
+
+    table = get_cache_table()
+    if table is not None:
+        try:
+            item = table.get_item(Key={"cache_key": KB_VERSION_KEY}).get("Item")
+            _kb_version["version"] = item["version"] if item else DEFAULT_KB_VERSION
+        except Exception as e:
+            logger.warning("Error leyendo la versión de la Knowledge Base: %s", e)
+    _kb_version["checked_at"] = now
+    return _kb_version["version"]
+
+def set_kb_version(job_id):
+    """Registra el ID del nuevo ingestion job como versión actual de la Knowledge Base."""
+
+    _kb_version["version"] = job_id
+    _kb_version["checked_at"] = time.time()
+
+    table = get_cache_table()
+    if table is None:
+        logger.warning("CACHE_TABLE no configurada: la versión de la Knowledge Base no se comparte")
+        return
+    table.put_item(Item={
+        "cache_key": KB_VERSION_KEY,
+        "version": job_id,
+        "updated_at": int(time.time())
+    })
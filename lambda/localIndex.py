@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from embeddings import get_embedder
+from requestMetrics import get_logger
+from retrievers import Retriever
+
+# Ficheros del índice local
+INDEX_META = "meta.json"
+INDEX_VECTORS = "vectors.f32"
+INDEX_CHUNKS = "chunks.jsonl"
+INDEX_CHUNK_OFFSETS = "chunk_offsets.npy"
+INDEX_CENTROIDS = "centroids.npy"
+INDEX_PARTITION_OFFSETS = "partition_offsets.npy"
+
+# Particiones IVF que se exploran por consulta
+LOCAL_INDEX_NPROBE = int(os.environ.get("LOCAL_INDEX_NPROBE", "4"))
+TEXT_EXTENSIONS = (".txt", ".md", ".json", ".csv")
+
+logger = get_logger("localIndex")
+
+class LocalVectorRetriever(Retriever):
+    """Recupera chunks de un índice local: matriz float32 normalizada en un fichero mapeado en memoria.
+
+    Al arrancar solo se leen los metadatos y se mapean los ficheros, así que la carga es casi
+    inmediata; el sistema operativo trae las páginas de la matriz a medida que se usan.
+    Con particiones (IVF) solo se puntúan los vectores de las LOCAL_INDEX_NPROBE más cercanas.
+    """
+
+    def __init__(self, index_dir, top_k=3, nprobe=LOCAL_INDEX_NPROBE, embed=None):
+        with open(os.path.join(index_dir, INDEX_META), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.index_dir = index_dir
+        self.top_k = top_k
+        self.nprobe = nprobe
+        self.embed = embed or get_embedder(self.meta["embedding"])
+        self.vectors = np.memmap(
+            os.path.join(index_dir, INDEX_VECTORS), dtype=np.float32, mode="r",
+            shape=(self.meta["count"], self.meta["dimensions"])
+        )
+        self.chunk_offsets = np.load(os.path.join(index_dir, INDEX_CHUNK_OFFSETS), mmap_mode="r")
+        if self.meta["partitions"]:
+            self.centroids = np.load(os.path.join(index_dir, INDEX_CENTROIDS))
+            self.partition_offsets = np.load(os.path.join(index_dir, INDEX_PARTITION_OFFSETS))
+        else:
+            self.centroids = None
+        self._chunks_lock = threading.Lock()
+        self._chunks_file = None
+
+    def retrieve(self, query):
+        query_vector = np.asarray(self.embed(query), dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        indices, scores = self.search(query_vector, self.top_k)
+
+        content_list = []
+        metadata_list = []
+        for index, score in zip(indices, scores):
+            chunk = self.read_chunk(int(index))
+            content_list.append(chunk["text"])
+            metadata_list.append({"source_uri": chunk["source_uri"], "page_number": chunk["page_number"], "score": float(score)})
+        return content_list, metadata_list
+
+    def search(self, query_vector, k):
+        """Top-k por similitud coseno (producto escalar con vectores normalizados)."""
+
+        if self.centroids is None:
+            candidates = None
+            scores = self.vectors @ query_vector
+        else:
+            probes = np.argsort(self.centroids @ query_vector)[::-1][:self.nprobe]
+            ranges = [(self.partition_offsets[p], self.partition_offsets[p + 1]) for p in probes]
+            candidates = np.concatenate([np.arange(start, end) for start, end in ranges])
+            scores = np.concatenate([self.vectors[start:end] @ query_vector for start, end in ranges])
+
+        k = min(k, len(scores))
+        if k == 0:
+            return [], []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        indices = top if candidates is None else candidates[top]
+        return indices, scores[top]
+
+    def read_chunk(self, index):
+        with self._chunks_lock:
+            if self._chunks_file is None:
+                self._chunks_file = open(os.path.join(self.index_dir, INDEX_CHUNKS), "rb")
+            self._chunks_file.seek(int(self.chunk_offsets[index]))
+            return json.loads(self._chunks_file.readline())
+
+def chunk_text(text, chunk_size, overlap):
+    """Divide el texto en fragmentos de chunk_size caracteres con overlap caracteres de solape."""
+
+    text = " ".join(text.split())
+    step = max(chunk_size - overlap, 1)
+    return [text[start:start + chunk_size] for start in range(0, max(len(text) - overlap, 1), step)]
+
+def extract_pages(name, data):
+    """Devuelve [(número de página o None, texto)] de un documento."""
+
+    if name.lower().endswith(".pdf"):
+        try:
+            from io import BytesIO
+            from pypdf import PdfReader
+        except ImportError:
+            logger.warning("pypdf no está instalado, se omite %s", name)
+            return []
+        reader = PdfReader(BytesIO(data))
+        return [(number, page.extract_text() or "") for number, page in enumerate(reader.pages, start=1)]
+    if name.lower().endswith(TEXT_EXTENSIONS):
+        return [(None, data.decode("utf-8", errors="ignore"))]
+    logger.warning("Formato no soportado, se omite %s", name)
+    return []
+
+def load_s3_documents(bucket, prefix="documents/"):
+    """Itera los documentos de S3 bajo el prefijo como (source_uri, páginas)."""
+
+    import boto3
+    s3 = boto3.client("s3")
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if key.endswith("/"):
+                continue
+            data = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+            yield f"s3://{bucket}/{key}", extract_pages(key, data)
+
+def load_local_documents(directory, uri_prefix=None):
+    """Itera los documentos de un directorio local; uri_prefix (p.ej. s3://bucket/documents) fija su URI."""
+
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, "/")
+            uri = f"{uri_prefix.rstrip('/')}/{relative}" if uri_prefix else path
+            with open(path, "rb") as f:
+                yield uri, extract_pages(name, f.read())
+
+def kmeans(matrix, k, iterations=10, seed=0):
+    """K-means esférico: devuelve (centroides normalizados, asignación de cada vector)."""
+
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(matrix @ centroids.T, axis=1)
+        for c in range(k):
+            members = matrix[assignments == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids, np.argmax(matrix @ centroids.T, axis=1)
+
+def build_local_index(documents, output_dir, embedding="titan", chunk_size=1200, overlap=200, partitions=0, workers=8):
+    """Construye el índice local a partir de (source_uri, páginas) y lo guarda en output_dir."""
+
+    chunks = []
+    for source_uri, pages in documents:
+        for page_number, text in pages:
+            for piece in chunk_text(text, chunk_size, overlap):
+                if piece.strip():
+                    chunks.append({"text": piece, "source_uri": source_uri, "page_number": page_number})
+    if not chunks:
+        raise ValueError("No se ha encontrado texto para indexar")
+
+    embed = get_embedder(embedding)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        matrix = np.asarray(list(pool.map(embed, [chunk["text"] for chunk in chunks])), dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    partitions = min(partitions, len(chunks))
+    if partitions:
+        # Se ordenan los vectores por partición para que cada una sea un bloque contiguo del fichero
+        centroids, assignments = kmeans(matrix, partitions)
+        order = np.argsort(assignments, kind="stable")
+        matrix = matrix[order]
+        chunks = [chunks[i] for i in order]
+        partition_offsets = np.searchsorted(assignments[order], np.arange(partitions + 1))
+
+    os.makedirs(output_dir, exist_ok=True)
+    matrix.tofile(os.path.join(output_dir, INDEX_VECTORS))
+    offsets = []
+    with open(os.path.join(output_dir, INDEX_CHUNKS), "wb") as f:
+        for chunk in chunks:
+            offsets.append(f.tell())
+            f.write(json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n")
+    np.save(os.path.join(output_dir, INDEX_CHUNK_OFFSETS), np.asarray(offsets, dtype=np.int64))
+    if partitions:
+        np.save(os.path.join(output_dir, INDEX_CENTROIDS), centroids.astype(np.float32))
+        np.save(os.path.join(output_dir, INDEX_PARTITION_OFFSETS), partition_offsets.astype(np.int64))
+
+    meta = {
+        "count": len(chunks),
+        "dimensions": int(matrix.shape[1]),
+        "embedding": embedding,
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "partitions": partitions
+    }
+    with open(os.path.join(output_dir, INDEX_META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
@@ -0,0 +1,656 @@
+import json
+import os
+import queue
+import random
+import socket
+import threading
+import time
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, ReadTimeoutError
+import awsClients
+import promptBuilder
+from requestMetrics import elapsed_ms, get_logger
+
+# Tiempo máximo hasta la primera salida de cada proveedor (respuesta completa, o primer fragmento en streaming)
+BEDROCK_TIMEOUT_SECONDS = float(os.environ.get("BEDROCK_TIMEOUT_SECONDS", "30"))
+OPENAI_TIMEOUT_SECONDS = float(os.environ.get("OPENAI_TIMEOUT_SECONDS", "30"))
+# Tiempo máximo sin fragmentos nuevos una vez que el stream ganador ha empezado
+MODEL_STREAM_IDLE_SECONDS = float(os.environ.get("MODEL_STREAM_IDLE_SECONDS", "15"))
+# Reintentos ante throttling o errores transitorios, con espera exponencial con jitter
+MODEL_MAX_RETRIES = int(os.environ.get("MODEL_MAX_RETRIES", "2"))
+MODEL_BACKOFF_BASE_MS = float(os.environ.get("MODEL_BACKOFF_BASE_MS", "200"))
+MODEL_BACKOFF_MAX_MS = float(os.environ.get("MODEL_BACKOFF_MAX_MS", "4000"))
+# Si el modelo elegido falla (o su circuito está abierto) se usa el otro
+MODEL_FALLBACK = os.environ.get("MODEL_FALLBACK", "true").lower() == "true"
+# Petición de cobertura: si el principal no ha respondido en su p95 se lanza también el secundario
+MODEL_HEDGING = os.environ.get("MODEL_HEDGING", "false").lower() == "true"
+MODEL_HEDGE_PERCENTILE = float(os.environ.get("MODEL_HEDGE_PERCENTILE", "95"))
+# Espera antes de cubrir mientras no hay MODEL_HEDGE_MIN_SAMPLES latencias observadas
+MODEL_HEDGE_DELAY_MS = float(os.environ.get("MODEL_HEDGE_DELAY_MS", "3000"))
+MODEL_HEDGE_MIN_SAMPLES = int(os.environ.get("MODEL_HEDGE_MIN_SAMPLES", "20"))
+# Circuito por proveedor: se abre tras N fallos seguidos y deja pasar una prueba tras el enfriamiento
+MODEL_BREAKER_FAILURES = int(os.environ.get("MODEL_BREAKER_FAILURES", "5"))
+MODEL_BREAKER_COOLDOWN_SECONDS = float(os.environ.get("MODEL_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Los reintentos los gestiona el router: el cliente de Bedrock no reintenta por su cuenta
+MODEL_CLIENT_CONFIG = Config(read_timeout=BEDROCK_TIMEOUT_SECONDS, retries={"max_attempts": 1, "mode": "standard"})
+BEDROCK_THROTTLING_CODES = ("ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException")
+BEDROCK_TRANSIENT_CODES = ("ServiceUnavailableException", "ModelNotReadyException", "InternalServerException", "ModelTimeoutException")
+OPENAI_THROTTLING_ERRORS = ("RateLimitError",)
+OPENAI_TRANSIENT_ERRORS = ("APIError", "Timeout", "TryAgain", "APIConnectionError", "ServiceUnavailableError")
+
+logger = get_logger("modelRouter")
+
+class ModelUnavailableError(Exception):
+    """Ningún proveedor ha podido generar la respuesta (fallos, tiempo agotado o circuitos abiertos)."""
+
+class ModelProvider:
+    """Interfaz común de los modelos de generación.
+
+    generate(prompt, usage) devuelve el texto completo y stream(prompt, usage, on_open) un iterador de
+    fragmentos; ambos acumulan en usage los tokens de entrada y salida. Si el proveedor puede cortar la
+    respuesta en curso desde otro hilo, stream pasa a on_open la función que lo hace. retry_reason(error) devuelve 'throttled',
+    'transient' o None si el error no se debe reintentar; trips_breaker(error) indica si cuenta como fallo
+    del proveedor en su circuito.
+    """
+
+    name = None
+    timeout = 30.0
+
+    def available(self):
+        return True
+
+    def generate(self, prompt, usage):
+        raise NotImplementedError
+
+    def stream(self, prompt, usage, on_open=None):
+        raise NotImplementedError
+
+    def retry_reason(self, error):
+        return None
+
+    def trips_breaker(self, error):
+        """Solo el throttling, los tiempos agotados y los 5xx son fallos del proveedor.
+
+        Los 4xx (validación, prompt demasiado largo...) dependen de la petición y no deben abrir el
+        circuito para el resto de usuarios.
+        """
+
+        if self.retry_reason(error) is not None or isinstance(error, TimeoutError):
+            return True
+        if isinstance(error, ClientError):
+            status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        else:
+            # Excepciones de openai.error (SDK 0.28)
+            status = getattr(error, "http_status", None)
+        return isinstance(status, int) and status >= 500
+
+class BedrockProvider(ModelProvider):
+    """Claude en Bedrock (invoke_model / invoke_model_with_response_stream)."""
+
+    name = "bedrock"
+
+    def __init__(self, timeout=BEDROCK_TIMEOUT_SECONDS):
+        self.timeout = timeout
+
+    def client(self):
+        return awsClients.get_client("bedrock-runtime", region_name="eu-central-1", config=MODEL_CLIENT_CONFIG)
+
+    def generate(self, prompt, usage):
+        kwargs = bedrock_request(prompt)
+
+        '''kwargs = {
+            "modelId": os.environ.get('MODEL_ID'),
+            "contentType": "application/json",
+            "accept": "*/*",
+            "body": json.dumps(
+                {
+                    "inputText": promptBuilder.prompt_text(prompt),
+                    "textGenerationConfig": {
+                        "temperature": 0.4,
+                        "maxTokenCount": 1000
+                    }
+                }
+            )
+        } Para amazon lite'''
+
+        response = self.client().invoke_model(**kwargs)
+        bedrock_output = json.loads(response['body'].read().decode('utf-8'))
+        logger.debug("Respuesta de Bedrock: %s", bedrock_output)
+        record_usage(usage, bedrock_output.get('usage', {}))
+        return bedrock_output['content'][0]['text']
+
+    def stream(self, prompt, usage, on_open=None):
+        response = self.client().invoke_model_with_response_stream(**bedrock_request(prompt))
+        if on_open is not None:
+            on_open(lambda: interrupt_response(response['body']))
+        try:
+            for event in response['body']:
+                if 'chunk' not in event:
+                    continue
+                payload = json.loads(event['chunk']['bytes'].decode('utf-8'))
+                if payload.get('type') == 'message_start':
+                    record_usage(usage, payload['message'].get('usage', {}))
+                elif payload.get('type') == 'message_delta':
+                    record_usage(usage, payload.get('usage', {}))
+                elif payload.get('type') == 'content_block_delta':
+                    text = payload['delta'].get('text', '')
+                    if text:
+                        yield text
+        finally:
+            # Si se abandona el stream (cobertura perdida, cliente desconectado) se libera la conexión
+            response['body'].close()
+
+    def retry_reason(self, error):
+        if isinstance(error, ClientError):
+            code = error.response.get("Error", {}).get("Code")
+            if code in BEDROCK_THROTTLING_CODES:
+                return "throttled"
+            if code in BEDROCK_TRANSIENT_CODES:
+                return "transient"
+        if isinstance(error, (ReadTimeoutError, BotocoreConnectionError)):
+            return "transient"
+        return None
+
+class OpenAIProvider(ModelProvider):
+    """GPT-4.1 mini con el SDK de OpenAI; openai_factory devuelve el módulo ya configurado."""
+
+    name = "openai"
+
+    def __init__(self, openai_factory, model="gpt-4.1-mini", timeout=OPENAI_TIMEOUT_SECONDS):
+        self.openai_factory = openai_factory
+        self.model = model
+        self.timeout = timeout
+
+    def available(self):
+        return bool(os.environ.get("OPENAI_API_KEY"))
+
+    def create(self, prompt, **kwargs):
+        return self.openai_factory().ChatCompletion.create(
+            model = self.model,
+            messages = [
+                {"role":"system", "content" : prompt["system"]},
+                {"role": "user", "content": prompt["user"]}
+            ],
+            max_tokens=1000,
+            temperature=0.4,
+            top_p=1.0,
+            request_timeout=self.timeout,
+            **kwargs
+        )
+
+    def generate(self, prompt, usage):
+        response = self.create(prompt)
+        if response.get("usage"):
+            record_usage(usage, {
+                "input_tokens": response["usage"]["prompt_tokens"],
+                "output_tokens": response["usage"]["completion_tokens"]
+            })
+        model_response = response.choices[0].message.content.strip()
+        logger.debug("Respuesta de OpenAI: %s", model_response)
+        return model_response
+
+    def stream(self, prompt, usage, on_open=None):
+        # El generador del SDK 0.28 no expone la conexión: la cancelación se aplica entre fragmentos
+        output = []
+        for chunk in self.create(prompt, stream=True):
+            text = chunk.choices[0].delta.get("content")
+            if text:
+                output.append(text)
+                yield text
+
+        # En streaming la API no devuelve el consumo: se estima con el mismo contador que el presupuesto del prompt
+        record_usage(usage, {
+            "input_tokens": prompt["tokens"]["total"],
+            "output_tokens": promptBuilder.estimate_tokens("".join(output))
+        })
+        usage["estimated"] = True
+
+    def retry_reason(self, error):
+        if type(error).__name__ in OPENAI_THROTTLING_ERRORS:
+            return "throttled"
+        if type(error).__name__ in OPENAI_TRANSIENT_ERRORS:
+            return "transient"
+        return None
+
+class Cancellation:
+    """Permite abortar desde otro hilo una llamada del router en curso (p.ej. una generación especulativa)."""
+
+    def __init__(self):
+        self.cancelled = False
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def on_cancel(self, callback):
+        with self.lock:
+            if not self.cancelled:
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        with self.lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+class CircuitBreaker:
+    """Abre el circuito tras failure_threshold fallos seguidos; pasado cooldown deja pasar una petición de prueba."""
+
+    def __init__(self, failure_threshold=MODEL_BREAKER_FAILURES, cooldown_seconds=MODEL_BREAKER_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.time() - self.opened_at >= self.cooldown_seconds:
+                self.probing = True
+                return True
+            return False
+
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half_open" if self.probing else "open"
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release_probe(self):
+        """La petición de prueba no ha dado resultado (rechazada o cancelada): la siguiente puede volver a probar."""
+
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    logger.warning("Circuito abierto tras %s fallos seguidos", self.failures)
+                self.opened_at = time.time()
+                self.probing = False
+
+class LatencyTracker:
+    """Ventana de las últimas latencias hasta la primera salida, para calcular el plazo de cobertura."""
+
+    def __init__(self, window=200):
+        self.window = window
+        self.values = []
+        self.lock = threading.Lock()
+
+    def record(self, value_ms):
+        with self.lock:
+            self.values.append(value_ms)
+            if len(self.values) > self.window:
+                self.values.pop(0)
+
+    def percentile(self, p, min_samples=MODEL_HEDGE_MIN_SAMPLES):
+        with self.lock:
+            if len(self.values) < min_samples:
+                return None
+            values = sorted(self.values)
+        return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+class Attempt(threading.Thread):
+    """Llamada a un proveedor en su propio hilo; publica ('chunk' | 'done' | 'error', valor) en la cola compartida.
+
+    Reintenta con espera exponencial con jitter mientras no haya emitido nada y quede plazo.
+    """
+
+    def __init__(self, router, provider, prompt, events, streaming):
+        super().__init__(daemon=True)
+        self.router = router
+        self.provider = provider
+        self.prompt = prompt
+        self.events = events
+        self.streaming = streaming
+        self.usage = {}
+        self.retries = 0
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + provider.timeout
+        self.first_output_ms = None
+        self.cancelled = threading.Event()
+        # Funciones que cortan la respuesta en curso del proveedor (on_open)
+        self.interrupts = []
+        self.lock = threading.Lock()
+
+    def run(self):
+        breaker = self.router.breakers[self.provider.name]
+        try:
+            if self.streaming:
+                iterator = self.with_retries(self.first_chunk)
+                for text in iterator:
+                    if self.cancelled.is_set():
+                        break
+                    self.publish("chunk", text)
+                if self.cancelled.is_set():
+                    # Cancelado (especulación, cobertura perdida, stream abandonado): no es éxito ni fallo
+                    iterator.close()
+                    breaker.release_probe()
+                    return
+                self.publish("done", None)
+            else:
+                text = self.with_retries(lambda: self.provider.generate(self.prompt, self.usage))
+                self.publish("done", text)
+            breaker.record_success()
+        except Exception as e:
+            if self.cancelled.is_set():
+                breaker.release_probe()
+            elif self.provider.trips_breaker(e):
+                breaker.record_failure()
+            else:
+                # El proveedor ha respondido: el error es de la petición (también cierra un circuito en prueba)
+                breaker.record_success()
+            self.publish("error", e)
+
+    def first_chunk(self):
+        """Abre el stream y espera su primer fragmento, que es lo que se reintenta."""
+
+        iterator = iter(self.provider.stream(self.prompt, self.usage, self.on_open))
+        first = next(iterator, None)
+
+        def chained():
+            # Al cerrar este generador (cancelación) yield from cierra también el stream del proveedor
+            if first is not None:
+                yield first
+            yield from iterator
+
+        return chained()
+
+    def with_retries(self, call):
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except Exception as e:
+                reason = self.provider.retry_reason(e)
+                backoff = random.uniform(0, min(MODEL_BACKOFF_MAX_MS, MODEL_BACKOFF_BASE_MS * 2 ** attempt)) / 1000
+                if reason is None or attempt >= MODEL_MAX_RETRIES or self.cancelled.is_set() \
+                        or time.perf_counter() + backoff >= self.deadline:
+                    raise
+                logger.warning("Reintentando %s (%s) en %.0f ms: %s", self.provider.name, reason, backoff * 1000, e)
+                attempt += 1
+                self.retries += 1
+                time.sleep(backoff)
+
+    def publish(self, kind, value):
+        if kind != "error" and self.first_output_ms is None:
+            self.first_output_ms = elapsed_ms(self.start_time)
+        self.events.put((self, kind, value))
+
+    def on_open(self, interrupt):
+        with self.lock:
+            if not self.cancelled.is_set():
+                self.interrupts.append(interrupt)
+                return
+        interrupt()
+
+    def cancel(self):
+        """Descarta el intento y corta su respuesta si el proveedor lo permite (si no, se para en el siguiente fragmento)."""
+
+        with self.lock:
+            self.cancelled.set()
+            interrupts, self.interrupts = self.interrupts, []
+        for interrupt in interrupts:
+            interrupt()
+
+class ModelRouter:
+    """Elige proveedor para cada petición: reintentos, circuito, alternativa y cobertura opcional.
+
+    generate/stream reciben usage (tokens del intento ganador) y routing, donde se registra la decisión:
+    proveedor ganador, si hubo cobertura o alternativa y el resultado y latencia de cada intento.
+    admit(nombre, primario) se llama antes de cada intento y lanza una excepción si el proveedor no admite
+    más llamadas; el intento se salta y, si no queda ninguno, se relanza esa excepción.
+    Con cancellation (Cancellation), cancelarla desde otro hilo corta los intentos en curso y termina la
+    llamada sin resultado.
+    """
+
+    def __init__(self, providers, fallback=MODEL_FALLBACK, hedging=MODEL_HEDGING, admit=None):
+        self.providers = {provider.name: provider for provider in providers}
+        self.fallback = fallback
+        self.hedging = hedging
+        self.admit = admit
+        self.breakers = {name: CircuitBreaker() for name in self.providers}
+        self.latencies = {(name, streaming): LatencyTracker() for name in self.providers for streaming in (False, True)}
+
+    def supports(self, selected_model):
+        return selected_model in self.providers
+
+    def candidates(self, selected_model):
+        """Proveedores en orden de preferencia: el elegido y, si se permite, los demás disponibles."""
+
+        names = [selected_model]
+        if self.fallback:
+            names += [name for name in self.providers if name != selected_model and self.providers[name].available()]
+        return [self.providers[name] for name in names]
+
+    def hedge_delay(self, provider, streaming):
+        percentile = self.latencies[(provider.name, streaming)].percentile(MODEL_HEDGE_PERCENTILE)
+        return (percentile if percentile is not None else MODEL_HEDGE_DELAY_MS) / 1000
+
+    def generate(self, selected_model, prompt, usage=None, routing=None, cancellation=None):
+        """Devuelve el texto completo del primer proveedor que responda."""
+
+        for kind, value in self.run(selected_model, prompt, usage, routing, streaming=False, cancellation=cancellation):
+            if kind == "done":
+                return value
+
+    def stream(self, selected_model, prompt, usage=None, routing=None, cancellation=None):
+        """Devuelve los fragmentos del primer proveedor que empiece a responder."""
+
+        for kind, value in self.run(selected_model, prompt, usage, routing, streaming=True, cancellation=cancellation):
+            if kind == "chunk":
+                yield value
+
+    def run(self, selected_model, prompt, usage, routing, streaming, cancellation=None):
+        usage = {} if usage is None else usage
+        routing = {} if routing is None else routing
+        if not self.supports(selected_model):
+            raise ValueError(f"Modelo no soportado: {selected_model}")
+
+        routing.update({"requested": selected_model, "provider": None, "hedged": False, "fallback": False, "attempts": []})
+        pending = self.candidates(selected_model)
+        events = queue.Queue()
+        active = []
+        rejections = []
+        last_error = None
+        start = time.perf_counter()
+        if cancellation is not None:
+            if cancellation.cancelled:
+                return
+            # Despierta la espera de eventos: un evento sin intento es la cancelación
+            cancellation.on_cancel(lambda: events.put((None, "cancelled", None)))
+
+        def launch(reason):
+            while pending and not (cancellation is not None and cancellation.cancelled):
+                provider = pending.pop(0)
+                breaker = self.breakers[provider.name]
+                if not breaker.allow():
+                    routing["attempts"].append({"provider": provider.name, "outcome": "circuit_open", "latency_ms": 0.0})
+                    continue
+                if self.admit is not None:
+                    try:
+                        # Solo el proveedor elegido espera turno; la alternativa y la cobertura no
+                        self.admit(provider.name, provider.name == selected_model)
+                    except Exception as e:
+                        # Si era la petición de prueba del circuito, no ha llegado a hacerse
+                        breaker.release_probe()
+                        routing["attempts"].append({"provider": provider.name, "outcome": "rejected", "latency_ms": 0.0})
+                        rejections.append(e)
+                        continue
+                if provider.name != selected_model:
+                    routing[reason] = True
+                attempt = Attempt(self, provider, prompt, events, streaming)
+                active.append(attempt)
+                attempt.start()
+                return attempt
+            return None
+
+        def finish(attempt, outcome):
+            active.remove(attempt)
+            routing["attempts"].append({
+                "provider": attempt.provider.name,
+                "outcome": outcome,
+                "latency_ms": elapsed_ms(attempt.start_time),
+                "retries": attempt.retries
+            })
+
+        primary = launch("fallback")
+        hedge_at = None
+        if primary is not None and self.hedging and pending:
+            hedge_at = time.perf_counter() + self.hedge_delay(primary.provider, streaming)
+
+        winner = None
+        while winner is None:
+            if not active:
+                if rejections and last_error is None:
+                    raise rejections[0]
+                raise ModelUnavailableError(f"Ningún modelo disponible: {last_error}" if last_error else "Ningún modelo disponible")
+            now = time.perf_counter()
+            wake = min([attempt.deadline for attempt in active] + ([hedge_at] if hedge_at else []))
+            try:
+                attempt, kind, value = events.get(timeout=max(wake - now, 0))
+            except queue.Empty:
+                now = time.perf_counter()
+                if hedge_at and now >= hedge_at:
+                    hedge_at = None
+                    launch("hedged")
+                for attempt in [attempt for attempt in active if now >= attempt.deadline]:
+                    attempt.cancel()
+                    self.breakers[attempt.provider.name].record_failure()
+                    finish(attempt, "timeout")
+                    last_error = TimeoutError(f"{attempt.provider.name} no ha respondido en {attempt.provider.timeout} s")
+                    if not active:
+                        launch("fallback")
+                continue
+
+            if attempt is None:
+                for other in list(active):
+                    other.cancel()
+                    finish(other, "cancelled")
+                return
+            if attempt not in active:
+                # Evento de un intento ya descartado
+                continue
+            if kind == "error":
+                finish(attempt, "error")
+                last_error = value
+                logger.error("Error generando con %s: %s", attempt.provider.name, value)
+                if not active:
+                    hedge_at = None
+                    launch("fallback")
+                continue
+
+            winner = attempt
+            self.latencies[(attempt.provider.name, streaming)].record(attempt.first_output_ms)
+            for other in list(active):
+                if other is not attempt:
+                    other.cancel()
+                    finish(other, "hedge_lost")
+
+        routing["provider"] = winner.provider.name
+        routing["first_output_ms"] = elapsed_ms(start)
+        try:
+            while True:
+                if kind == "error":
+                    finish(winner, "error")
+                    raise value
+                if kind == "done":
+                    finish(winner, "ok")
+                    yield kind, value
+                    return
+                yield kind, value
+                kind, value = self.next_event(events, winner)
+                if kind == "cancelled":
+                    winner.cancel()
+                    finish(winner, "cancelled")
+                    return
+                if kind is None:
+                    # Stream parado: no se espera hasta el tiempo máximo de la Lambda
+                    winner.cancel()
+                    self.breakers[winner.provider.name].record_failure()
+                    finish(winner, "stalled")
+                    raise TimeoutError(f"{winner.provider.name} no ha enviado nada en {MODEL_STREAM_IDLE_SECONDS} s")
+        finally:
+            if winner in active:
+                # El consumidor ha dejado de leer (o ha fallado) a mitad del stream
+                winner.cancel()
+                finish(winner, "abandoned")
+            for name, value in winner.usage.items():
+                usage[name] = usage.get(name, 0) + value if not isinstance(value, bool) else value
+
+    @staticmethod
+    def next_event(events, winner, idle_seconds=None):
+        """Siguiente evento del intento ganador (o la cancelación), o (None, None) si no llega ninguno en idle_seconds."""
+
+        idle_deadline = time.perf_counter() + (MODEL_STREAM_IDLE_SECONDS if idle_seconds is None else idle_seconds)
+        while True:
+            try:
+                event_attempt, kind, value = events.get(timeout=max(idle_deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                return None, None
+            if event_attempt is winner or event_attempt is None:
+                return kind, value
+
+def interrupt_response(body):
+    """Corta desde otro hilo la lectura de una respuesta en streaming de botocore.
+
+    close() no despierta al hilo bloqueado leyendo del socket; shutdown() sí, y el proveedor deja de generar.
+    """
+
+    raw = getattr(body, "_raw_stream", body)
+    connection = getattr(raw, "connection", None) or getattr(raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+def bedrock_request(prompt):
+    """Construye los argumentos de invocación del modelo de Bedrock."""
+
+    return {
+        "modelId": os.environ.get('MODEL_ID'),
+        "contentType": "application/json",
+        "accept": "application/json",
+        "body": json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": 1000,
+            "temperature": 0.4,
+            "system": promptBuilder.bedrock_system_blocks(prompt),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt["user"]
+                        }
+                    ]
+                }
+            ]
+        })
+    }
+
+def record_usage(usage, model_usage):
+    """Acumula los tokens que informa el modelo (incluidos los leídos/escritos en la caché de prompts)."""
+
+    for name in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+        if model_usage.get(name):
+            usage[name] = usage.get(name, 0) + int(model_usage[name])
@@ -0,0 +1,146 @@
+import math
+import os
+
+# Presupuesto de tokens para la parte variable del prompt (historial + chunks + pregunta)
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "3000"))
+# Fracción máxima del presupuesto para el historial cuando también hay chunks
+PROMPT_HISTORY_SHARE = float(os.environ.get("PROMPT_HISTORY_SHARE", "0.35"))
+PROMPT_MAX_CHUNK_TOKENS = int(os.environ.get("PROMPT_MAX_CHUNK_TOKENS", "500"))
+# Por debajo de este hueco no merece la pena recortar un chunk o un turno para que quepa
+PROMPT_MIN_CLIP_TOKENS = int(os.environ.get("PROMPT_MIN_CLIP_TOKENS", "40"))
+# Estimación de tokens sin tokenizador (el español sale algo por debajo de 4 caracteres por token)
+PROMPT_CHARS_PER_TOKEN = float(os.environ.get("PROMPT_CHARS_PER_TOKEN", "3.5"))
+# Marca el prefijo estático con cache_control para la caché de prompts de Bedrock
+PROMPT_CACHING = os.environ.get("PROMPT_CACHING", "false").lower() == "true"
+
+BASE_INSTRUCTIONS = (
+    "### 🖥️ [INSTRUCCIONES PARA EL CHATBOT DE PROGRAMACIÓN] 🖥️\n\n"
+
+    "### 🎯 ÁMBITO TEMÁTICO:\n"
+    "Habla **solo** de temas relacionados con **lenguajes de programación** (Python, JavaScript, C, C++, etc.) y conceptos afines (algoritmos, estructuras de datos, etc.). 💻\n\n"
+
+    "### 🗣️ TONO Y ESTILO:\n"
+    "- Usa el **tuteo** y un lenguaje **neutro, cercano y claro**.\n"
+    "- Añade **emojis tecnológicos** (ej. 💻, 🖥️, 👩‍💻, 🚀, 🔍,🐍,✔️,❌,⚠️,⛔) para hacerlo más dinámico.\n"
+    "- Estructura las respuestas con **viñetas**, **numeración** o **saltos de línea** para que sean fáciles de leer.\n"
+    "- Sé **amable, motivador y profesional**, como un **mentor en programación**.\n\n"
+)
+
+RAG_INSTRUCTIONS = (
+    "### 📌 ENFOQUE Y CONTENIDO:\n"
+    "- Responde de forma **clara, práctica y estructurada**.\n"
+    "- Usa el **historial** y el **contexto relevante** para dar respuestas precisas.\n"
+    "- Si el contexto no es suficiente, di: 'No tengo datos suficientes para responderte bien.'\n"
+    "- Ofrece **ejemplos concretos**, trucos útiles o consejos prácticos.\n\n"
+)
+
+ANSWER_INSTRUCTIONS = (
+    "### Instrucciones:\n"
+    "- Responde **solo** a la pregunta del usuario sin agregar información innecesaria.\n"
+    "- Usa el historial solo como referencia, únicamente cuando sea necesario y **no inventes nuevas conversaciones**.\n"
+    "- **Si el historial no es relevante**, ignóralo y responde directamente a la pregunta.\n"
+    "- **Mantén tu respuesta breve y relevante.**\n"
+    "Ten muy en cuenta las instrucciones proporcionadas"
+)
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / PROMPT_CHARS_PER_TOKEN) if text else 0
+
+def clip_to_tokens(text, max_tokens):
+    """Recorta el texto al número de tokens indicado, cortando por el último espacio."""
+
+    max_chars = int(max_tokens * PROMPT_CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    clipped = text[:max_chars]
+    return clipped[:clipped.rfind(" ")] + " […]" if " " in clipped else clipped + " […]"
+
+# Prefijos estáticos precompilados: idénticos en todas las peticiones, así que el proveedor puede cachearlos
+SIMPLE_PREFIX = BASE_INSTRUCTIONS + ANSWER_INSTRUCTIONS
+COMPLEX_PREFIX = BASE_INSTRUCTIONS + RAG_INSTRUCTIONS + ANSWER_INSTRUCTIONS
+PREFIX_TOKENS = {SIMPLE_PREFIX: estimate_tokens(SIMPLE_PREFIX), COMPLEX_PREFIX: estimate_tokens(COMPLEX_PREFIX)}
+
+def build_prompt(query, conversation_history, content_list=None):
+    """Construye el prompt ajustando historial y chunks al presupuesto de tokens.
+
+    conversation_history llega de DynamoDB del más reciente al más antiguo; se descartan primero
+    los turnos más antiguos. content_list es None en las consultas SIMPLE.
+    Devuelve un dict con el prefijo estático ('system'), la parte variable ('user') y el recuento
+    de tokens ('tokens').
+    """
+
+    prefix = COMPLEX_PREFIX if content_list is not None else SIMPLE_PREFIX
+    question = f"Pregunta del Usuario: {query}\n\nTu Respuesta:"
+    available = max(PROMPT_TOKEN_BUDGET - estimate_tokens(question), 0)
+
+    history_budget = int(available * PROMPT_HISTORY_SHARE) if content_list else available
+    turns, history_tokens, dropped_turns = fit_history(conversation_history, history_budget)
+    chunks, context_tokens, clipped_chunks, dropped_chunks = fit_chunks(content_list or [], available - history_tokens)
+
+    history = "\n\n".join(turns)
+    user = f"### Historial de Conversación:\n{history}\n\n"
+    if content_list is not None:
+        context = "\n".join([f"Chunk {i+1}: {text}" for i, text in enumerate(chunks)]) if chunks else "No hay información adicional."
+        user += f"### Contexto Relevante de la Base de Conocimiento:\n{context}\n\n"
+    user += question
+
+    tokens = {
+        "prefix": PREFIX_TOKENS[prefix],
+        "history": history_tokens,
+        "context": context_tokens,
+        "total": PREFIX_TOKENS[prefix] + estimate_tokens(user),
+        "history_turns": len(turns),
+        "history_turns_dropped": dropped_turns,
+        "chunks": len(chunks),
+        "chunks_clipped": clipped_chunks,
+        "chunks_dropped": dropped_chunks
+    }
+    return {"system": prefix, "user": user, "tokens": tokens}
+
+def fit_history(conversation_history, budget):
+    """Incluye los turnos más recientes que caben en el presupuesto, en orden cronológico."""
+
+    turns = []
+    used = 0
+    for item in conversation_history:
+        turn = f"User: {item['user_query']}\nBot: {item['model_response']}"
+        cost = estimate_tokens(turn)
+        if used + cost > budget:
+            remaining = budget - used
+            if remaining >= PROMPT_MIN_CLIP_TOKENS:
+                turn = clip_to_tokens(turn, remaining)
+                turns.append(turn)
+                used += estimate_tokens(turn)
+            break
+        turns.append(turn)
+        used += cost
+    return list(reversed(turns)), used, len(conversation_history) - len(turns)
+
+def fit_chunks(content_list, budget):
+    """Incluye los chunks por orden de relevancia recortándolos a PROMPT_MAX_CHUNK_TOKENS y al presupuesto."""
+
+    chunks = []
+    used = 0
+    clipped = 0
+    for text in content_list:
+        limit = min(PROMPT_MAX_CHUNK_TOKENS, budget - used)
+        if limit < PROMPT_MIN_CLIP_TOKENS:
+            break
+        piece = clip_to_tokens(text, limit)
+        if piece != text:
+            clipped += 1
+        chunks.append(piece)
+        used += estimate_tokens(piece)
+    return chunks, used, clipped, len(content_list) - len(chunks)
+
+def prompt_text(prompt):
+    """Prompt completo como un único texto."""
+
+    return prompt["system"] + "\n\n" + prompt["user"]
+
+def bedrock_system_blocks(prompt):
+    """Bloque 'system' de la API de mensajes de Anthropic, marcado para la caché de prompts si procede."""
+
+    if not PROMPT_CACHING:
+        return prompt["system"]
+    return [{"type": "text", "text": prompt["system"], "cache_control": {"type": "ephemeral"}}]
@@ -0,0 +1,82 @@
+import json
+import math
+import os
+import zlib
+from cacheUtils import normalize_query
+
+# Clasificador local (n-gramas con hashing + regresión logística) que evita invocar al agente
+# cuando está seguro. El modelo se entrena con scripts/trainQueryClassifier.py.
+LABELS = ["NULL", "SIMPLE", "COMPLEX"]
+CLASSIFIER_MODEL_PATH = os.environ.get(
+    "CLASSIFIER_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "queryClassifier.json")
+)
+CLASSIFIER_CONFIDENCE_THRESHOLD = float(os.environ.get("CLASSIFIER_CONFIDENCE_THRESHOLD", "0.9"))
+DEFAULT_BUCKETS = 2 ** 18
+
+def extract_features(text, n_buckets=DEFAULT_BUCKETS):
+    """Devuelve un vector disperso {bucket: peso} con palabras, bigramas y trigramas de caracteres."""
+
+    tokens = normalize_query(text).split()
+    grams = [f"w:{token}" for token in tokens]
+    grams += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    for token in tokens:
+        padded = f"<{token}>"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+
+    counts = {}
+    for gram in grams:
+        bucket = zlib.crc32(gram.encode("utf-8")) % n_buckets
+        counts[bucket] = counts.get(bucket, 0) + 1
+
+    features = {bucket: 1 + math.log(count) for bucket, count in counts.items()}
+    norm = math.sqrt(sum(value * value for value in features.values())) or 1.0
+    return {bucket: value / norm for bucket, value in features.items()}
+
+def predict_proba(model, features):
+    """Probabilidad de cada etiqueta (softmax) para un vector de características."""
+
+    scores = list(model["bias"])
+    weights = model["weights"]
+    for bucket, value in features.items():
+        row = weights.get(bucket)
+        if row is not None:
+            for i, weight in enumerate(row):
+                scores[i] += weight * value
+    top = max(scores)
+    exps = [math.exp(score - top) for score in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+def load_model(path=CLASSIFIER_MODEL_PATH):
+    """Carga el modelo JSON o devuelve None si no existe (el clasificador queda desactivado)."""
+
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        model = json.load(f)
+    model["weights"] = {int(bucket): row for bucket, row in model["weights"].items()}
+    return model
+
+def save_model(model, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**model, "weights": {str(b): row for b, row in model["weights"].items()}}, f)
+
+def classify(text):
+    """Clasifica la consulta en local. Devuelve (etiqueta, confianza) o (None, 0.0) sin modelo."""
+
+    if model is None:
+        return None, 0.0
+    probabilities = predict_proba(model, extract_features(text, model["n_buckets"]))
+    best = max(range(len(probabilities)), key=probabilities.__getitem__)
+    return model["labels"][best], probabilities[best]
+
+def parse_label(agent_response):
+    """Extrae NULL, SIMPLE o COMPLEX de la respuesta del agente aunque venga con texto adicional."""
+
+    words = [word.strip("'\".,:;!¡?¿()[]") for word in agent_response.upper().split()]
+    found = [word for word in words if word in LABELS]
+    return found[-1] if found else None
+
+# Se carga una vez por contenedor
+model = load_model()
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+# Nivel de los logs de la aplicación; con DEBUG se registran respuestas completas del guardrail, agente y modelos
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Métricas en CloudWatch Embedded Metric Format (una línea JSON por petición)
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "ServerlessRagChatbot")
+# Fracción de peticiones que emiten su registro; las peticiones con error se registran siempre
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", "1.0"))
+METRIC_DIMENSIONS = ["Model", "Classification"]
+# Funciones que reciben cada registro emitido además de stdout (p.ej. scripts/loadTest.py)
+listeners = []
+
+def get_logger(name):
+    """Logger con el nivel de LOG_LEVEL. En Lambda usa el handler del runtime; en local, uno por consola."""
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    return logger
+
+class RequestMetrics:
+    """Spans, contadores y propiedades de una petición, emitidos al final como un registro EMF.
+
+    spans: duración en milisegundos de cada etapa (guardrail, classify, history, retrieve, prompt, generate, store...).
+    counters: tokens de entrada/salida y aciertos de caché.
+    properties: datos sin métrica asociada (desglose de tokens del prompt, etapas descartadas...).
+    """
+
+    def __init__(self, sample_rate=None):
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self.properties = {}
+        self.sample_rate = METRICS_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.sampled = random.random() < self.sample_rate
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = elapsed_ms(start)
+
+    def timed(self, name, func, *args):
+        """Ejecuta func dentro del span name y devuelve su resultado."""
+
+        with self.span(name):
+            return func(*args)
+
+    def mark(self, name):
+        """Registra como span el tiempo transcurrido desde el inicio de la petición (p.ej. first_token)."""
+
+        self.spans[name] = elapsed_ms(self.start)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_usage(self, usage):
+        for name, value in usage.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.count(name, value)
+
+    def emf_record(self, dimensions, error=None):
+        """Construye el registro EMF: las métricas van en la raíz junto a las dimensiones y propiedades."""
+
+        self.spans["total"] = elapsed_ms(self.start)
+        metrics = [{"Name": f"{name}_ms", "Unit": "Milliseconds"} for name in self.spans]
+        metrics += [{"Name": name, "Unit": "Count"} for name in self.counters]
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [[name for name in METRIC_DIMENSIONS if name in dimensions]],
+                    "Metrics": metrics + ([{"Name": "errors", "Unit": "Count"}] if error else [])
+                }]
+            },
+            **{str(key): str(value) for key, value in dimensions.items()},
+            **{f"{name}_ms": value for name, value in self.spans.items()},
+            **self.counters,
+            **self.properties,
+            "sample_rate": self.sample_rate
+        }
+        if error:
+            record["errors"] = 1
+            record["error"] = error
+        return record
+
+    def emit(self, dimensions, error=None):
+        """Escribe el registro en stdout si la petición está muestreada o ha fallado.
+
+        Se usa print y no logging: CloudWatch solo extrae las métricas de líneas que son JSON completo.
+        """
+
+        if not self.sampled and error is None:
+            return None
+        record = self.emf_record(dimensions, error)
+        print(json.dumps(record, default=str))
+        for listener in listeners:
+            listener(record)
+        return record
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
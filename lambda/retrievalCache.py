@@ -0,0 +1,58 @@
+import os
+from cacheUtils import TTLCache, SharedCacheTier, get_cache_table, normalize_query, query_hash
+from kbVersion import get_kb_version
+
+# Caché de resultados de la Knowledge Base por consulta normalizada y versión de la KB
+RETRIEVAL_CACHE_ENABLED = os.environ.get("RETRIEVAL_CACHE_ENABLED", "false").lower() == "true"
+RETRIEVAL_CACHE_TTL_SECONDS = int(os.environ.get("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.environ.get("RETRIEVAL_CACHE_MAX_ENTRIES", "256"))
+# Nivel compartido en CACHE_TABLE para que se beneficien todos los contenedores
+RETRIEVAL_CACHE_SHARED = os.environ.get("RETRIEVAL_CACHE_SHARED", "true").lower() == "true"
+
+local_cache = TTLCache(RETRIEVAL_CACHE_MAX_ENTRIES, RETRIEVAL_CACHE_TTL_SECONDS)
+counters = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+def cached_retrieve(query, retrieve):
+    """Devuelve (content_list, metadata_list) de la caché o llamando a retrieve(query) si no está."""
+
+    content_list, metadata_list, _ = lookup(query, retrieve)
+    return content_list, metadata_list
+
+def lookup(query, retrieve):
+    """Como cached_retrieve, pero devuelve también el origen del resultado: 'local', 'shared' o 'miss'.
+
+    La clave incluye la versión de la KB (último ingestion job), así que una nueva sincronización
+    deja obsoletas las entradas anteriores sin tener que borrarlas.
+    """
+
+    key = query_hash(get_kb_version(), normalize_query(query))
+
+    entry = local_cache.get(key)
+    if entry is not None:
+        counters["local_hits"] += 1
+        return entry["content_list"], entry["metadata_list"], "local"
+
+    shared_tier = get_shared_tier()
+    if shared_tier is not None:
+        entry = shared_tier.get(key)
+        if entry is not None:
+            counters["shared_hits"] += 1
+            local_cache.set(key, entry)
+            return entry["content_list"], entry["metadata_list"], "shared"
+
+    counters["misses"] += 1
+    content_list, metadata_list = retrieve(query)
+    # Los resultados vacíos (o errores de la KB) no se cachean
+    if content_list:
+        entry = {"content_list": content_list, "metadata_list": metadata_list}
+        local_cache.set(key, entry)
+        if shared_tier is not None:
+            shared_tier.set(key, entry, RETRIEVAL_CACHE_TTL_SECONDS)
+    return content_list, metadata_list, "miss"
+
+def get_shared_tier():
+    table = get_cache_table() if RETRIEVAL_CACHE_SHARED else None
+    return SharedCacheTier(table, "retrieval") if table is not None else None
+
+def stats():
+    return {**counters, "entries": len(local_cache)}
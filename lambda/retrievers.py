@@ -0,0 +1,77 @@
+import os
+
+# Backend de recuperación: 'bedrock' (Knowledge Base gestionada) o 'local' (índice NumPy en disco)
+RETRIEVER = os.environ.get("RETRIEVER", "bedrock")
+LOCAL_INDEX_DIR = os.environ.get(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "index")
+)
+# app.py solo usa los chunks de consultas que ya han pasado el guardrail de entrada, así que por defecto
+# la Knowledge Base no lo vuelve a aplicar; RETRIEVAL_GUARDRAIL=true lo activa también en retrieve
+RETRIEVAL_GUARDRAIL = os.environ.get("RETRIEVAL_GUARDRAIL", "false").lower() == "true"
+# Candidatos que se piden al backend; chunkSelection.py elige después los que entran en el prompt
+RETRIEVAL_CANDIDATES = int(os.environ.get("RETRIEVAL_CANDIDATES", "10"))
+
+class Retriever:
+    """Interfaz común de los backends de recuperación.
+
+    retrieve(query) devuelve (content_list, metadata_list) ordenados por relevancia, donde cada metadato
+    tiene 'source_uri' y 'page_number', que es lo que usan las referencias de app.py, y 'score'.
+    """
+
+    def retrieve(self, query):
+        raise NotImplementedError
+
+class BedrockKBRetriever(Retriever):
+    """Recupera chunks con Bedrock Knowledge Base (kb_client.retrieve); sin guardrail_id no se aplica guardrail."""
+
+    def __init__(self, kb_client, knowledge_base_id, guardrail_id=None, guardrail_version='1', top_k=RETRIEVAL_CANDIDATES):
+        self.kb_client = kb_client
+        self.knowledge_base_id = knowledge_base_id
+        self.guardrail_id = guardrail_id
+        self.guardrail_version = guardrail_version
+        self.top_k = top_k
+
+    def retrieve(self, query):
+        kwargs = {
+            "knowledgeBaseId": self.knowledge_base_id,
+            "retrievalQuery": {"text": query},
+            "retrievalConfiguration": {
+                "vectorSearchConfiguration": {"numberOfResults": self.top_k}
+            }
+        }
+        if self.guardrail_id:
+            kwargs["guardrailConfiguration"] = {
+                'guardrailId': self.guardrail_id,
+                'guardrailVersion': self.guardrail_version
+            }
+        response = self.kb_client.retrieve(**kwargs)
+        chunks = response["retrievalResults"][:self.top_k]
+
+        content_list = []
+        metadata_list = []
+
+        for chunk in chunks:
+            content_list.append(chunk["content"]["text"])
+            metadata = chunk.get("metadata", {})
+            page_number = metadata.get("x-amz-bedrock-kb-document-page-number")
+            metadata_list.append({
+                "source_uri": metadata.get("x-amz-bedrock-kb-source-uri"),
+                # Los documentos que no son PDF no tienen número de página
+                "page_number": int(page_number) if page_number is not None else None,
+                "score": chunk.get("score")
+            })
+
+        return content_list, metadata_list
+
+def create_retriever(kb_client):
+    """Crea el backend configurado en RETRIEVER."""
+
+    if RETRIEVER == "local":
+        # Import diferido: numpy solo se carga cuando se usa el índice local
+        from localIndex import LocalVectorRetriever
+        return LocalVectorRetriever(LOCAL_INDEX_DIR, top_k=RETRIEVAL_CANDIDATES)
+    if RETRIEVER == "bedrock":
+        guardrail_id = os.environ.get('GUARDRAIL_ID') if RETRIEVAL_GUARDRAIL else None
+        return BedrockKBRetriever(kb_client, os.environ.get('KB_ID'), guardrail_id, os.environ.get('GUARDRAIL_VERSION', '1'))
+    raise ValueError(f"Backend de recuperación no soportado: {RETRIEVER}")
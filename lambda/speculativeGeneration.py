@@ -0,0 +1,140 @@
+import collections
+import math
+import os
+import queue
+import threading
+import time
+import promptBuilder
+from modelRouter import Cancellation
+from requestMetrics import elapsed_ms
+
+# Generación especulativa de las consultas SIMPLE: empieza en cuanto pasa el guardrail, en paralelo con la
+# clasificación; se conserva si la etiqueta es SIMPLE y se aborta si es COMPLEX o NULL
+SPECULATIVE_SIMPLE = os.environ.get("SPECULATIVE_SIMPLE", "false").lower() == "true"
+# Guarda de coste: solo se especula si al menos SPECULATIVE_MIN_SIMPLE_RATIO de las últimas SPECULATIVE_WINDOW
+# consultas clasificadas en el contenedor fueron SIMPLE (y hay SPECULATIVE_MIN_SAMPLES para saberlo)
+SPECULATIVE_MIN_SIMPLE_RATIO = float(os.environ.get("SPECULATIVE_MIN_SIMPLE_RATIO", "0.6"))
+SPECULATIVE_WINDOW = int(os.environ.get("SPECULATIVE_WINDOW", "100"))
+SPECULATIVE_MIN_SAMPLES = int(os.environ.get("SPECULATIVE_MIN_SAMPLES", "20"))
+
+class SimpleRatioGuard:
+    """Fracción de consultas SIMPLE entre las últimas clasificadas."""
+
+    def __init__(self, window=SPECULATIVE_WINDOW, min_ratio=SPECULATIVE_MIN_SIMPLE_RATIO, min_samples=SPECULATIVE_MIN_SAMPLES):
+        self.labels = collections.deque(maxlen=window)
+        self.min_ratio = min_ratio
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+
+    def record(self, label):
+        with self.lock:
+            self.labels.append(label == "SIMPLE")
+
+    def ratio(self):
+        with self.lock:
+            if len(self.labels) < self.min_samples:
+                return None
+            return round(sum(self.labels) / len(self.labels), 3)
+
+    def allow(self):
+        ratio = self.ratio()
+        return ratio is not None and ratio >= self.min_ratio
+
+guard = SimpleRatioGuard()
+
+class SpeculativeGeneration(threading.Thread):
+    """Generación del prompt SIMPLE en su propio hilo, lanzada antes de conocer la clasificación.
+
+    stream(modelo, prompt, usage, routing, cancellation) es el stream del router de modelos. Los fragmentos
+    se guardan en una cola: si la consulta es SIMPLE, keep() y consume() los entregan (los ya generados, al
+    momento); si no, cancel() aborta la llamada del router y con ella la respuesta del proveedor, aunque
+    todavía no haya llegado el primer fragmento.
+    """
+
+    def __init__(self, stream, model, prompt):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.model = model
+        self.prompt = prompt
+        self.usage = {}
+        self.routing = {}
+        self.chunks = queue.Queue()
+        self.cancelled = threading.Event()
+        self.cancellation = Cancellation()
+        self.outcome = "running"
+        self.output_chars = 0
+        self.saved_ms = None
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.start()
+
+    @property
+    def kept(self):
+        return self.outcome == "kept"
+
+    def run(self):
+        iterator = self.stream(self.model, self.prompt, self.usage, self.routing, self.cancellation)
+        result = ("done", None)
+        try:
+            for text in iterator:
+                if self.cancelled.is_set():
+                    break
+                self.output_chars += len(text)
+                self.chunks.put(("chunk", text))
+        except Exception as e:
+            result = ("error", e)
+        finally:
+            iterator.close()
+            self.end_time = time.perf_counter()
+            self.chunks.put(result)
+
+    def keep(self):
+        """La consulta es SIMPLE: la respuesta es la de esta generación."""
+
+        self.outcome = "kept"
+        # Latencia ahorrada: lo que lleva generando al conocerse la etiqueta (como mucho, toda la generación)
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        self.saved_ms = round((end - self.start_time) * 1000, 1)
+
+    def cancel(self):
+        if self.outcome == "running":
+            self.outcome = "cancelled"
+        self.cancelled.set()
+        # Desde este hilo no se puede cerrar el generador del router mientras el otro lo avanza
+        self.cancellation.cancel()
+
+    def consume(self, usage, routing):
+        """Itera los fragmentos de la generación y, al terminar, copia en usage y routing los del router."""
+
+        try:
+            while True:
+                kind, value = self.chunks.get()
+                if kind == "chunk":
+                    yield value
+                    continue
+                if kind == "error":
+                    raise value
+                usage.update(self.usage)
+                routing.update(self.routing)
+                return
+        finally:
+            if self.end_time is None:
+                # Se ha dejado de leer a mitad (p.ej. el cliente se ha desconectado)
+                self.cancel()
+
+    def report(self):
+        """Latencia ahorrada si se ha conservado; si se ha cancelado, tokens gastados en balde.
+
+        Si el stream aún no se ha cerrado, los tokens de salida se estiman con el texto recibido y los de
+        entrada con los del prompt.
+        """
+
+        if self.kept:
+            return {"outcome": "kept", "saved_ms": self.saved_ms}
+        return {
+            "outcome": self.outcome,
+            "generated_ms": elapsed_ms(self.start_time) if self.end_time is None else round((self.end_time - self.start_time) * 1000, 1),
+            "wasted_input_tokens": self.usage.get("input_tokens") or self.prompt["tokens"]["total"],
+            "wasted_output_tokens": max(self.usage.get("output_tokens", 0), math.ceil(self.output_chars / promptBuilder.PROMPT_CHARS_PER_TOKEN)),
+            "estimated": self.end_time is None or "input_tokens" not in self.usage
+        }
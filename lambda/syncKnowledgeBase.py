@@ -1,31 +1,376 @@
 import json
-import boto3
-import time
+import math
+import os
+import awsClients
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import unquote_plus
+from botocore.exceptions import ClientError
+from kbVersion import set_kb_version
+from ingestionManifest import get_manifest, is_unchanged, pending_removals, record_failed, record_ingested, record_removal, record_upload
+from requestMetrics import get_logger
+from ingestionScheduler import RUNNING_STATUSES, STALE_CLAIM_MS, add_pending, claim_schedule, get_store, job_summary, now_ms, release_schedule, update_state
 
-#Agente bedrock
-bedrock_client = boto3.client("bedrock-agent", region_name="eu-central-1")
+#Configuración
+KB_ID = os.environ.get("KB_ID")
+DATASOURCE_ID = os.environ.get("DATASOURCE_ID")
+REQUIRED_CONFIG = {"KB_ID": KB_ID, "DATASOURCE_ID": DATASOURCE_ID}
+# Solo los objetos bajo este prefijo disparan una sincronización
+SYNC_PREFIX = os.environ.get("SYNC_PREFIX", "documents/")
+# Ventana de agrupación: se espera a que no lleguen más subidas durante este tiempo
+SYNC_DEBOUNCE_SECONDS = float(os.environ.get("SYNC_DEBOUNCE_SECONDS", "20"))
+# Espera máxima desde la primera subida pendiente aunque sigan llegando más
+SYNC_MAX_DELAY_SECONDS = float(os.environ.get("SYNC_MAX_DELAY_SECONDS", "120"))
+# Rol con el que EventBridge Scheduler reinvoca esta Lambda al cerrarse la ventana y mientras hay un job en
+# curso; sin él, los pendientes esperan a la siguiente subida o a la invocación periódica
+SYNC_SCHEDULER_ROLE_ARN = os.environ.get("SYNC_SCHEDULER_ROLE_ARN")
+SYNC_SCHEDULE_GROUP = os.environ.get("SYNC_SCHEDULE_GROUP", "default")
+# Cada cuánto se vuelve a comprobar un job en curso
+SYNC_POLL_SECONDS = float(os.environ.get("SYNC_POLL_SECONDS", "60"))
+# 'documents': solo se ingieren (o se borran de la KB) los documentos nuevos, modificados o eliminados con
+# las APIs por documento; 'full': ingestion job de toda la data source
+SYNC_MODE = os.environ.get("SYNC_MODE", "documents")
+# Con más ficheros pendientes que estos, un job completo sale más barato que las llamadas por documento
+INCREMENTAL_MAX_FILES = int(os.environ.get("INCREMENTAL_MAX_FILES", "100"))
+# Máximo de documentos por llamada de las APIs por documento
+DOCUMENT_BATCH_SIZE = 10
+# Jobs fallidos seguidos tras los que un fichero deja de reintentarse (estado 'failed' en el manifiesto)
+SYNC_MAX_ATTEMPTS = int(os.environ.get("SYNC_MAX_ATTEMPTS", "3"))
+DOCUMENT_RUNNING_STATUSES = ("PENDING", "STARTING", "IN_PROGRESS", "DELETING", "DELETE_IN_PROGRESS")
+DOCUMENT_INDEXED_STATUSES = ("INDEXED", "PARTIALLY_INDEXED", "METADATA_PARTIALLY_INDEXED")
 
-#Constantes
-KB_ID = "X8CQAGVDFK"
-DATASOURCE_ID = "1QM5UFQ4J4"
+logger = get_logger("syncKnowledgeBase")
+missing_config = [name for name, value in REQUIRED_CONFIG.items() if not value]
+if missing_config:
+    logger.error("Faltan variables de entorno de la sincronización: %s", ", ".join(missing_config))
 
 def lambda_handler(event, context):
-    """Función para sincronizar los datasources de una Knowledge Base al subir un fichero nuevo"""
+    """Función para sincronizar los datasources de una Knowledge Base al subir ficheros nuevos.
 
-    s3_bucket = event["Records"][0]["s3"]["bucket"]["name"]
-    file_key = event["Records"][0]["s3"]["object"]["key"]
-    
-    print(f"New file uploaded: s3://{s3_bucket}/{file_key}")
+    Los objetos cuyo hash de contenido coincide con el del manifiesto de ingesta se ignoran. El resto
+    de registros del evento y las subidas que lleguen dentro de la ventana de agrupación se ingieren
+    en un único job. La ventana se guarda en el estado del planificador (flush_at) y no se espera en
+    la Lambda: se programa una reinvocación con EventBridge Scheduler para cuando se cierre. Si ya hay
+    un job en curso no lanza otro: los ficheros quedan pendientes y se vuelve a comprobar el job cada
+    SYNC_POLL_SECONDS. Un evento sin 'Records' (reinvocación programada o regla periódica) solo lanza
+    o comprueba el job.
+    """
 
-    sync_job = bedrock_client.start_ingestion_job(
-        knowledgeBaseId=KB_ID,
-        dataSourceId=DATASOURCE_ID
-    )
+    if missing_config:
+        # Sin la KB no se puede ingerir nada: mejor fallar antes de encolar ficheros
+        raise RuntimeError(f"Faltan variables de entorno: {', '.join(missing_config)}")
 
-    job_id = sync_job["ingestionJob"]["ingestionJobId"]
-    print(f"Started Sync Job: {job_id}")
+    store = get_store(DATASOURCE_ID)
+    manifest = get_manifest()
+    uploaded, removed = object_changes(event)
+    changed, unchanged = filter_unchanged(manifest, uploaded)
+    for uri in unchanged:
+        logger.info("File unchanged, skipping ingestion: %s", uri)
+    for uri in removed:
+        record_removal(manifest, uri)
+        logger.info("File removed: %s", uri)
+    files = changed + removed
 
+    if files:
+        state = add_pending(store, files, now_ms(), int(SYNC_DEBOUNCE_SECONDS * 1000), int(SYNC_MAX_DELAY_SECONDS * 1000))
+        for file_key in changed:
+            logger.info("New file uploaded: %s", file_key)
+    else:
+        if event.get("scheduled_at"):
+            release_schedule(store, event["scheduled_at"])
+        state = store.load()
+
+    if state["pending"] and state["flush_at"] is not None and state["flush_at"] > now_ms():
+        # Ventana de agrupación abierta: la invocación programada (o una subida posterior) lanzará el job
+        schedule_check(store, state["flush_at"], context)
+        return build_response("debounced", files=files, unchanged=unchanged)
+
+    result = flush(store, manifest)
+    if result["status"] in ("started", "deferred"):
+        # El job en curso (o los pendientes que no se han podido lanzar) se comprueban más tarde
+        schedule_check(store, now_ms() + int(SYNC_POLL_SECONDS * 1000), context)
+    return build_response(**result, unchanged=unchanged)
+
+def object_changes(event):
+    """Devuelve ([(uri, bucket, key)] subidos, [uri] eliminados) de los objetos del evento de S3 bajo SYNC_PREFIX."""
+
+    uploaded, removed = [], []
+    for record in event.get("Records", []):
+        if "s3" not in record:
+            continue
+        bucket = record["s3"]["bucket"]["name"]
+        key = unquote_plus(record["s3"]["object"]["key"])
+        if not key.startswith(SYNC_PREFIX) or key.endswith("/"):
+            continue
+        uri = f"s3://{bucket}/{key}"
+        if record.get("eventName", "").startswith("ObjectRemoved"):
+            removed.append(uri)
+        else:
+            uploaded.append((uri, bucket, key))
+    return uploaded, removed
+
+def filter_unchanged(manifest, uploaded):
+    """Separa los objetos con contenido nuevo (que se registran en el manifiesto) de los que no han cambiado.
+
+    El hash es el SHA-256 que uploadFile.py guarda en los metadatos del objeto o, si no está, su ETag.
+    """
+
+    changed, unchanged = [], []
+    for uri, bucket, key in uploaded:
+        try:
+            head = s3().head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            # El objeto se ha borrado antes de procesar el evento: llegará su ObjectRemoved
+            logger.warning("No se puede leer %s: %s", uri, e)
+            continue
+        sha256 = head.get("Metadata", {}).get("sha256") or head["ETag"].strip('"')
+        if is_unchanged(manifest.get(uri), sha256):
+            unchanged.append(uri)
+            continue
+        record_upload(manifest, uri, sha256, head.get("ContentLength", 0))
+        changed.append(uri)
+    return changed, unchanged
+
+def schedule_check(store, at, context):
+    """Programa una invocación de esta Lambda en at (ms) con una planificación de un solo uso de EventBridge Scheduler.
+
+    No se programa otra si ya hay una pendiente antes de at. Sin SYNC_SCHEDULER_ROLE_ARN (o fuera de Lambda)
+    no se programa nada y la comprobación la hace la siguiente subida o la invocación periódica.
+    """
+
+    function_arn = getattr(context, "invoked_function_arn", None)
+    if not SYNC_SCHEDULER_ROLE_ARN or not function_arn:
+        logger.debug("Sin EventBridge Scheduler: los pendientes esperan a la siguiente invocación")
+        return
+    if not claim_schedule(store, at, now_ms()):
+        return
+
+    # Las expresiones at() tienen resolución de segundos y no admiten instantes pasados
+    run_at = datetime.fromtimestamp(math.ceil(max(at, now_ms() + 1000) / 1000), timezone.utc)
+    try:
+        scheduler().create_schedule(
+            Name=f"kb-sync-{DATASOURCE_ID}-{at}",
+            GroupName=SYNC_SCHEDULE_GROUP,
+            ScheduleExpression=f"at({run_at:%Y-%m-%dT%H:%M:%S})",
+            ScheduleExpressionTimezone="UTC",
+            FlexibleTimeWindow={"Mode": "OFF"},
+            Target={"Arn": function_arn, "RoleArn": SYNC_SCHEDULER_ROLE_ARN, "Input": json.dumps({"scheduled_at": at})},
+            ActionAfterCompletion="DELETE"
+        )
+        logger.info("Sincronización programada para %s", run_at.isoformat())
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConflictException":
+            # Otra invocación ya la ha creado
+            return
+        release_schedule(store, at)
+        logger.error("No se puede programar la sincronización: %s", e)
+
+def flush(store, manifest):
+    """Lanza un job con los ficheros pendientes si no hay otro en curso.
+
+    Hasta INCREMENTAL_MAX_FILES ficheros (y con SYNC_MODE=documents) el job son llamadas a las APIs por
+    documento; con más, un ingestion job de toda la data source.
+    """
+
+    state = store.load()
+    active = state["active_job"]
+
+    if active and active["job_id"]:
+        if active["mode"] == "documents":
+            status, statistics, failed = documents_status(manifest, active["files"])
+        else:
+            job = bedrock_agent().get_ingestion_job(
+                knowledgeBaseId=KB_ID,
+                dataSourceId=DATASOURCE_ID,
+                ingestionJobId=active["job_id"]
+            )["ingestionJob"]
+            status, statistics, failed = job["status"], job.get("statistics"), None
+        if status in RUNNING_STATUSES:
+            logger.info("Sync Job %s %s: %s ficheros en espera", active["job_id"], status, len(state["pending"]))
+            return {"status": "deferred", "job_id": active["job_id"], "files": sorted(state["pending"])}
+        finish_job(store, manifest, active, status, statistics, failed)
+    elif active and now_ms() - active["started_at"] > STALE_CLAIM_MS:
+        # El job se reclamó pero no llegó a arrancar: sus ficheros vuelven a pendientes
+        release_claim(store, active)
+    elif active:
+        return {"status": "deferred", "files": sorted(state["pending"])}
+
+    claimed = {}
+
+    def claim(state):
+        if state["active_job"] or not state["pending"]:
+            return False
+        claimed.update(state["pending"])
+        mode = "documents" if SYNC_MODE == "documents" and len(claimed) <= INCREMENTAL_MAX_FILES else "full"
+        state["active_job"] = {"job_id": None, "mode": mode, "files": dict(state["pending"]), "started_at": now_ms()}
+        state["pending"] = {}
+        state["first_pending_at"] = None
+        state["flush_at"] = None
+
+    state = update_state(store, claim)
+    if not claimed:
+        return {"status": "idle" if not state["active_job"] else "deferred", "files": sorted(state["pending"])}
+
+    try:
+        if state["active_job"]["mode"] == "documents":
+            job_id, job_status = start_documents_job(manifest, sorted(claimed))
+        else:
+            sync_job = bedrock_agent().start_ingestion_job(
+                knowledgeBaseId=KB_ID,
+                dataSourceId=DATASOURCE_ID
+            )
+            job_id, job_status = sync_job["ingestionJob"]["ingestionJobId"], sync_job["ingestionJob"]["status"]
+    except ClientError as e:
+        # Un job lanzado desde fuera (consola, otra Lambda) sigue en curso: se reintentará más tarde
+        if e.response["Error"]["Code"] in ("ConflictException", "ServiceQuotaExceededException", "ThrottlingException"):
+            release_claim(store, state["active_job"])
+            logger.warning("No se puede iniciar el Sync Job todavía: %s", e)
+            return {"status": "deferred", "files": sorted(claimed)}
+        raise
+
+    logger.info("Started Sync Job: %s (%s ficheros, %s)", job_id, len(claimed), state["active_job"]["mode"])
+
+    def set_job_id(state):
+        state["active_job"]["job_id"] = job_id
+
+    state = update_state(store, set_job_id)
+    store.record_job(job_summary(state["active_job"], job_status, None))
+
+    # Nueva versión de la KB: invalida las respuestas cacheadas por app.py
+    try:
+        set_kb_version(job_id)
+    except Exception as e:
+        logger.error("Error registrando la versión de la Knowledge Base: %s", e)
+
+    return {"status": "started", "job_id": job_id, "files": sorted(claimed)}
+
+def start_documents_job(manifest, files):
+    """Ingiere los documentos nuevos o modificados y borra de la KB los eliminados, en lotes.
+
+    Las APIs por documento no crean un ingestion job: el ID identifica el grupo de documentos en el
+    planificador, que consulta su estado con get_knowledge_base_documents.
+    """
+
+    ingest, removals = pending_removals(manifest, files)
+    for batch in batches(ingest, DOCUMENT_BATCH_SIZE):
+        bedrock_agent().ingest_knowledge_base_documents(
+            knowledgeBaseId=KB_ID,
+            dataSourceId=DATASOURCE_ID,
+            documents=[{"content": {"dataSourceType": "S3", "s3": {"s3Location": {"uri": uri}}}} for uri in batch]
+        )
+    for batch in batches(removals, DOCUMENT_BATCH_SIZE):
+        bedrock_agent().delete_knowledge_base_documents(
+            knowledgeBaseId=KB_ID,
+            dataSourceId=DATASOURCE_ID,
+            documentIdentifiers=[s3_identifier(uri) for uri in batch]
+        )
+    return f"documents-{uuid.uuid4().hex[:16]}", "STARTING"
+
+def documents_status(manifest, files):
+    """Estado de un job por documentos: (IN_PROGRESS | COMPLETE | FAILED, estadísticas, ficheros fallidos)."""
+
+    statuses = {}
+    for batch in batches(sorted(files), DOCUMENT_BATCH_SIZE):
+        response = bedrock_agent().get_knowledge_base_documents(
+            knowledgeBaseId=KB_ID,
+            dataSourceId=DATASOURCE_ID,
+            documentIdentifiers=[s3_identifier(uri) for uri in batch]
+        )
+        for detail in response["documentDetails"]:
+            statuses[detail["identifier"]["s3"]["uri"]] = detail["status"]
+
+    if any(status in DOCUMENT_RUNNING_STATUSES for status in statuses.values()):
+        return "IN_PROGRESS", None, None
+    _, removals = pending_removals(manifest, files)
+    failed = []
+    for uri in files:
+        status = statuses.get(uri, "NOT_FOUND")
+        done = status == "NOT_FOUND" if uri in removals else status in DOCUMENT_INDEXED_STATUSES
+        if not done:
+            failed.append(uri)
+    failed_removals = [uri for uri in failed if uri in removals]
+    statistics = {
+        "numberOfDocumentsIndexed": len(files) - len(removals) - (len(failed) - len(failed_removals)),
+        "numberOfDocumentsDeleted": len(removals) - len(failed_removals),
+        "numberOfDocumentsFailed": len(failed)
+    }
+    return ("FAILED" if failed else "COMPLETE"), statistics, failed
+
+def finish_job(store, manifest, active, status, statistics=None, failed=None):
+    """Registra el resultado de un job terminado y libera el planificador.
+
+    failed son los ficheros que no se han ingerido (todos si el job no ha terminado en COMPLETE y no se
+    indica); vuelven a pendientes salvo los que ya han fallado SYNC_MAX_ATTEMPTS veces, que se descartan
+    con el estado 'failed'. El resto se marca como ingerido en el manifiesto.
+    """
+
+    if failed is None:
+        failed = [] if status == "COMPLETE" else list(active["files"])
+    record_ingested(manifest, [uri for uri in active["files"] if uri not in failed], active["job_id"], active["started_at"])
+    exhausted = record_failed(manifest, failed, active["job_id"], active["started_at"], SYNC_MAX_ATTEMPTS)
+    for uri in exhausted:
+        logger.error("%s ha fallado en %s jobs seguidos: no se reintenta", uri, SYNC_MAX_ATTEMPTS)
+    failed = [uri for uri in failed if uri not in exhausted]
+
+    completed_at = now_ms()
+    summary = job_summary(active, status, completed_at, statistics)
+    if exhausted:
+        summary["dead_letter"] = sorted(exhausted)
+    store.record_job(summary)
+    print(json.dumps({"ingestion_job": summary}))
+
+    def clear(state):
+        if not state["active_job"] or state["active_job"]["job_id"] != active["job_id"]:
+            return False
+        if failed:
+            # Los ficheros que han fallado vuelven a pendientes
+            for key in failed:
+                state["pending"].setdefault(key, active["files"][key])
+            state["first_pending_at"] = state["first_pending_at"] or min(active["files"][key] for key in failed)
+        state["active_job"] = None
+
+    update_state(store, clear)
+
+    # Los documentos del job ya son buscables: invalida también lo cacheado durante la ingesta
+    try:
+        set_kb_version(f"{active['job_id']}:{status}")
+    except Exception as e:
+        logger.error("Error registrando la versión de la Knowledge Base: %s", e)
+
+def release_claim(store, active):
+    def release(state):
+        if state["active_job"] != active:
+            return False
+        for key, at in active["files"].items():
+            state["pending"].setdefault(key, at)
+        state["first_pending_at"] = state["first_pending_at"] or min(active["files"].values(), default=now_ms())
+        state["active_job"] = None
+
+    update_state(store, release)
+
+def batches(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+def s3_identifier(uri):
+    return {"dataSourceType": "S3", "s3": {"uri": uri}}
+
+def bedrock_agent():
+    return awsClients.get_client("bedrock-agent", region_name="eu-central-1")
+
+def s3():
+    return awsClients.get_client("s3", region_name="eu-central-1")
+
+def scheduler():
+    return awsClients.get_client("scheduler", region_name="eu-central-1")
+
+def build_response(status, files=None, job_id=None, unchanged=None):
     return {
         "statusCode": 200,
-        "body": json.dumps({"message": "Sync started", "file": file_key, "job_id": job_id})
-    }
\ No newline at end of file
+        "body": json.dumps({
+            "message": f"Sync {status}",
+            "status": status,
+            "files": files or [],
+            "job_id": job_id,
+            "unchanged": unchanged or []
+        })
+    }
@@ -1,45 +1,248 @@
 import json
-import boto3
+import math
+import os
+import awsClients
 import uuid
 import base64
+import hashlib
+from botocore.config import Config
+from requestMetrics import get_logger
 
-s3 = boto3.client("s3")
+# Config combinada con la de awsClients (keep-alive y pool de conexiones)
+S3_CONFIG = Config(signature_version="s3v4")
+s3 = awsClients.get_client("s3", region_name="eu-central-1", config=S3_CONFIG)
 BUCKET_NAME = "bedrock-rag-prueba"
+UPLOAD_PREFIX = "documents/userUploads/"
+# Marcadores de deduplicación (fuera de documents/ para que no se ingesten en la KB)
+HASH_INDEX_PREFIX = "uploadHashes/"
+logger = get_logger("uploadFile")
+
+# Por encima de este tamaño se usa subida multiparte; cada parte mide UPLOAD_PART_SIZE (mínimo 5 MiB en S3)
+MULTIPART_THRESHOLD = int(os.environ.get("MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+UPLOAD_PART_SIZE = max(int(os.environ.get("UPLOAD_PART_SIZE", str(8 * 1024 * 1024))), 5 * 1024 * 1024)
+UPLOAD_URL_EXPIRATION = int(os.environ.get("UPLOAD_URL_EXPIRATION", "3600"))
+# Tamaño de lectura al calcular el hash de una subida multiparte
+HASH_READ_SIZE = 1024 * 1024
+
+class UploadVerificationError(ValueError):
+    """El contenido subido no coincide con el hash que ha indicado el cliente."""
 
 def lambda_handler(event, context):
-    """Gestiona la carga de archivos desde Streamlit y los guarda en S3."""
+    """Gestiona la carga de archivos desde Streamlit en S3.
+
+    Con "action" emite URLs prefirmadas para que el cliente suba el fichero directamente a S3:
+    - init: deduplica por hash SHA-256 y devuelve una URL PUT o una subida multiparte con una URL por parte.
+    - status: partes ya subidas de una subida multiparte, para reanudarla.
+    - complete / abort: cierra o cancela la subida.
+    Sin "action" mantiene la subida en base64 a través de la Lambda.
+    """
     try:
         if "body" not in event:
-            return {"statusCode": 400, "body": json.dumps({"error": "Missing request body"})}
+            return build_response(400, {"error": "Missing request body"})
 
         body = json.loads(event["body"])
+        action = body.get("action")
+
+        if action == "init":
+            return build_response(200, init_upload(body))
+        if action == "status":
+            return build_response(200, upload_status(body))
+        if action == "complete":
+            return build_response(200, complete_upload(body))
+        if action == "abort":
+            key = upload_key(body)
+            s3.abort_multipart_upload(Bucket=BUCKET_NAME, Key=key, UploadId=body["upload_id"])
+            return build_response(200, {"message": "Upload aborted", "key": key})
+        if action is not None:
+            return build_response(400, {"error": f"Unknown action: {action}"})
+
         file_content = base64.b64decode(body.get("file_content", ""))
-        file_name = body.get("file_name", str(uuid.uuid4()) + ".txt")
+        file_name = os.path.basename(body.get("file_name") or str(uuid.uuid4()) + ".txt")
+        sha256 = hashlib.sha256(file_content).hexdigest()
 
-        # Subir archivo a S3
+        # Mismo contenido ya subido: no se vuelve a escribir (ni a ingerir)
+        existing_key = find_duplicate(sha256)
+        if existing_key is not None:
+            return build_response(200, {"message": "File already uploaded", "status": "duplicate", "key": existing_key, "file_name": file_name})
+
+        # Subir archivo a S3 con el hash que usa el manifiesto de ingesta
+        key = f"{UPLOAD_PREFIX}{file_name}"
         s3.put_object(
             Bucket=BUCKET_NAME,
-            Key=f"documents/userUploads/{file_name}",  
-            Body=file_content
+            Key=key,
+            Body=file_content,
+            Metadata={"sha256": sha256}
         )
+        s3.put_object(Bucket=BUCKET_NAME, Key=f"{HASH_INDEX_PREFIX}{sha256}", Body=key.encode("utf-8"))
 
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "*",
-                "Access-Control-Allow-Headers": "*",
-            },
-            "body": json.dumps({"message": "File uploaded successfully", "file_name": file_name}),
-        }
+        return build_response(200, {"message": "File uploaded successfully", "file_name": file_name})
 
+    except ValueError as e:
+        # JSON o hash no válidos, o contenido que no coincide con el hash
+        logger.warning("Petición de subida rechazada: %s", e)
+        return build_response(400, {"error": str(e)})
     except Exception as e:
+        logger.exception("Error procesando la subida")
+        return build_response(500, {"error": str(e)})
+
+def build_response(status_code, body):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "*",
+            "Access-Control-Allow-Headers": "*",
+        },
+        "body": json.dumps(body),
+    }
+
+def init_upload(body):
+    """Prepara la subida directa a S3 de un fichero o indica que ya existe con el mismo contenido."""
+
+    file_name = os.path.basename(body.get("file_name") or str(uuid.uuid4()) + ".txt")
+    sha256 = parse_sha256(body["sha256"])
+    size = int(body["size"])
+    key = f"{UPLOAD_PREFIX}{file_name}"
+
+    existing_key = find_duplicate(sha256)
+    if existing_key is not None:
+        return {"status": "duplicate", "key": existing_key, "file_name": file_name}
+
+    metadata = {"sha256": sha256}
+    if size <= MULTIPART_THRESHOLD:
+        # Con el checksum firmado, S3 rechaza (BadDigest) un cuerpo que no tenga ese SHA-256
+        checksum = checksum_sha256(sha256)
+        url = s3.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": BUCKET_NAME, "Key": key, "Metadata": metadata, "ChecksumSHA256": checksum},
+            ExpiresIn=UPLOAD_URL_EXPIRATION
+        )
+        # El cliente tiene que enviar las mismas cabeceras que se han firmado
         return {
-            "statusCode": 500,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "*",
-                "Access-Control-Allow-Headers": "*",
-            },
-            "body": json.dumps({"error": str(e)}),
+            "status": "upload",
+            "mode": "single",
+            "key": key,
+            "url": url,
+            "headers": {"x-amz-meta-sha256": sha256, "x-amz-checksum-sha256": checksum}
         }
+
+    upload = s3.create_multipart_upload(Bucket=BUCKET_NAME, Key=key, Metadata=metadata)
+    part_count = math.ceil(size / UPLOAD_PART_SIZE)
+    return {
+        "status": "upload",
+        "mode": "multipart",
+        "key": key,
+        "upload_id": upload["UploadId"],
+        "part_size": UPLOAD_PART_SIZE,
+        "parts": [
+            {"part_number": number, "url": part_url(key, upload["UploadId"], number)}
+            for number in range(1, part_count + 1)
+        ]
+    }
+
+def upload_status(body):
+    """Devuelve las partes ya subidas y URLs nuevas para las que faltan, para reanudar una subida."""
+
+    key, upload_id, part_count = upload_key(body), body["upload_id"], int(body["part_count"])
+    uploaded = {}
+    kwargs = {"Bucket": BUCKET_NAME, "Key": key, "UploadId": upload_id}
+    while True:
+        response = s3.list_parts(**kwargs)
+        for part in response.get("Parts", []):
+            uploaded[part["PartNumber"]] = part["ETag"]
+        if not response.get("IsTruncated"):
+            break
+        kwargs["PartNumberMarker"] = response["NextPartNumberMarker"]
+
+    return {
+        "key": key,
+        "upload_id": upload_id,
+        "uploaded": [{"part_number": number, "etag": etag} for number, etag in sorted(uploaded.items())],
+        "parts": [
+            {"part_number": number, "url": part_url(key, upload_id, number)}
+            for number in range(1, part_count + 1) if number not in uploaded
+        ]
+    }
+
+def complete_upload(body):
+    """Completa la subida multiparte (si la hay), comprueba el hash del contenido y lo registra para deduplicar."""
+
+    key, sha256 = upload_key(body), parse_sha256(body["sha256"])
+    if body.get("upload_id"):
+        s3.complete_multipart_upload(
+            Bucket=BUCKET_NAME,
+            Key=key,
+            UploadId=body["upload_id"],
+            MultipartUpload={"Parts": [
+                {"PartNumber": part["part_number"], "ETag": part["etag"]}
+                for part in sorted(body["parts"], key=lambda part: part["part_number"])
+            ]}
+        )
+
+    verify_sha256(key, sha256)
+    s3.put_object(Bucket=BUCKET_NAME, Key=f"{HASH_INDEX_PREFIX}{sha256}", Body=key.encode("utf-8"))
+    return {"message": "File uploaded successfully", "key": key, "file_name": key[len(UPLOAD_PREFIX):]}
+
+def upload_key(body):
+    """Clave de la petición; solo se aceptan las de las subidas de usuarios (UPLOAD_PREFIX)."""
+
+    key = body["key"]
+    if not isinstance(key, str) or not key.startswith(UPLOAD_PREFIX):
+        raise ValueError(f"Invalid upload key: {key}")
+    return key
+
+def parse_sha256(value):
+    sha256 = str(value).lower()
+    if len(sha256) != 64 or any(char not in "0123456789abcdef" for char in sha256):
+        raise ValueError(f"Invalid sha256: {value}")
+    return sha256
+
+def checksum_sha256(sha256):
+    """Hash en hexadecimal -> valor de x-amz-checksum-sha256 (base64 del digest)."""
+
+    return base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+
+def verify_sha256(key, sha256):
+    """Comprueba que el objeto subido tiene el hash que indica el cliente; si no, lo borra.
+
+    Con PUT simple basta el checksum que S3 ha validado al recibirlo (firmado en la URL). En multiparte el
+    checksum es compuesto por partes, así que el hash se calcula leyendo el objeto.
+    """
+
+    head = s3.head_object(Bucket=BUCKET_NAME, Key=key, ChecksumMode="ENABLED")
+    if head.get("ChecksumSHA256") == checksum_sha256(sha256):
+        actual = sha256
+    else:
+        digest = hashlib.sha256()
+        for chunk in s3.get_object(Bucket=BUCKET_NAME, Key=key)["Body"].iter_chunks(HASH_READ_SIZE):
+            digest.update(chunk)
+        actual = digest.hexdigest()
+
+    if actual != sha256 or head.get("Metadata", {}).get("sha256") != sha256:
+        # Sin borrarlo, se ingeriría con un hash falso en los metadatos
+        s3.delete_object(Bucket=BUCKET_NAME, Key=key)
+        raise UploadVerificationError(f"Uploaded content of {key} does not match sha256 {sha256}")
+
+def find_duplicate(sha256):
+    """Devuelve la clave del objeto ya subido con ese hash, si sigue existiendo."""
+
+    try:
+        marker = s3.get_object(Bucket=BUCKET_NAME, Key=f"{HASH_INDEX_PREFIX}{sha256}")
+        key = marker["Body"].read().decode("utf-8")
+        # El objeto puede haberse sobrescrito después con otro contenido
+        head = s3.head_object(Bucket=BUCKET_NAME, Key=key)
+        return key if head.get("Metadata", {}).get("sha256") == sha256 else None
+    except s3.exceptions.NoSuchKey:
+        return None
+    except s3.exceptions.ClientError as e:
+        # head_object devuelve 404 sin cuerpo cuando el objeto se ha borrado
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+
+def part_url(key, upload_id, part_number):
+    return s3.generate_presigned_url(
+        "upload_part",
+        Params={"Bucket": BUCKET_NAME, "Key": key, "UploadId": upload_id, "PartNumber": part_number},
+        ExpiresIn=UPLOAD_URL_EXPIRATION
+    )
@@ -0,0 +1,60 @@
+"""Construye el índice vectorial local que usa app.py con RETRIEVER=local.
+
+Uso:
+    python scripts/buildLocalIndex.py s3://bucket-name/documents/ [--output lambda/index]
+    python scripts/buildLocalIndex.py ./docs --uri-prefix s3://bucket-name/documents --embedding hash
+
+Con --partitions N se crea un índice IVF de N particiones para corpus grandes
+(se exploran LOCAL_INDEX_NPROBE particiones por consulta).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+
+import localIndex
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="s3://bucket/prefijo o directorio local")
+    parser.add_argument("--output", default=os.path.join(LAMBDA_DIR, "index"))
+    parser.add_argument("--uri-prefix", help="URI S3 equivalente de un directorio local, para las referencias")
+    parser.add_argument("--embedding", default="titan", choices=["titan", "hash"])
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--partitions", type=int, default=0)
+    parser.add_argument("--query", action="append", default=[], help="Consulta de prueba tras construir el índice")
+    args = parser.parse_args()
+
+    if args.source.startswith("s3://"):
+        bucket, _, prefix = args.source[len("s3://"):].partition("/")
+        documents = localIndex.load_s3_documents(bucket, prefix)
+    else:
+        documents = localIndex.load_local_documents(args.source, args.uri_prefix)
+
+    start = time.perf_counter()
+    meta = localIndex.build_local_index(
+        documents, args.output, embedding=args.embedding, chunk_size=args.chunk_size,
+        overlap=args.overlap, partitions=args.partitions
+    )
+    meta["build_seconds"] = round(time.perf_counter() - start, 2)
+
+    start = time.perf_counter()
+    retriever = localIndex.LocalVectorRetriever(args.output)
+    meta["load_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    print(json.dumps(meta, indent=2))
+
+    for query in args.query:
+        start = time.perf_counter()
+        content_list, metadata_list = retriever.retrieve(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"\n{query} ({elapsed:.1f} ms)")
+        for text, metadata in zip(content_list, metadata_list):
+            print(f"- {metadata['source_uri']} (página {metadata['page_number']}): {text[:80]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Mide el arranque en frío de lambda/app.py: tiempo de importación y latencia de la primera petición.
+
+Cada ejecución es un intérprete nuevo (como un contenedor nuevo de Lambda). Los servicios AWS se
+sustituyen por respuestas simuladas (scripts/standIns.py) para que la medida sea repetible; con
+--live se usan los servicios reales con las credenciales y variables de entorno actuales.
+
+Escenarios:
+    guardrail  el guardrail rechaza la consulta
+    simple     consulta SIMPLE respondida con el modelo de Bedrock
+    complex    consulta COMPLEX con recuperación de la Knowledge Base
+
+Para comparar antes y después de un cambio:
+    git worktree add /tmp/before HEAD~1
+    python scripts/coldStartBenchmark.py --lambda-dir /tmp/before/lambda --output before.json
+    python scripts/coldStartBenchmark.py --baseline before.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(SCRIPTS_DIR, "..", "lambda")
+SCENARIOS = {
+    "guardrail": {"guardrail_action": "GUARDRAIL_INTERVENED", "agent_label": "SIMPLE"},
+    "simple": {"guardrail_action": "NONE", "agent_label": "SIMPLE"},
+    "complex": {"guardrail_action": "NONE", "agent_label": "COMPLEX"}
+}
+METRICS = ["boto3_import_ms", "app_import_ms", "first_request_ms", "cold_total_ms", "warm_request_ms"]
+QUERY = "Que es un match en python?"
+
+def run_child(scenario, lambda_dir, live):
+    """Una ejecución en frío: importa app, lanza dos peticiones y devuelve los tiempos."""
+
+    start = time.perf_counter()
+    import boto3
+    boto3_import_ms = (time.perf_counter() - start) * 1000
+
+    if not live:
+        sys.path.insert(0, SCRIPTS_DIR)
+        from standIns import AWSStandIns
+        AWSStandIns(**SCENARIOS[scenario]).install()
+
+    sys.path.insert(0, os.path.abspath(lambda_dir))
+    start = time.perf_counter()
+    import app
+    app_import_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for attempt in range(2):
+        event = {"body": json.dumps({"query": QUERY, "session_id": f"benchmark-{os.getpid()}", "model": "bedrock"})}
+        start = time.perf_counter()
+        response = app.lambda_handler(event, None)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"La petición ha fallado: {response['body']}")
+
+    return {
+        "boto3_import_ms": boto3_import_ms,
+        "app_import_ms": app_import_ms,
+        "first_request_ms": latencies[0],
+        "cold_total_ms": boto3_import_ms + app_import_ms + latencies[0],
+        "warm_request_ms": latencies[1],
+        "openai_loaded": "openai" in sys.modules,
+        # El tiempo de importación depende de la versión de boto3 (la del runtime o la empaquetada)
+        "boto3_version": boto3.__version__
+    }
+
+def run_scenario(scenario, args):
+    env = dict(os.environ)
+    if not args.live:
+        from standIns import FAKE_ENV
+        env.update(FAKE_ENV)
+    command = [sys.executable, os.path.abspath(__file__), "--child", scenario, "--lambda-dir", args.lambda_dir]
+    if args.live:
+        command.append("--live")
+
+    runs = []
+    for _ in range(args.runs):
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Escenario {scenario}: {result.stderr.strip()}")
+        # La Lambda imprime sus propios logs: el resultado es la última línea
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    summary = {
+        metric: {
+            "median": round(statistics.median(run[metric] for run in runs), 1),
+            "min": round(min(run[metric] for run in runs), 1),
+            "max": round(max(run[metric] for run in runs), 1)
+        }
+        for metric in METRICS
+    }
+    summary["openai_loaded"] = any(run["openai_loaded"] for run in runs)
+    summary["boto3_version"] = runs[0]["boto3_version"]
+    return summary
+
+def print_report(results, baseline=None):
+    for scenario, summary in results["scenarios"].items():
+        print(f"\n{scenario} (boto3 {summary['boto3_version']}, openai importado: {'sí' if summary['openai_loaded'] else 'no'})")
+        for metric in METRICS:
+            line = f"  {metric:<18} {summary[metric]['median']:>9.1f} ms  (min {summary[metric]['min']:.1f}, max {summary[metric]['max']:.1f})"
+            previous = (baseline or {}).get("scenarios", {}).get(scenario, {}).get(metric)
+            if previous:
+                line += f"  antes {previous['median']:.1f} ms ({summary[metric]['median'] - previous['median']:+.1f})"
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lambda-dir", default=LAMBDA_DIR)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Por defecto, todos")
+    parser.add_argument("--live", action="store_true", help="Usa los servicios AWS reales")
+    parser.add_argument("--output", help="Guarda los resultados en JSON")
+    parser.add_argument("--baseline", help="Resultados JSON de una ejecución anterior para comparar")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.lambda_dir, args.live)))
+        return
+
+    sys.path.insert(0, SCRIPTS_DIR)
+    results = {
+        "lambda_dir": os.path.abspath(args.lambda_dir),
+        "runs": args.runs,
+        "live": args.live,
+        "scenarios": {scenario: run_scenario(scenario, args) for scenario in (args.scenario or SCENARIOS)}
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
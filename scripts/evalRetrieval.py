@@ -0,0 +1,123 @@
+"""Compara la selección de chunks (lambda/chunkSelection.py) con el top-k fijo sobre un conjunto de evaluación.
+
+El conjunto es un JSONL con una consulta por línea:
+    {"query": "¿Qué es un match en Python?", "expected_sources": ["s3://bucket/documents/python.pdf#12"],
+     "expected_keywords": ["patrón", "case"]}
+expected_sources admite "uri" o "uri#página". Los candidatos salen del backend configurado en RETRIEVER
+(Knowledge Base con las credenciales actuales o índice local con RETRIEVER=local).
+
+Para cada estrategia informa de los tokens del prompt, los chunks usados, el recall de fuentes esperadas y
+el de palabras clave en el contexto. Con --generate también genera la respuesta con cada prompt y mide la
+latencia de generación, los tokens de salida y las palabras clave presentes en la respuesta.
+
+Uso:
+    python scripts/evalRetrieval.py evalset.jsonl [--baseline-k 3] [--generate --model bedrock] [--output r.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+
+import chunkSelection
+import promptBuilder
+from cacheUtils import normalize_query
+
+def load_evalset(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def strategies(baseline_k):
+    """Cada estrategia recibe los candidatos ordenados y devuelve (content_list, metadata_list)."""
+
+    return {
+        f"top_{baseline_k}": lambda content, meta: (content[:baseline_k], meta[:baseline_k]),
+        "selected": lambda content, meta: chunkSelection.select_chunks(content, meta)[:2]
+    }
+
+def source_recall(expected, metadata_list):
+    if not expected:
+        return None
+    found = set()
+    for meta in metadata_list:
+        found.add(meta.get("source_uri"))
+        found.add(f"{meta.get('source_uri')}#{meta.get('page_number')}")
+    return sum(source in found for source in expected) / len(expected)
+
+def keyword_recall(expected, text):
+    if not expected:
+        return None
+    text = normalize_query(text)
+    return sum(normalize_query(keyword) in text for keyword in expected) / len(expected)
+
+def evaluate(evalset, retriever, baseline_k, generate=None):
+    results = {name: [] for name in strategies(baseline_k)}
+    for sample in evalset:
+        content_list, metadata_list = retriever.retrieve(sample["query"])
+        for name, strategy in strategies(baseline_k).items():
+            content, meta = strategy(content_list, metadata_list)
+            prompt = promptBuilder.build_prompt(sample["query"], [], content)
+            row = {
+                "query": sample["query"],
+                "prompt_tokens": prompt["tokens"]["total"],
+                "context_tokens": prompt["tokens"]["context"],
+                "chunks": len(content),
+                "source_recall": source_recall(sample.get("expected_sources"), meta),
+                "context_keyword_recall": keyword_recall(sample.get("expected_keywords"), " ".join(content))
+            }
+            if generate is not None:
+                usage = {}
+                start = time.perf_counter()
+                answer = generate(prompt, usage)
+                row["generate_ms"] = (time.perf_counter() - start) * 1000
+                row["output_tokens"] = usage.get("output_tokens")
+                row["answer_keyword_recall"] = keyword_recall(sample.get("expected_keywords"), answer)
+            results[name].append(row)
+    return results
+
+def summarize(rows):
+    summary = {}
+    for metric in ("prompt_tokens", "context_tokens", "chunks", "source_recall", "context_keyword_recall",
+                   "generate_ms", "output_tokens", "answer_keyword_recall"):
+        values = [row[metric] for row in rows if row.get(metric) is not None]
+        if values:
+            summary[metric] = round(statistics.mean(values), 3)
+    generate_ms = sorted(row["generate_ms"] for row in rows if "generate_ms" in row)
+    if generate_ms:
+        summary["generate_p95_ms"] = round(generate_ms[min(int(len(generate_ms) * 0.95), len(generate_ms) - 1)], 1)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("evalset")
+    parser.add_argument("--baseline-k", type=int, default=3, help="k del top-k fijo con el que se compara")
+    parser.add_argument("--generate", action="store_true", help="Genera las respuestas con cada prompt")
+    parser.add_argument("--model", default="bedrock", choices=["bedrock", "openai"])
+    parser.add_argument("--output", help="Guarda el resumen y las filas en JSON")
+    args = parser.parse_args()
+
+    import app
+    retriever = app.get_retriever()
+    generate = None
+    if args.generate:
+        generate = lambda prompt, usage: app.generate_response(args.model, prompt, usage)
+
+    evalset = load_evalset(args.evalset)
+    results = evaluate(evalset, retriever, args.baseline_k, generate)
+    summary = {name: summarize(rows) for name, rows in results.items()}
+
+    for name, metrics in summary.items():
+        print(f"\n{name} ({len(evalset)} consultas)")
+        for metric, value in metrics.items():
+            print(f"  {metric:<24} {value}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "rows": results}, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
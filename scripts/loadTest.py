@@ -0,0 +1,348 @@
+"""Prueba de carga offline de las Lambdas con servicios simulados (scripts/standIns.py).
+
+Lanza app.lambda_handler, uploadFile.lambda_handler y syncKnowledgeBase.lambda_handler en un pool de
+hilos para cada nivel de concurrencia. Los tiempos de Bedrock, del agente, de la Knowledge Base, de
+DynamoDB, de S3 y de OpenAI siguen la distribución de latencias del perfil. Informa de p50/p95/p99 y
+peticiones por segundo, en total y por etapa (las etapas del chat salen del registro de métricas de
+cada petición; las de la subida son sus acciones).
+
+Uso:
+    python scripts/loadTest.py --handler chat --concurrency 1 8 32 --requests 200 --latency-scale 0.1
+    python scripts/loadTest.py --mix SIMPLE=0.5 COMPLEX=0.4 NULL=0.1 --throttle-rate 0.02 --output resultados.json
+    python scripts/loadTest.py --baseline resultados_anteriores.json --tolerance 0.1
+    ADMISSION_ENABLED=true ADMISSION_SERVICE_LIMITS='{"bedrock": {"rate": 8}}' \
+        python scripts/loadTest.py --handler chat --quota bedrock-runtime.InvokeModel=10
+
+Con --baseline se comparan p95 y peticiones por segundo con una ejecución anterior, y el script
+termina con código 1 si alguna empeora más que --tolerance.
+"""
+import argparse
+import base64
+import contextlib
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(SCRIPTS_DIR, "..", "lambda")
+sys.path.insert(0, SCRIPTS_DIR)
+
+from standIns import FAKE_ENV, DEFAULT_PROFILE, AWSStandIns, LatencyModel, OpenAIStandIn
+
+HANDLERS = ["chat", "upload", "sync"]
+PERCENTILES = [50, 95, 99]
+TOPICS = ["un match en python", "una closure en JavaScript", "el borrow checker de Rust", "una goroutine", "un índice en SQL"]
+UPLOAD_ACTIONS = {"init_single": 0.35, "init_multipart": 0.15, "status": 0.1, "complete": 0.3, "legacy": 0.1}
+
+_current = threading.local()
+
+def prepare_environment(args):
+    """Configura las variables que leen los módulos de lambda/ al importarse y devuelve los módulos."""
+
+    for key, value in FAKE_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["METRICS_SAMPLE_RATE"] = "1.0"
+    os.environ.setdefault("LOG_LEVEL", "DEBUG" if args.verbose else "CRITICAL")
+    # Sin ventana de agrupación: cada invocación de la sincronización lanza o aplaza el job en el momento
+    os.environ.setdefault("SYNC_DEBOUNCE_SECONDS", "0")
+
+    profile = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = {**DEFAULT_PROFILE, **json.load(f)}
+    for operation, rate in args.quota.items():
+        profile = {**profile, operation: {**profile.get(operation, {}), "quota_rps": rate}}
+    latency = LatencyModel(profile, args.latency_scale, args.error_rate, args.throttle_rate, args.seed)
+    stand_ins = AWSStandIns(ingestion_status=args.ingestion_status, latency=latency).install()
+
+    sys.path.insert(0, os.path.abspath(args.lambda_dir))
+    import app
+    import requestMetrics
+    import syncKnowledgeBase
+    import uploadFile
+
+    app._openai = OpenAIStandIn(latency)
+    requestMetrics.listeners.append(lambda record: _current.records.append(record))
+    modules = {"app": app, "uploadFile": uploadFile, "syncKnowledgeBase": syncKnowledgeBase, "standIns": stand_ins}
+    return modules, stand_ins
+
+def chat_request(modules, rng, args, index):
+    label = weighted_choice(rng, args.mix)
+    body = {
+        "query": f"¿Qué es {rng.choice(TOPICS)}? #label={label}",
+        "session_id": f"loadtest-{rng.randrange(args.sessions)}",
+        "model": "openai" if rng.random() < args.openai_ratio else "bedrock",
+        "stream": rng.random() < args.stream_ratio
+    }
+    response = modules["app"].lambda_handler({"body": json.dumps(body)}, None)
+    return response["statusCode"], label
+
+def upload_request(modules, rng, args, index):
+    action = weighted_choice(rng, UPLOAD_ACTIONS)
+    file_name = f"loadtest-{index}.pdf"
+    sha256 = f"{index:064x}"
+    if action == "init_single":
+        body = {"action": "init", "file_name": file_name, "sha256": sha256, "size": 2 * 1024 * 1024}
+    elif action == "init_multipart":
+        body = {"action": "init", "file_name": file_name, "sha256": sha256, "size": 64 * 1024 * 1024}
+    elif action == "status":
+        body = {"action": "status", "key": f"documents/userUploads/{file_name}", "upload_id": "STANDINUPLOAD", "part_count": 8}
+    elif action == "complete":
+        # PUT simple ya subido por el cliente con el checksum firmado
+        modules["standIns"].upload_object(f"documents/userUploads/{file_name}", sha256)
+        body = {"action": "complete", "key": f"documents/userUploads/{file_name}", "sha256": sha256}
+    else:
+        body = {"file_name": file_name, "file_content": base64.b64encode(b"%PDF-1.4 loadtest").decode("ascii")}
+    response = modules["uploadFile"].lambda_handler({"body": json.dumps(body)}, None)
+    return response["statusCode"], action
+
+def sync_request(modules, rng, args, index):
+    # Claves nuevas en cada petición: una clave ya ingerida con el mismo ETag se omite (manifiesto de ingesta)
+    run_id = uuid.uuid4().hex[:8]
+    records = [
+        {"s3": {"bucket": {"name": "bedrock-rag-prueba"}, "object": {"key": f"documents/userUploads/loadtest-{run_id}-{index}-{n}.pdf"}}}
+        for n in range(rng.randint(1, 3))
+    ]
+    response = modules["syncKnowledgeBase"].lambda_handler({"Records": records}, None)
+    return response["statusCode"], json.loads(response["body"])["status"]
+
+REQUESTS = {"chat": chat_request, "upload": upload_request, "sync": sync_request}
+
+def run_one(request, modules, args, index):
+    """Ejecuta una petición y devuelve su latencia, estado, etiqueta y las etapas de su registro de métricas."""
+
+    rng = random.Random(f"{args.seed}-{index}")
+    _current.records = []
+    start = time.perf_counter()
+    try:
+        status, label = request(modules, rng, args, index)
+    except Exception as e:
+        status, label = f"exception:{type(e).__name__}", None
+    latency_ms = (time.perf_counter() - start) * 1000
+    stages = {}
+    routing = None
+    speculation = None
+    for record in _current.records:
+        stages.update({key[:-3]: value for key, value in record.items() if key.endswith("_ms") and key != "total_ms"})
+        routing = record.get("routing", routing)
+        speculation = record.get("speculation", speculation)
+    return {"latency_ms": latency_ms, "status": status, "label": label, "stages": stages, "routing": routing,
+            "speculation": speculation}
+
+def run_level(handler, concurrency, modules, stand_ins, args):
+    request = REQUESTS[handler]
+    # Calentamiento: los clientes se crean y el contenedor queda "caliente" antes de medir
+    for index in range(args.warmup):
+        run_one(request, modules, args, -1 - index)
+
+    calls_before = dict(stand_ins.calls)
+    failures_before = dict(stand_ins.failures)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda index: run_one(request, modules, args, index), range(args.requests)))
+    wall_s = time.perf_counter() - start
+
+    return summarize(results, wall_s, concurrency, diff_counts(stand_ins.calls, calls_before), diff_counts(stand_ins.failures, failures_before))
+
+def summarize(results, wall_s, concurrency, calls, failures):
+    statuses = {}
+    labels = {}
+    stage_values = {}
+    routing = {"providers": {}, "hedged": 0, "fallback": 0, "retries": 0}
+    speculation = {"outcomes": {}, "saved_ms": 0.0, "wasted_tokens": 0}
+    for result in results:
+        if result["speculation"]:
+            outcome = result["speculation"]["outcome"]
+            speculation["outcomes"][outcome] = speculation["outcomes"].get(outcome, 0) + 1
+            speculation["saved_ms"] = round(speculation["saved_ms"] + result["speculation"].get("saved_ms", 0), 1)
+            speculation["wasted_tokens"] += (result["speculation"].get("wasted_input_tokens", 0)
+                                             + result["speculation"].get("wasted_output_tokens", 0))
+        if result["routing"]:
+            provider = str(result["routing"]["provider"])
+            routing["providers"][provider] = routing["providers"].get(provider, 0) + 1
+            routing["hedged"] += int(result["routing"]["hedged"])
+            routing["fallback"] += int(result["routing"]["fallback"])
+            routing["retries"] += sum(attempt.get("retries", 0) for attempt in result["routing"]["attempts"])
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+        if result["label"] is not None:
+            labels[result["label"]] = labels.get(result["label"], 0) + 1
+        for stage, value in result["stages"].items():
+            stage_values.setdefault(stage, []).append(value)
+        # En la subida y la sincronización la etapa es la acción / el resultado de la invocación
+        if not result["stages"] and result["label"] is not None:
+            stage_values.setdefault(result["label"], []).append(result["latency_ms"])
+
+    ok = [result for result in results if result["status"] == 200]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "wall_s": round(wall_s, 3),
+        "rps": round(len(results) / wall_s, 2),
+        # Peticiones respondidas con éxito por segundo (sin los 429 ni los errores)
+        "goodput_rps": round(len(ok) / wall_s, 2),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "statuses": statuses,
+        "labels": labels,
+        "latency_ms": distribution([result["latency_ms"] for result in results]),
+        "stages": {
+            stage: {**distribution(values), "count": len(values), "rps": round(len(values) / wall_s, 2)}
+            for stage, values in sorted(stage_values.items())
+        },
+        "model_routing": routing,
+        # Generación especulativa de las SIMPLE: latencia ahorrada frente a tokens gastados en balde
+        "speculation": speculation,
+        "service_calls": calls,
+        "service_failures": failures
+    }
+
+def distribution(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    summary = {f"p{p}": round(percentile(values, p), 1) for p in PERCENTILES}
+    summary["mean"] = round(sum(values) / len(values), 1)
+    summary["max"] = round(values[-1], 1)
+    return summary
+
+def percentile(sorted_values, p):
+    """Percentil por rango más cercano."""
+
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+def weighted_choice(rng, weights):
+    roll = rng.random() * sum(weights.values())
+    for name, weight in weights.items():
+        roll -= weight
+        if roll < 0:
+            return name
+    return name
+
+def diff_counts(after, before):
+    return {key: value - before.get(key, 0) for key, value in after.items() if value - before.get(key, 0)}
+
+def compare(results, baseline, tolerance):
+    """Compara p95 y peticiones por segundo con la ejecución anterior. Devuelve las regresiones."""
+
+    regressions = []
+    for handler, levels in results["handlers"].items():
+        for level, summary in levels.items():
+            previous = baseline.get("handlers", {}).get(handler, {}).get(level)
+            if not previous:
+                continue
+            p95, previous_p95 = summary["latency_ms"].get("p95"), previous["latency_ms"].get("p95")
+            if p95 and previous_p95 and p95 > previous_p95 * (1 + tolerance):
+                regressions.append(f"{handler} c={level}: p95 {previous_p95} -> {p95} ms")
+            if summary["rps"] < previous["rps"] * (1 - tolerance):
+                regressions.append(f"{handler} c={level}: {previous['rps']} -> {summary['rps']} req/s")
+    return regressions
+
+def print_report(results):
+    for handler, levels in results["handlers"].items():
+        for level, summary in levels.items():
+            latency = summary["latency_ms"]
+            print(f"\n{handler} concurrencia={level}: {summary['rps']} req/s, errores {summary['error_rate']:.1%}, "
+                  f"p50 {latency['p50']} / p95 {latency['p95']} / p99 {latency['p99']} ms")
+            for stage, values in summary["stages"].items():
+                print(f"  {stage:<20} p50 {values['p50']:>9.1f}  p95 {values['p95']:>9.1f}  p99 {values['p99']:>9.1f} ms  "
+                      f"({values['count']} · {values['rps']} /s)")
+            if summary["model_routing"]["providers"]:
+                print(f"  router de modelos: {summary['model_routing']}")
+            if summary["speculation"]["outcomes"]:
+                print(f"  especulación: {summary['speculation']}")
+            if summary["error_rate"]:
+                print(f"  estados: {summary['statuses']} · {summary['goodput_rps']} req/s con éxito")
+            if summary["service_failures"]:
+                print(f"  fallos simulados: {summary['service_failures']}")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_quota(values):
+    """Cuotas simuladas "servicio.Operacion=peticiones por segundo"."""
+
+    quota = {}
+    for value in values:
+        operation, _, rate = value.partition("=")
+        quota[operation] = float(rate)
+    return quota
+
+def parse_mix(values):
+    mix = {}
+    for value in values:
+        label, _, weight = value.partition("=")
+        mix[label.upper()] = float(weight)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handler", action="append", choices=HANDLERS, help="Por defecto, todos")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por nivel de concurrencia")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--mix", nargs="+", default=["SIMPLE=0.5", "COMPLEX=0.4", "NULL=0.1"])
+    parser.add_argument("--stream-ratio", type=float, default=0.0, help="Fracción de peticiones de chat en streaming")
+    parser.add_argument("--openai-ratio", type=float, default=0.0, help="Fracción de peticiones de chat con OpenAI")
+    parser.add_argument("--sessions", type=int, default=50, help="Número de sesiones distintas del chat")
+    parser.add_argument("--profile", help="JSON con latencias por operación (ver standIns.DEFAULT_PROFILE)")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--quota", nargs="+", default=[],
+                        help="Cuotas simuladas servicio.Operacion=req/s (p.ej. bedrock-runtime.InvokeModel=10)")
+    parser.add_argument("--ingestion-status", default="COMPLETE", help="Estado que devuelve GetIngestionJob")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--lambda-dir", default=LAMBDA_DIR)
+    parser.add_argument("--output", help="Guarda los resultados en JSON")
+    parser.add_argument("--baseline", help="Resultados JSON de una ejecución anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--verbose", action="store_true", help="Muestra los logs de las Lambdas")
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix)
+    args.quota = parse_quota(args.quota)
+
+    modules, stand_ins = prepare_environment(args)
+    handlers = args.handler or HANDLERS
+    results = {
+        "commit": git_commit(),
+        "timestamp": int(time.time()),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "verbose")},
+        "handlers": {}
+    }
+
+    # Las Lambdas escriben sus registros en stdout; durante la carga solo interesa el resumen
+    with open(os.devnull, "w") as devnull:
+        for handler in handlers:
+            results["handlers"][handler] = {}
+            for concurrency in args.concurrency:
+                with contextlib.redirect_stdout(devnull):
+                    summary = run_level(handler, concurrency, modules, stand_ins, args)
+                results["handlers"][handler][str(concurrency)] = summary
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print("\nSin regresiones respecto a la ejecución anterior" if not regressions else "\nRegresiones:")
+        for regression in regressions:
+            print(f"  {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
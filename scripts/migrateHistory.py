@@ -0,0 +1,56 @@
+"""Migra el historial de conversaciones al registro único por sesión (lambda/historyStore.py).
+
+La Lambda ya migra cada sesión la primera vez que la lee; este script lo hace por adelantado para
+toda la tabla y, con --delete-legacy, borra después los ítems antiguos (uno por turno).
+
+Uso:
+    python scripts/migrateHistory.py [--table memory-chatbot-python-rag] [--delete-legacy] [--dry-run]
+"""
+import argparse
+import os
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+
+import boto3
+import historyStore
+
+def legacy_sessions(table):
+    """Devuelve {session_id: [timestamps]} de los ítems antiguos de la tabla."""
+
+    sessions = {}
+    kwargs = {"ProjectionExpression": "session_id, #ts", "ExpressionAttributeNames": {"#ts": "timestamp"}}
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get("Items", []):
+            if int(item["timestamp"]) != historyStore.ROLLING_TIMESTAMP:
+                sessions.setdefault(item["session_id"], []).append(item["timestamp"])
+        if "LastEvaluatedKey" not in response:
+            return sessions
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", default="memory-chatbot-python-rag")
+    parser.add_argument("--delete-legacy", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    table = boto3.resource("dynamodb", endpoint_url=os.environ.get("DYNAMODB_ENDPOINT_URL")).Table(args.table)
+    sessions = legacy_sessions(table)
+    print(f"Sesiones con turnos antiguos: {len(sessions)}")
+
+    for session_id, timestamps in sessions.items():
+        if args.dry_run:
+            print(f"{session_id}: {len(timestamps)} turnos")
+            continue
+        record = historyStore.read_record(table, session_id)
+        print(f"{session_id}: registro con {len(record['turns'])} turnos (seq {record['seq']})")
+        if args.delete_legacy:
+            with table.batch_writer() as batch:
+                for timestamp in timestamps:
+                    batch.delete_item(Key={"session_id": session_id, "timestamp": timestamp})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Servicios simulados para medir las Lambdas sin red ni credenciales.
+
+AWSStandIns se engancha al evento 'before-send' de botocore: los clientes se crean, serializan las
+peticiones, reintentan y parsean las respuestas igual que en producción, pero la llamada HTTP no
+llega a salir. Cada operación puede tener una distribución de latencia y tasas de error y de
+throttling. OpenAIStandIn sustituye al módulo openai (ChatCompletion.create).
+"""
+import base64
+import io
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import urllib.parse
+import zlib
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+FAKE_ENV = {
+    "AWS_ACCESS_KEY_ID": "standin",
+    "AWS_SECRET_ACCESS_KEY": "standin",
+    "AWS_DEFAULT_REGION": "eu-central-1",
+    "GUARDRAIL_ID": "standin-guardrail",
+    "AGENT_ID": "standin-agent",
+    "AGENT_ALIAS_ID": "standin-alias",
+    "KB_ID": "standin-kb",
+    "DATASOURCE_ID": "standin-datasource",
+    "MODEL_ID": "anthropic.claude-3-haiku-20240307-v1:0",
+    "OPENAI_API_KEY": "standin"
+}
+
+SAMPLE_ANSWER = "Un match en Python compara un valor con varios patrones y ejecuta el primero que encaja."
+SAMPLE_CHUNK = "La sentencia match, introducida en Python 3.10, permite el pattern matching estructural."
+SAMPLE_URI = "s3://bedrock-rag-prueba/documents/python.pdf"
+# Una consulta puede fijar la etiqueta que devuelve el agente clasificador con esta marca
+LABEL_MARKER = re.compile(r"#label=(\w+)")
+
+# Latencias aproximadas de los servicios reales en milisegundos (mediana y dispersión log-normal)
+DEFAULT_PROFILE = {
+    "bedrock-runtime.ApplyGuardrail": {"distribution": "lognormal", "median_ms": 180, "sigma": 0.3},
+    "bedrock-runtime.InvokeModel": {"distribution": "lognormal", "median_ms": 1800, "sigma": 0.4},
+    "bedrock-runtime.InvokeModelWithResponseStream": {"distribution": "lognormal", "median_ms": 450, "sigma": 0.4},
+    "bedrock-agent-runtime.InvokeAgent": {"distribution": "lognormal", "median_ms": 1100, "sigma": 0.4},
+    "bedrock-agent-runtime.Retrieve": {"distribution": "lognormal", "median_ms": 350, "sigma": 0.35},
+    "bedrock-agent": {"distribution": "lognormal", "median_ms": 150, "sigma": 0.3},
+    "dynamodb": {"distribution": "lognormal", "median_ms": 8, "sigma": 0.5},
+    "s3": {"distribution": "lognormal", "median_ms": 25, "sigma": 0.5},
+    "openai": {"distribution": "lognormal", "median_ms": 1500, "sigma": 0.45}
+}
+
+# Estado de los documentos (GetKnowledgeBaseDocuments) equivalente al de los ingestion jobs
+DOCUMENT_STATUSES = {"COMPLETE": "INDEXED", "FAILED": "FAILED", "STARTING": "STARTING", "IN_PROGRESS": "IN_PROGRESS"}
+
+# Protocolo de cada servicio, para dar el formato correcto a los errores simulados
+PROTOCOLS = {"dynamodb": "json", "s3": "rest-xml"}
+
+class LatencyModel:
+    """Latencias y fallos por operación.
+
+    profile: {"servicio.Operacion" | "servicio" | "*": {"distribution": "fixed" | "uniform" | "lognormal",
+    "median_ms", "sigma", "min_ms", "max_ms", "error_rate", "throttle_rate", "quota_rps", "quota_burst"}};
+    la clave más específica gana. Con quota_rps cada operación tiene una cuota (token bucket de ráfaga
+    quota_burst, por defecto quota_rps) y las llamadas que la superan se rechazan al momento con throttling.
+    scale multiplica todas las latencias (p.ej. 0.01 para ejecuciones rápidas).
+    """
+
+    def __init__(self, profile=None, scale=1.0, error_rate=0.0, throttle_rate=0.0, seed=None):
+        self.profile = dict(DEFAULT_PROFILE if profile is None else profile)
+        self.scale = scale
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.quotas = {}
+
+    def settings(self, service, operation):
+        for key in (f"{service}.{operation}", service, "*"):
+            if key in self.profile:
+                return self.profile[key]
+        return {"distribution": "fixed", "median_ms": 0}
+
+    def sample_ms(self, settings):
+        with self.lock:
+            distribution = settings.get("distribution", "fixed")
+            if distribution == "uniform":
+                value = self.random.uniform(settings["min_ms"], settings["max_ms"])
+            elif distribution == "lognormal":
+                value = self.random.lognormvariate(math.log(settings["median_ms"]), settings.get("sigma", 0.3))
+            else:
+                value = settings.get("median_ms", 0)
+        return value * self.scale
+
+    def outcome(self, settings):
+        """Devuelve 'throttle', 'error' u 'ok'."""
+
+        with self.lock:
+            roll = self.random.random()
+        throttle_rate = settings.get("throttle_rate", self.throttle_rate)
+        error_rate = settings.get("error_rate", self.error_rate)
+        if roll < throttle_rate:
+            return "throttle"
+        if roll < throttle_rate + error_rate:
+            return "error"
+        return "ok"
+
+    def wait(self, service, operation):
+        """Espera la latencia simulada y devuelve el resultado de la llamada."""
+
+        settings = self.settings(service, operation)
+        if not self.take_quota(f"{service}.{operation}", settings):
+            return "throttle"
+        time.sleep(self.sample_ms(settings) / 1000)
+        return self.outcome(settings)
+
+    def take_quota(self, key, settings):
+        """Consume un token de la cuota simulada de la operación; False si está agotada."""
+
+        rate = settings.get("quota_rps")
+        if rate is None:
+            return True
+        burst = settings.get("quota_burst", rate)
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.quotas.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            self.quotas[key] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+class RawBody:
+    """Cuerpo HTTP mínimo con la interfaz que usa botocore (read, stream y close)."""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._data.read(amt)
+
+    def stream(self, amt=1024, decode_content=None):
+        while True:
+            chunk = self._data.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self._data.close()
+
+class AWSStandIns:
+    """Responde a cada operación con un cuerpo fijo tras la latencia simulada.
+
+    guardrail_action: 'NONE' o 'GUARDRAIL_INTERVENED'; agent_label: la etiqueta que devuelve el agente
+    clasificador si la consulta no lleva la marca #label=...; ingestion_status: estado de GetIngestionJob
+    (y de GetKnowledgeBaseDocuments, salvo los documentos borrados, que pasan a NOT_FOUND).
+    """
+
+    def __init__(self, guardrail_action="NONE", agent_label="SIMPLE", ingestion_status="COMPLETE", latency=None):
+        self.guardrail_action = guardrail_action
+        self.agent_label = agent_label
+        self.ingestion_status = ingestion_status
+        self.latency = latency or LatencyModel(profile={})
+        self.calls = {}
+        self.failures = {}
+        self.deleted_documents = set()
+        # Objetos subidos directamente a S3 por el cliente: clave -> (sha256 de los metadatos, checksum SHA-256)
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    def upload_object(self, key, sha256):
+        """Simula la subida del cliente con la URL prefirmada (metadatos y checksum que ha validado S3)."""
+
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+        with self.lock:
+            self.uploads[key] = (sha256, checksum)
+
+    def install(self, session=None):
+        """Registra las respuestas en la sesión (por defecto, la de boto3.client/boto3.resource).
+
+        Solo afecta a los clientes que se creen después de llamar a este método.
+        """
+
+        if session is None:
+            boto3.setup_default_session()
+            session = boto3.DEFAULT_SESSION
+        session.events.register("before-send", self.before_send)
+        return self
+
+    def before_send(self, request, event_name, **kwargs):
+        _, service, operation = event_name.split(".", 2)
+        key = f"{service}.{operation}"
+        with self.lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+        outcome = self.latency.wait(service, operation)
+        if outcome != "ok":
+            with self.lock:
+                self.failures[key] = self.failures.get(key, 0) + 1
+            status, headers, body = error_response(service, outcome)
+        else:
+            status, headers, body = self.respond(operation, request)
+        return AWSResponse(request.url, status, headers, RawBody(body))
+
+    def respond(self, operation, request):
+        """Devuelve (status, cabeceras, cuerpo) de la operación."""
+
+        if operation == "ApplyGuardrail":
+            return json_response({"action": self.guardrail_action, "outputs": [], "assessments": []})
+        if operation == "InvokeAgent":
+            label = self.agent_label
+            marker = LABEL_MARKER.search((request.body or b"").decode("utf-8"))
+            if marker:
+                label = marker.group(1)
+            payload = json.dumps({"bytes": base64.b64encode(label.encode("utf-8")).decode("ascii")})
+            return event_stream_response([event_message("chunk", payload.encode("utf-8"))])
+        if operation == "Retrieve":
+            return json_response({"retrievalResults": [{
+                "content": {"text": SAMPLE_CHUNK},
+                "location": {"type": "S3", "s3Location": {"uri": SAMPLE_URI}},
+                "metadata": {"x-amz-bedrock-kb-source-uri": SAMPLE_URI, "x-amz-bedrock-kb-document-page-number": 1.0},
+                "score": 0.62
+            }]})
+        if operation == "InvokeModel":
+            if b"inputText" in (request.body or b""):
+                # Modelo de embeddings (answerCache, índice local)
+                return json_response({"embedding": [0.0625] * 256, "inputTextTokenCount": 8})
+            return json_response({
+                "content": [{"type": "text", "text": SAMPLE_ANSWER}],
+                "usage": {"input_tokens": 400, "output_tokens": 40}
+            })
+        if operation == "InvokeModelWithResponseStream":
+            events = [{"type": "message_start", "message": {"usage": {"input_tokens": 400, "output_tokens": 1}}}]
+            events += [{"type": "content_block_delta", "delta": {"type": "text_delta", "text": word + " "}}
+                       for word in SAMPLE_ANSWER.split()]
+            events.append({"type": "message_delta", "usage": {"output_tokens": 40}})
+            return event_stream_response([
+                event_message("chunk", json.dumps({
+                    "bytes": base64.b64encode(json.dumps(event).encode("utf-8")).decode("ascii")
+                }).encode("utf-8"))
+                for event in events
+            ])
+        if operation in ("StartIngestionJob", "GetIngestionJob"):
+            status = "STARTING" if operation == "StartIngestionJob" else self.ingestion_status
+            return json_response({"ingestionJob": {
+                "ingestionJobId": "STANDINJOB" if operation == "GetIngestionJob" else f"JOB{random.randrange(10 ** 8):08d}",
+                "knowledgeBaseId": FAKE_ENV["KB_ID"],
+                "dataSourceId": FAKE_ENV["DATASOURCE_ID"],
+                "status": status,
+                "statistics": {"numberOfDocumentsScanned": 1, "numberOfNewDocumentsIndexed": 1}
+            }})
+        if operation in ("IngestKnowledgeBaseDocuments", "DeleteKnowledgeBaseDocuments", "GetKnowledgeBaseDocuments"):
+            body = json.loads(request.body or b"{}")
+            uris = [document["content"]["s3"]["s3Location"]["uri"] for document in body.get("documents", [])]
+            uris += [identifier["s3"]["uri"] for identifier in body.get("documentIdentifiers", [])]
+            with self.lock:
+                if operation == "IngestKnowledgeBaseDocuments":
+                    self.deleted_documents.difference_update(uris)
+                elif operation == "DeleteKnowledgeBaseDocuments":
+                    self.deleted_documents.update(uris)
+                deleted = set(self.deleted_documents)
+            if operation == "GetKnowledgeBaseDocuments":
+                status = DOCUMENT_STATUSES.get(self.ingestion_status, self.ingestion_status)
+            else:
+                status = "STARTING" if operation == "IngestKnowledgeBaseDocuments" else "DELETING"
+            return json_response({"documentDetails": [{
+                "knowledgeBaseId": FAKE_ENV["KB_ID"],
+                "dataSourceId": FAKE_ENV["DATASOURCE_ID"],
+                "status": "NOT_FOUND" if operation == "GetKnowledgeBaseDocuments" and uri in deleted else status,
+                "identifier": {"dataSourceType": "S3", "s3": {"uri": uri}},
+                "updatedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            } for uri in uris]})
+        if operation == "Query":
+            return json_response({"Items": [], "Count": 0, "ScannedCount": 0}, "application/x-amz-json-1.0")
+        if operation in ("GetItem", "PutItem", "UpdateItem", "DeleteItem"):
+            return json_response({}, "application/x-amz-json-1.0")
+        if operation == "GetObject":
+            # Sin marcadores de deduplicación: todas las subidas son nuevas
+            return xml_response(404, "<Error><Code>NoSuchKey</Code><Message>The specified key does not exist.</Message></Error>")
+        if operation == "HeadObject":
+            path = urllib.parse.unquote(urllib.parse.urlsplit(request.url).path).lstrip("/")
+            with self.lock:
+                upload = self.uploads.get(path) or self.uploads.get(path.partition("/")[2])
+            if upload is not None:
+                return 200, {"etag": '"standin"', "content-length": "0", "x-amz-meta-sha256": upload[0],
+                             "x-amz-checksum-sha256": upload[1]}, b""
+        if operation in ("PutObject", "HeadObject"):
+            return 200, {"etag": '"standin"', "content-length": "0"}, b""
+        if operation == "CreateMultipartUpload":
+            return xml_response(200, "<InitiateMultipartUploadResult><Bucket>standin</Bucket><Key>standin</Key>"
+                                     "<UploadId>STANDINUPLOAD</UploadId></InitiateMultipartUploadResult>")
+        if operation == "ListParts":
+            return xml_response(200, "<ListPartsResult><IsTruncated>false</IsTruncated></ListPartsResult>")
+        if operation == "CompleteMultipartUpload":
+            return xml_response(200, "<CompleteMultipartUploadResult><Bucket>standin</Bucket><Key>standin</Key>"
+                                     "<ETag>\"standin\"</ETag></CompleteMultipartUploadResult>")
+        if operation == "AbortMultipartUpload":
+            return 204, {"content-length": "0"}, b""
+        return json_response({})
+
+class AttrDict(dict):
+    """Diccionario con acceso por atributo, como los OpenAIObject del SDK 0.28."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+class OpenAIStandIn:
+    """Sustituto del módulo openai con ChatCompletion.create (modo completo y streaming)."""
+
+    # Mismos nombres que las excepciones de openai.error, que es lo que distingue el router de modelos
+    class RateLimitError(Exception):
+        pass
+
+    class APIError(Exception):
+        pass
+
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyModel(profile={})
+        self.api_key = None
+        self.calls = 0
+        self.ChatCompletion = self
+
+    def create(self, stream=False, **kwargs):
+        self.calls += 1
+        outcome = self.latency.wait("openai", "ChatCompletion")
+        if outcome == "throttle":
+            raise OpenAIStandIn.RateLimitError("Rate limit reached (simulado)")
+        if outcome == "error":
+            raise OpenAIStandIn.APIError("The server had an error (simulado)")
+        if stream:
+            return (
+                AttrDict(choices=[AttrDict(delta=AttrDict(content=word + " "))])
+                for word in SAMPLE_ANSWER.split()
+            )
+        return AttrDict(
+            choices=[AttrDict(message=AttrDict(role="assistant", content=SAMPLE_ANSWER))],
+            usage=AttrDict(prompt_tokens=400, completion_tokens=40, total_tokens=440)
+        )
+
+def error_response(service, outcome):
+    """Error con el formato del protocolo del servicio; botocore lo reintenta como uno real."""
+
+    protocol = PROTOCOLS.get(service, "rest-json")
+    if protocol == "rest-xml":
+        code, status = ("SlowDown", 503) if outcome == "throttle" else ("InternalError", 500)
+        return xml_response(status, f"<Error><Code>{code}</Code><Message>Simulado</Message></Error>")
+    if protocol == "json":
+        code = "ProvisionedThroughputExceededException" if outcome == "throttle" else "InternalServerError"
+        status = 400 if outcome == "throttle" else 500
+        data = json.dumps({"__type": f"com.amazonaws.dynamodb.v20120810#{code}", "message": "Simulado"}).encode("utf-8")
+        return status, {"content-type": "application/x-amz-json-1.0", "content-length": str(len(data))}, data
+    code, status = ("ThrottlingException", 429) if outcome == "throttle" else ("InternalServerException", 500)
+    data = json.dumps({"message": "Simulado"}).encode("utf-8")
+    return status, {"content-type": "application/json", "x-amzn-errortype": code, "content-length": str(len(data))}, data
+
+def json_response(body, content_type="application/json"):
+    data = json.dumps(body).encode("utf-8")
+    return 200, {"content-type": content_type, "content-length": str(len(data))}, data
+
+def xml_response(status, body):
+    data = ('<?xml version="1.0" encoding="UTF-8"?>' + body).encode("utf-8")
+    return status, {"content-type": "application/xml", "content-length": str(len(data))}, data
+
+def event_stream_response(messages):
+    return 200, {"content-type": "application/vnd.amazon.eventstream"}, b"".join(messages)
+
+def event_message(event_type, payload):
+    """Codifica un mensaje de tipo 'event' en el formato binario vnd.amazon.eventstream."""
+
+    headers = b""
+    for name, value in ((":message-type", "event"), (":event-type", event_type), (":content-type", "application/json")):
+        name, value = name.encode("utf-8"), value.encode("utf-8")
+        # Tipo 7: cadena
+        headers += struct.pack("!B", len(name)) + name + struct.pack("!BH", 7, len(value)) + value
+    total_length = 12 + len(headers) + len(payload) + 4
+    prelude = struct.pack("!II", total_length, len(headers))
+    message = prelude + struct.pack("!I", zlib.crc32(prelude)) + headers + payload
+    return message + struct.pack("!I", zlib.crc32(message))
@@ -0,0 +1,157 @@
+"""Entrena y evalúa el clasificador local de consultas (lambda/queryClassifier.py).
+
+Las etiquetas son las decisiones del agente de Bedrock que app.py registra en las líneas
+"classification_log" (source == "agent"). Acepta un export de CloudWatch Logs o un JSONL
+con objetos {"query": ..., "label": ...}.
+
+Uso:
+    python scripts/trainQueryClassifier.py logs.txt [logs2.txt ...]
+        [--output lambda/models/queryClassifier.json] [--report report.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+sys.path.insert(0, LAMBDA_DIR)
+
+import queryClassifier
+from cacheUtils import normalize_query
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99]
+
+def load_samples(paths):
+    """Lee las decisiones del agente. Devuelve una lista de (consulta, etiqueta, latencia del agente)."""
+
+    samples = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                start = line.find("{")
+                if start < 0:
+                    continue
+                try:
+                    record = json.loads(line[start:])
+                except json.JSONDecodeError:
+                    continue
+                record = record.get("classification_log", record)
+                if record.get("source", "agent") != "agent":
+                    continue
+                query, label = record.get("query"), record.get("label")
+                if query and label in queryClassifier.LABELS:
+                    # Si una consulta aparece varias veces se queda la última decisión
+                    samples[normalize_query(query)] = (query, label, record.get("agent_ms"))
+    return list(samples.values())
+
+def train(samples, n_buckets, epochs, learning_rate, l2, seed):
+    """Regresión logística multinomial con SGD sobre las características dispersas."""
+
+    labels = queryClassifier.LABELS
+    model = {"version": 1, "labels": labels, "n_buckets": n_buckets, "bias": [0.0] * len(labels), "weights": {}}
+    data = [(queryClassifier.extract_features(query, n_buckets), labels.index(label)) for query, label, _ in samples]
+    rng = random.Random(seed)
+
+    for epoch in range(epochs):
+        rng.shuffle(data)
+        rate = learning_rate / (1 + epoch)
+        for features, target in data:
+            probabilities = queryClassifier.predict_proba(model, features)
+            gradient = [p - (1.0 if i == target else 0.0) for i, p in enumerate(probabilities)]
+            model["bias"] = [b - rate * g for b, g in zip(model["bias"], gradient)]
+            for bucket, value in features.items():
+                row = model["weights"].setdefault(bucket, [0.0] * len(labels))
+                for i, g in enumerate(gradient):
+                    row[i] -= rate * (g * value + l2 * row[i])
+
+    # Se descartan los pesos despreciables para que el modelo cargue rápido en el arranque en frío
+    model["weights"] = {
+        bucket: [round(w, 5) for w in row]
+        for bucket, row in model["weights"].items() if max(abs(w) for w in row) >= 1e-4
+    }
+    return model
+
+def evaluate(model, samples):
+    """Concordancia con el agente y latencia ahorrada para cada umbral de confianza."""
+
+    predictions = []
+    local_ms = []
+    for query, label, _ in samples:
+        start = time.perf_counter()
+        probabilities = queryClassifier.predict_proba(model, queryClassifier.extract_features(query, model["n_buckets"]))
+        local_ms.append((time.perf_counter() - start) * 1000)
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        predictions.append((model["labels"][best], probabilities[best], label))
+
+    agent_latencies = [agent_ms for _, _, agent_ms in samples if agent_ms is not None]
+    mean_agent_ms = sum(agent_latencies) / len(agent_latencies) if agent_latencies else None
+    mean_local_ms = sum(local_ms) / len(local_ms) if local_ms else 0.0
+    total = len(predictions) or 1
+
+    report = {
+        "samples": len(predictions),
+        "agreement_all": sum(p == label for p, _, label in predictions) / total,
+        "mean_local_ms": round(mean_local_ms, 3),
+        "mean_agent_ms": round(mean_agent_ms, 1) if mean_agent_ms is not None else None,
+        "thresholds": []
+    }
+    for threshold in THRESHOLDS:
+        confident = [(p, label) for p, confidence, label in predictions if confidence >= threshold]
+        coverage = len(confident) / total
+        agreement = sum(p == label for p, label in confident) / len(confident) if confident else None
+        report["thresholds"].append({
+            "threshold": threshold,
+            # Fracción de consultas que ya no pasan por el agente
+            "coverage": round(coverage, 4),
+            # Concordancia con el agente en esas consultas
+            "agreement": round(agreement, 4) if agreement is not None else None,
+            # Concordancia de extremo a extremo (el resto lo sigue clasificando el agente)
+            "hybrid_agreement": round(1 - coverage + coverage * agreement, 4) if agreement is not None else 1.0,
+            "latency_saved_ms_per_request": (
+                round(coverage * mean_agent_ms - mean_local_ms, 1) if mean_agent_ms is not None else None
+            )
+        })
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+")
+    parser.add_argument("--output", default=queryClassifier.CLASSIFIER_MODEL_PATH)
+    parser.add_argument("--report")
+    parser.add_argument("--buckets", type=int, default=queryClassifier.DEFAULT_BUCKETS)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--learning-rate", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-5)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    samples = load_samples(args.logs)
+    if len(samples) < 10:
+        sys.exit(f"Solo hay {len(samples)} decisiones del agente; hacen falta más para entrenar")
+
+    random.Random(args.seed).shuffle(samples)
+    split = int(len(samples) * (1 - args.test_fraction))
+    train_samples, test_samples = samples[:split], samples[split:]
+
+    # Evaluación sobre datos no vistos y modelo final entrenado con todas las decisiones
+    holdout_model = train(train_samples, args.buckets, args.epochs, args.learning_rate, args.l2, args.seed)
+    report = evaluate(holdout_model, test_samples)
+    report["train_samples"] = len(train_samples)
+    report["label_counts"] = {label: sum(l == label for _, l, _ in samples) for label in queryClassifier.LABELS}
+
+    model = train(samples, args.buckets, args.epochs, args.learning_rate, args.l2, args.seed)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    queryClassifier.save_model(model, args.output)
+    report["model_path"] = args.output
+    report["model_weights"] = len(model["weights"])
+
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
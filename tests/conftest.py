@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Los módulos de lambda/ se importan por nombre, como en el paquete de la Lambda
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-central-1")
+# Sin tabla compartida: cachés, versión de la KB y admisión quedan en memoria
+os.environ.pop("CACHE_TABLE", None)
@@ -0,0 +1,65 @@
+import json
+import pytest
+import admissionControl
+from admissionControl import AdmissionRejected, MemoryBuckets, acquire, refill, seconds_to_token
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000]
+    monkeypatch.setattr(admissionControl, "now_ms", lambda: now[0])
+    return now
+
+@pytest.fixture
+def buckets(monkeypatch):
+    buckets = MemoryBuckets()
+    monkeypatch.setattr(admissionControl, "_buckets", buckets)
+    return buckets
+
+def test_refill_is_proportional_and_capped_at_burst():
+    assert refill(0, 0, 500, rate=2, burst=5) == 1
+    assert refill(1, 0, 60_000, rate=2, burst=5) == 5
+    # Un reloj que retrocede no quita tokens
+    assert refill(3, 1000, 0, rate=2, burst=5) == 3
+
+def test_seconds_to_token():
+    assert seconds_to_token(0.25, rate=0.5) == 1.5
+    assert seconds_to_token(0, rate=0) == float("inf")
+
+def test_bucket_drains_burst_then_refills(clock, buckets):
+    for _ in range(2):
+        assert buckets.take("session#a", rate=0.5, burst=2) == 0
+    # Vacío: faltan 1 / 0.5 = 2 s para el siguiente token
+    assert buckets.take("session#a", rate=0.5, burst=2) == pytest.approx(2.0)
+
+    clock[0] += 1500
+    assert buckets.take("session#a", rate=0.5, burst=2) == pytest.approx(0.5)
+    clock[0] += 500
+    assert buckets.take("session#a", rate=0.5, burst=2) == 0
+    # Cada bucket es independiente
+    assert buckets.take("session#b", rate=0.5, burst=2) == 0
+
+def test_acquire_rejects_with_retry_after_when_wait_exceeds_deadline(clock, buckets):
+    acquire("service#bedrock", rate=0.25, burst=1, max_wait_ms=0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        acquire("service#bedrock", rate=0.25, burst=1, max_wait_ms=1000)
+    assert rejected.value.bucket == "service#bedrock"
+    assert rejected.value.retry_after == pytest.approx(4.0)
+
+def test_acquire_waits_for_token_within_deadline(buckets):
+    acquire("service#retrieve", rate=50, burst=1, max_wait_ms=0)
+    # El siguiente token llega en 20 ms, dentro del plazo
+    acquire("service#retrieve", rate=50, burst=1, max_wait_ms=500)
+
+def test_exhausted_session_gets_429_with_retry_after(monkeypatch, clock, buckets):
+    import app
+
+    monkeypatch.setattr(admissionControl, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admissionControl, "ADMISSION_SESSION_RATE", 0.4)
+    monkeypatch.setattr(admissionControl, "ADMISSION_SESSION_BURST", 1)
+    buckets.take("session#s1", rate=0.4, burst=1)
+
+    event = {"body": json.dumps({"query": "hola", "session_id": "s1", "model": "bedrock"})}
+    response = app.lambda_handler(event, None)
+    assert response["statusCode"] == 429
+    # Faltan 1 / 0.4 = 2.5 s: se redondea hacia arriba
+    assert response["headers"]["Retry-After"] == "3"
@@ -0,0 +1,62 @@
+import pytest
+import answerCache
+
+# Embeddings normalizados: las paráfrasis caen cerca, el resto no
+VECTORS = {
+    "que es un match en python": [1.0, 0.0, 0.0],
+    "explicame el match de python": [0.99, 0.141, 0.0],
+    "que es una goroutine": [0.0, 0.0, 1.0]
+}
+
+@pytest.fixture
+def cache(monkeypatch):
+    version = ["job-1"]
+    embedded = []
+
+    def embed(text):
+        embedded.append(text)
+        return VECTORS[text]
+
+    monkeypatch.setattr(answerCache, "get_kb_version", lambda: version[0])
+    monkeypatch.setattr(answerCache, "embed_text", embed)
+    monkeypatch.setattr(answerCache, "get_shared_tier", lambda: None)
+    monkeypatch.setitem(answerCache._state, "kb_version", None)
+    answerCache.local_cache.clear()
+    yield version, embedded
+    answerCache.local_cache.clear()
+
+def lookup(query, model="bedrock"):
+    return answerCache.lookup_semantic(model, answerCache.semantic_embedding(query, model))
+
+def test_exact_and_semantic_hits_within_same_version(cache):
+    answerCache.store_answer("que es un match en python", "bedrock", "respuesta")
+
+    assert answerCache.lookup_exact("Que es un match en Python?", "bedrock") == ("respuesta", "exact")
+    assert lookup("explicame el match de python") == "respuesta"
+    assert lookup("que es una goroutine") is None
+    # Otro modelo no reutiliza la respuesta
+    assert lookup("explicame el match de python", "openai") is None
+
+def test_semantic_miss_after_kb_version_change(cache):
+    version, embedded = cache
+    answerCache.store_answer("que es un match en python", "bedrock", "respuesta antigua")
+    assert lookup("explicame el match de python") == "respuesta antigua"
+
+    version[0] = "job-2"
+    embedded.clear()
+    assert lookup("explicame el match de python") is None
+    assert answerCache.lookup_exact("que es un match en python", "bedrock") == (None, None)
+    # Sin candidatos de la versión actual no se calcula el embedding
+    assert embedded == []
+
+def test_entries_of_previous_version_are_not_candidates(cache):
+    version, _ = cache
+    answerCache.store_answer("que es un match en python", "bedrock", "respuesta antigua")
+    # Una entrada de otra versión que siga en memoria (p.ej. escrita a la vez que el cambio) no se compara
+    stale = dict(next(iter(answerCache.local_cache.values())))
+    version[0] = "job-2"
+    answerCache.current_kb_version()
+    answerCache.local_cache.set("stale", stale)
+
+    assert answerCache.semantic_candidates("job-2", "bedrock") == []
+    assert lookup("explicame el match de python") is None
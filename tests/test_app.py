@@ -0,0 +1,98 @@
+import json
+import pytest
+import answerCache
+import app
+import requestMetrics
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Sustituye las llamadas a AWS de prepare_chat: guardrail, clasificación, historial y KB."""
+
+    state = {"history": [], "label": "COMPLEX", "kb": ([], [], False), "exact_lookups": 0}
+
+    def lookup_exact(user_query, selected_model):
+        state["exact_lookups"] += 1
+        return "respuesta cacheada", "exact"
+
+    monkeypatch.setattr(app, "apply_guardrail", lambda user_query, metrics=None: False)
+    monkeypatch.setattr(app, "classify_query", lambda user_query, session_id: state["label"])
+    monkeypatch.setattr(app, "get_conversation_history", lambda session_id: state["history"])
+    monkeypatch.setattr(app, "retrieve_context", lambda query, metrics=None, speculative=False: state["kb"])
+    monkeypatch.setattr(answerCache, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(answerCache, "lookup_exact", lookup_exact)
+    monkeypatch.setattr(answerCache, "semantic_embedding", lambda user_query, selected_model: None)
+    return state
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_exact_cache_hit_only_without_history(monkeypatch, stages, concurrent):
+    monkeypatch.setattr(app, "CONCURRENT_MODE", concurrent)
+
+    chat = app.prepare_chat("que es un match en python", "s1", "bedrock", requestMetrics.RequestMetrics())
+    assert chat["classification"] == "CACHE_HIT_EXACT"
+
+    stages["history"] = [{"user_query": "que es un match en python", "model_response": "..."}]
+    chat = app.prepare_chat("y en Java?", "s1", "bedrock", requestMetrics.RequestMetrics())
+    assert chat["classification"] == "COMPLEX"
+    assert not chat["cacheable"]
+    assert stages["exact_lookups"] == 1
+
+@pytest.mark.parametrize("degraded", [False, True])
+def test_answer_without_kb_context_is_not_cacheable(monkeypatch, stages, degraded):
+    monkeypatch.setattr(answerCache, "lookup_exact", lambda user_query, selected_model: (None, None))
+    stages["kb"] = ([], [], degraded)
+
+    chat = app.prepare_chat("que es un match en python", "s1", "bedrock", requestMetrics.RequestMetrics())
+    assert chat["classification"] == "COMPLEX"
+    assert chat["cacheable"] is not degraded
+
+def test_retrieval_failure_is_reported_as_degraded(monkeypatch):
+    class FailingRetriever:
+        def retrieve(self, query):
+            raise RuntimeError("KB caída")
+
+    monkeypatch.setattr(app, "get_retriever", lambda: FailingRetriever())
+    assert app.retrieve_from_kb("hola") == ([], [], True)
+
+@pytest.mark.parametrize("item, error", [
+    ({"query": 123, "session_id": "s1"}, "query and session_id must be strings"),
+    ({"query": "hola", "session_id": ["s1"]}, "query and session_id must be strings"),
+    ({"query": "hola", "session_id": "s1", "model": ["bedrock"]}, "Unsupported model: ['bedrock']"),
+    ({"query": "hola"}, "Missing query or session_id"),
+    ("hola", "Missing query or session_id")
+])
+def test_malformed_batch_item_fails_alone(monkeypatch, item, error):
+    monkeypatch.setattr(app, "run_batch_item", lambda item, batch_id, shared: {"status": 200, "response": "ok"})
+
+    results = list(app.run_batch([item, {"query": "hola", "session_id": "s2"}], "batch-1"))
+    assert results[0] == {"index": 0, "status": 400, "error": error}
+    assert results[1]["status"] == 200
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_stream_response_reports_whether_it_is_buffered(stages, streaming):
+    class Context:
+        pass
+
+    context = Context()
+    context.streaming = streaming
+    stages["label"] = "NULL"
+    event = {"body": json.dumps({"query": "hola", "session_id": "s1", "model": "bedrock", "stream": True})}
+
+    response = app.lambda_handler(event, context)
+    assert response["headers"][app.STREAMING_HEADER] == ("true" if streaming else "false")
+    body = response["body"] if isinstance(response["body"], str) else "".join(response["body"])
+    assert json.loads(body.splitlines()[-1])["type"] == "done"
+
+def test_classification_log_is_sampled_and_hides_query(monkeypatch, caplog):
+    caplog.set_level("DEBUG", logger="app")
+    monkeypatch.setattr(app, "CLASSIFICATION_LOG_SAMPLE_RATE", 0)
+    app.log_classification("mi consulta privada", "agent", "SIMPLE", "SIMPLE", 0.5, 120.0)
+    assert "classification_log" not in caplog.text and "mi consulta privada" not in caplog.text
+
+    monkeypatch.setattr(app, "CLASSIFICATION_LOG_SAMPLE_RATE", 1)
+    app.log_classification("mi consulta privada", "agent", "SIMPLE", "SIMPLE", 0.5, 120.0)
+    record = json.loads(caplog.records[-1].getMessage())["classification_log"]
+    assert "query" not in record and record["label"] == "SIMPLE"
+
+    monkeypatch.setattr(app, "CLASSIFICATION_LOG_QUERIES", True)
+    app.log_classification("mi consulta privada", "agent", "SIMPLE", "SIMPLE", 0.5, 120.0)
+    assert json.loads(caplog.records[-1].getMessage())["classification_log"]["query"] == "mi consulta privada"
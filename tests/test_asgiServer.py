@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+import pytest
+
+import asgiServer
+
+def post(path, body):
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": []}
+    asyncio.run(asgiServer.app(scope, receive, send))
+    body = b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+    return sent[0]["status"], json.loads(body)
+
+@pytest.mark.parametrize("body", [b"[]", b'"sync"', b"3", b"null"])
+def test_sync_rejects_non_object_body(body):
+    status, payload = post("/sync", body)
+
+    assert status == 400
+    assert "JSON object" in payload["error"]
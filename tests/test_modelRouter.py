@@ -0,0 +1,170 @@
+import threading
+import time
+import pytest
+from botocore.exceptions import ClientError
+import modelRouter
+from modelRouter import CircuitBreaker, ModelProvider, ModelRouter, ModelUnavailableError
+
+class FakeProvider(ModelProvider):
+    """Proveedor con respuestas predefinidas: cada elemento de outcomes es un texto o una excepción."""
+
+    def __init__(self, name, outcomes):
+        self.name = name
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def generate(self, prompt, usage):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def client_error(code, status):
+    return ClientError({"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "InvokeModel")
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(modelRouter.time, "time", lambda: now[0])
+    return now
+
+def test_breaker_opens_after_threshold_and_half_opens_after_cooldown(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=30)
+    breaker.record_failure()
+    assert breaker.state() == "closed"
+    breaker.record_failure()
+    assert breaker.state() == "open" and not breaker.allow()
+
+    clock[0] += 30
+    # Una sola petición de prueba pasada la espera
+    assert breaker.allow()
+    assert breaker.state() == "half_open"
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state() == "closed" and breaker.allow()
+
+def test_failed_probe_reopens_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+    breaker.record_failure()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state() == "open"
+    clock[0] += 29
+    assert not breaker.allow()
+
+def test_router_skips_open_breaker_and_probes_after_cooldown(clock):
+    provider = FakeProvider("bedrock", [client_error("InternalServerException", 500), "recuperado"])
+    router = ModelRouter([provider], fallback=False, hedging=False)
+    router.breakers["bedrock"] = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+
+    with pytest.raises(ModelUnavailableError):
+        router.generate("bedrock", {})
+    assert router.breakers["bedrock"].state() == "open"
+
+    routing = {}
+    with pytest.raises(ModelUnavailableError):
+        router.generate("bedrock", {}, routing=routing)
+    assert routing["attempts"][0]["outcome"] == "circuit_open"
+    assert provider.calls == 1
+
+    clock[0] += 30
+    assert router.generate("bedrock", {}) == "recuperado"
+    assert router.breakers["bedrock"].state() == "closed"
+
+def test_client_errors_do_not_trip_breaker():
+    provider = FakeProvider("bedrock", [client_error("ValidationException", 400)] * 3)
+    router = ModelRouter([provider], fallback=False, hedging=False)
+    router.breakers["bedrock"] = CircuitBreaker(failure_threshold=2, cooldown_seconds=30)
+
+    for _ in range(3):
+        with pytest.raises(ModelUnavailableError):
+            router.generate("bedrock", {})
+    assert router.breakers["bedrock"].state() == "closed"
+    assert provider.calls == 3
+
+def test_open_breaker_falls_back_to_other_provider():
+    router = ModelRouter([FakeProvider("bedrock", []), FakeProvider("openai", ["alternativa"])], fallback=True, hedging=False)
+    router.breakers["bedrock"] = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+    router.breakers["bedrock"].record_failure()
+
+    routing = {}
+    assert router.generate("bedrock", {}, routing=routing) == "alternativa"
+    assert routing["provider"] == "openai" and routing["fallback"]
+
+def test_stalled_stream_is_cut_and_counts_as_failure(monkeypatch):
+    released = threading.Event()
+
+    class StallingProvider(ModelProvider):
+        name = "bedrock"
+
+        def stream(self, prompt, usage, on_open=None):
+            yield "hola"
+            released.wait(5)
+
+    monkeypatch.setattr(modelRouter, "MODEL_STREAM_IDLE_SECONDS", 0.05)
+    router = ModelRouter([StallingProvider()], fallback=False, hedging=False)
+    chunks = []
+    with pytest.raises(TimeoutError):
+        for chunk in router.stream("bedrock", {}):
+            chunks.append(chunk)
+    released.set()
+    assert chunks == ["hola"]
+    assert router.breakers["bedrock"].failures == 1
+
+def test_rejected_probe_is_released(clock):
+    provider = FakeProvider("bedrock", ["recuperado"])
+    rejections = [RuntimeError("sin token")]
+
+    def admit(name, primary):
+        if rejections:
+            raise rejections.pop()
+
+    router = ModelRouter([provider], fallback=False, hedging=False, admit=admit)
+    router.breakers["bedrock"] = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+    router.breakers["bedrock"].record_failure()
+    clock[0] += 30
+
+    with pytest.raises(RuntimeError):
+        router.generate("bedrock", {})
+    assert router.breakers["bedrock"].state() == "open"
+    # La prueba no llegó a hacerse: la siguiente petición puede probar
+    assert router.generate("bedrock", {}) == "recuperado"
+    assert router.breakers["bedrock"].state() == "closed"
+
+def test_cancelled_probe_is_released(clock):
+    opened = threading.Event()
+
+    class BlockingProvider(ModelProvider):
+        name = "bedrock"
+
+        def stream(self, prompt, usage, on_open=None):
+            interrupted = threading.Event()
+            on_open(interrupted.set)
+            opened.set()
+            interrupted.wait(5)
+            return
+            yield
+
+    router = ModelRouter([BlockingProvider()], fallback=False, hedging=False)
+    breaker = router.breakers["bedrock"] = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+    breaker.record_failure()
+    clock[0] += 30
+
+    cancellation = modelRouter.Cancellation()
+    result = []
+    consumer = threading.Thread(target=lambda: result.extend(router.stream("bedrock", {}, cancellation=cancellation)))
+    consumer.start()
+    assert opened.wait(2)
+    assert breaker.state() == "half_open"
+    cancellation.cancel()
+    consumer.join(2)
+
+    deadline = time.monotonic() + 2
+    while breaker.probing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert result == []
+    assert breaker.state() == "open"
+    assert breaker.allow()
@@ -0,0 +1,78 @@
+import threading
+import time
+from modelRouter import ModelProvider, ModelRouter
+from speculativeGeneration import SimpleRatioGuard, SpeculativeGeneration
+
+PROMPT = {"text": "hola", "tokens": {"total": 40}}
+
+class ScriptedProvider(ModelProvider):
+    """Envía chunks y después se queda bloqueado hasta que el router corta la respuesta (on_open)."""
+
+    name = "bedrock"
+
+    def __init__(self, chunks, block=False):
+        self.chunks = chunks
+        self.block = block
+        self.interrupted = threading.Event()
+
+    def stream(self, prompt, usage, on_open=None):
+        if on_open is not None:
+            on_open(self.interrupted.set)
+        if self.block:
+            # Un proveedor que aún no ha enviado el primer fragmento
+            self.interrupted.wait(5)
+            return
+        usage.update({"input_tokens": 40, "output_tokens": len(self.chunks)})
+        yield from self.chunks
+
+def speculate(provider):
+    router = ModelRouter([provider], fallback=False, hedging=False)
+    return SpeculativeGeneration(router.stream, "bedrock", PROMPT)
+
+def test_kept_speculation_delivers_all_chunks_and_usage():
+    speculation = speculate(ScriptedProvider(["Un ", "match ", "es..."]))
+    speculation.join(5)
+    speculation.keep()
+
+    usage, routing = {}, {}
+    assert "".join(speculation.consume(usage, routing)) == "Un match es..."
+    assert usage["output_tokens"] == 3
+    assert routing["provider"] == "bedrock"
+    report = speculation.report()
+    assert report["outcome"] == "kept" and report["saved_ms"] >= 0
+
+def test_cancel_before_first_token_interrupts_provider():
+    provider = ScriptedProvider([], block=True)
+    speculation = speculate(provider)
+    time.sleep(0.05)
+
+    start = time.perf_counter()
+    speculation.cancel()
+    speculation.join(2)
+    assert not speculation.is_alive()
+    assert provider.interrupted.is_set()
+    assert time.perf_counter() - start < 1
+
+    report = speculation.report()
+    assert report["outcome"] == "cancelled"
+    # Sin usage del proveedor, los tokens de entrada se estiman con los del prompt
+    assert report["wasted_input_tokens"] == 40 and report["estimated"]
+
+def test_cancel_after_keep_keeps_outcome():
+    speculation = speculate(ScriptedProvider(["ok"]))
+    speculation.join(5)
+    speculation.keep()
+    speculation.cancel()
+    assert speculation.kept
+
+def test_guard_requires_min_samples_and_ratio():
+    guard = SimpleRatioGuard(window=10, min_ratio=0.6, min_samples=5)
+    for label in ["SIMPLE"] * 4:
+        guard.record(label)
+    assert guard.ratio() is None and not guard.allow()
+    guard.record("COMPLEX")
+    assert guard.ratio() == 0.8 and guard.allow()
+    for label in ["COMPLEX"] * 5:
+        guard.record(label)
+    # La ventana solo conserva las últimas 10 etiquetas
+    assert guard.ratio() == 0.4 and not guard.allow()
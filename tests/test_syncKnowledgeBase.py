@@ -0,0 +1,63 @@
+import pytest
+
+import syncKnowledgeBase
+from ingestionManifest import MemoryManifest, record_upload
+from ingestionScheduler import MemoryStateStore, update_state
+
+URI = "s3://bucket/documents/a.pdf"
+
+def start_job(store, job_id):
+    active = {"job_id": job_id, "mode": "full", "files": {URI: 1}, "started_at": syncKnowledgeBase.now_ms()}
+
+    def claim(state):
+        state["pending"] = {}
+        state["first_pending_at"] = None
+        state["active_job"] = active
+
+    update_state(store, claim)
+    return active
+
+@pytest.fixture
+def sync(monkeypatch):
+    monkeypatch.setattr(syncKnowledgeBase, "set_kb_version", lambda version: None)
+    monkeypatch.setattr(syncKnowledgeBase, "SYNC_MAX_ATTEMPTS", 3)
+    store, manifest = MemoryStateStore(), MemoryManifest()
+    record_upload(manifest, URI, "hash", 10)
+    manifest.entries[URI]["updated_at"] = 0
+    return store, manifest
+
+def test_failed_job_requeues_until_max_attempts(sync):
+    store, manifest = sync
+    for attempt in range(1, 3):
+        syncKnowledgeBase.finish_job(store, manifest, start_job(store, f"job-{attempt}"), "FAILED")
+        assert URI in store.load()["pending"]
+        assert manifest.get(URI)["failures"] == attempt
+
+    syncKnowledgeBase.finish_job(store, manifest, start_job(store, "job-3"), "FAILED")
+
+    assert store.load()["pending"] == {}
+    assert manifest.get(URI)["status"] == "failed"
+    assert store.jobs["job-3"]["dead_letter"] == [URI]
+
+def test_success_resets_failures(sync):
+    store, manifest = sync
+    syncKnowledgeBase.finish_job(store, manifest, start_job(store, "job-1"), "FAILED")
+    syncKnowledgeBase.finish_job(store, manifest, start_job(store, "job-2"), "COMPLETE")
+
+    assert manifest.get(URI)["status"] == "ingested"
+    assert manifest.get(URI)["failures"] == 0
+
+def test_reupload_retries_a_failed_file(sync):
+    store, manifest = sync
+    manifest.entries[URI].update({"status": "failed", "failures": 3})
+
+    assert not syncKnowledgeBase.is_unchanged(manifest.get(URI), "hash")
+    record_upload(manifest, URI, "hash", 10)
+    assert manifest.get(URI)["failures"] == 0
+
+def test_missing_config_fails_before_touching_state(monkeypatch):
+    monkeypatch.setattr(syncKnowledgeBase, "missing_config", ["KB_ID"])
+    monkeypatch.setattr(syncKnowledgeBase, "get_store", lambda datasource_id: pytest.fail("state touched"))
+
+    with pytest.raises(RuntimeError, match="KB_ID"):
+        syncKnowledgeBase.lambda_handler({"Records": []}, None)
@@ -0,0 +1,19 @@
+import json
+import pytest
+import uploadFile
+
+@pytest.mark.parametrize("body", [
+    {"action": "abort", "key": "documents/python.pdf", "upload_id": "u1"},
+    {"action": "status", "key": "uploadHashes/abc", "upload_id": "u1", "part_count": 2},
+    {"action": "complete", "key": "otros/a.pdf", "sha256": "0" * 64},
+    {"action": "abort", "key": ["documents/userUploads/a.pdf"], "upload_id": "u1"}
+])
+def test_actions_reject_keys_outside_upload_prefix(monkeypatch, body):
+    def unexpected(**kwargs):
+        raise AssertionError("no debe llegar a S3")
+
+    for operation in ("abort_multipart_upload", "list_parts", "complete_multipart_upload", "head_object"):
+        monkeypatch.setattr(uploadFile.s3, operation, unexpected)
+    response = uploadFile.lambda_handler({"body": json.dumps(body)}, None)
+    assert response["statusCode"] == 400
+    assert "Invalid upload key" in json.loads(response["body"])["error"]